@@ -0,0 +1,46 @@
+"""
+Production server: ``python -m app`` runs ``settings.workers`` gunicorn
+processes with uvicorn workers.
+
+The app is imported and the schema is initialized once in the master process,
+then the workers are forked from it warm. The connection pools are emptied
+before forking, so no SQLite connection is shared with a worker.
+"""
+from typing import Any
+
+from gunicorn.app.base import BaseApplication
+
+from app.db import Base, engine, init_db, read_engine
+from app.settings import settings
+from app.urls import app
+
+
+class FilmsServer(BaseApplication):  # pylint: disable=abstract-method
+    def __init__(self, options: dict[str, Any]) -> None:
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self) -> Any:
+        return app
+
+
+def main() -> None:
+    init_db(Base, engine)
+    engine.dispose()
+    read_engine.dispose()
+    FilmsServer(
+        {
+            'bind': settings.bind,
+            'workers': settings.workers,
+            'worker_class': 'uvicorn.workers.UvicornWorker',
+            'preload_app': True,
+        }
+    ).run()
+
+
+if __name__ == '__main__':
+    main()
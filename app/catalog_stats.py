@@ -0,0 +1,209 @@
+"""
+Catalog-wide rating statistics, served by ``GET /stats``.
+
+The rate histograms of ``film_stats`` are held in a NumPy matrix, a row of rate
+counts per film. They hold everything the statistics need (counts, sums, sums
+of squares and percentiles of the rates), which are computed over the whole
+catalog with a few vectorized operations instead of a query per film: 11 counts
+per film instead of a row per rate.
+
+The matrix is loaded on startup, then follows the committed review changes as
+a ``FollowedState``: a change moves one count between two buckets.
+"""
+import ctypes
+import multiprocessing
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from app.constants import RATES, RELOAD_INTERVAL
+from app.db import create_read_session
+from app.db_queries import get_catalog_stats_films
+from app.events import FilmReviewChange, FollowedState, SharedCounter, subscribe
+from app.json_encoding import row_to_dict
+from app.rate_distribution import describe_histogram
+
+RATE_VALUES = np.array(RATES, dtype=np.int64)
+
+
+class CatalogStats(FollowedState):
+    def __init__(
+        self,
+        reload_interval: float,
+        shared_version: Optional[SharedCounter] = None,
+    ) -> None:
+        super().__init__(reload_interval, shared_version)
+        self._film_ids = np.empty(0, dtype=np.int64)
+        self._slugs: list[str] = []
+        self._film_names: list[str] = []
+        self._years = np.empty(0, dtype=np.int64)
+        # index into _years of every film
+        self._year_indexes = np.empty(0, dtype=np.int64)
+        self._histograms = np.zeros((0, len(RATES)), dtype=np.int64)
+
+    def load(self, films: Sequence[Any], version: int) -> None:
+        """
+        Replace the statistics with ``films`` (rows of
+        ``get_catalog_stats_films``) read at ``version``.
+        """
+        film_ids = np.array([film.id for film in films], dtype=np.int64)
+        years, year_indexes = np.unique(
+            np.array([film.year for film in films], dtype=np.int64),
+            return_inverse=True,
+        )
+        histograms = np.array(
+            [
+                [columns[f'rate_{rate}'] for rate in RATES]
+                for columns in map(row_to_dict, films)
+            ],
+            dtype=np.int64,
+        ).reshape(len(films), len(RATES))
+        with self._lock:
+            self._film_ids = film_ids
+            self._slugs = [film.slug for film in films]
+            self._film_names = [film.film_name for film in films]
+            self._years = years
+            self._year_indexes = year_indexes.reshape(-1)
+            self._histograms = histograms
+            self._mark_loaded(version)
+
+    def summarize(self, min_votes: int, limit: int) -> dict[str, Any]:
+        """Content of ``CatalogStatsResponse``."""
+        with self._lock:
+            # the other arrays are replaced by a load, never changed
+            histograms = self._histograms.copy()
+            film_ids, slugs, film_names = self._film_ids, self._slugs, self._film_names
+            years, year_indexes = self._years, self._year_indexes
+        rate_counts = histograms.sum(axis=1)
+        rate_sums = histograms @ RATE_VALUES
+        rate_squares = histograms @ RATE_VALUES**2
+        catalog_histogram = histograms.sum(axis=0)
+        total_rates = int(rate_counts.sum())
+        return {
+            'films': len(film_ids),
+            'rate_number': total_rates,
+            'average_rate': (
+                float(rate_sums.sum() / total_rates) if total_rates else None
+            ),
+            'rate_distribution': describe_histogram(catalog_histogram.tolist()),
+            'years': _summarize_years(years, year_indexes, rate_counts, rate_sums),
+            'rate_number_distribution': _summarize_rate_numbers(rate_counts),
+            'polarizing_films': _get_polarizing_films(
+                film_ids,
+                slugs,
+                film_names,
+                rate_counts,
+                rate_sums,
+                rate_squares,
+                min_votes,
+                limit,
+            ),
+        }
+
+    def _apply_change(self, change: FilmReviewChange) -> bool:
+        row = int(np.searchsorted(self._film_ids, change.film_id))
+        if row == len(self._film_ids) or self._film_ids[row] != change.film_id:
+            # a film added since the load
+            return False
+        if change.old_rate is not None:
+            self._histograms[row, change.old_rate] -= 1
+        if change.new_rate is not None:
+            self._histograms[row, change.new_rate] += 1
+        return True
+
+
+def _summarize_years(
+    years: npt.NDArray[np.int64],
+    year_indexes: npt.NDArray[np.int64],
+    rate_counts: npt.NDArray[np.int64],
+    rate_sums: npt.NDArray[np.int64],
+) -> list[dict[str, Any]]:
+    films = np.bincount(year_indexes, minlength=len(years))
+    year_rate_counts = np.bincount(year_indexes, rate_counts, minlength=len(years))
+    year_rate_sums = np.bincount(year_indexes, rate_sums, minlength=len(years))
+    return [
+        {
+            'year': year,
+            'films': year_films,
+            'rate_number': int(rate_count),
+            'average_rate': rate_sum / rate_count if rate_count else None,
+        }
+        for year, year_films, rate_count, rate_sum in zip(
+            years.tolist(),
+            films.tolist(),
+            year_rate_counts.tolist(),
+            year_rate_sums.tolist(),
+        )
+    ]
+
+
+def _summarize_rate_numbers(rate_counts: npt.NDArray[np.int64]) -> list[dict[str, int]]:
+    # bucket 0 holds the films without rates, bucket b > 0 the ones with
+    # 2 ** (b - 1) to 2 ** b - 1 rates
+    buckets = np.zeros(len(rate_counts), dtype=np.int64)
+    rated = rate_counts > 0
+    buckets[rated] = np.floor(np.log2(rate_counts[rated])).astype(np.int64) + 1
+    return [
+        {
+            'min_rates': 0 if bucket == 0 else 2 ** (bucket - 1),
+            'max_rates': 0 if bucket == 0 else 2**bucket - 1,
+            'films': films,
+        }
+        for bucket, films in enumerate(np.bincount(buckets).tolist())
+    ]
+
+
+def _get_polarizing_films(
+    film_ids: npt.NDArray[np.int64],
+    slugs: list[str],
+    film_names: list[str],
+    rate_counts: npt.NDArray[np.int64],
+    rate_sums: npt.NDArray[np.int64],
+    rate_squares: npt.NDArray[np.int64],
+    min_votes: int,
+    limit: int,
+) -> list[dict[str, Any]]:
+    """The films with the largest standard deviation of their rates."""
+    candidates = np.flatnonzero(rate_counts >= max(min_votes, 1))
+    counts = rate_counts[candidates]
+    sums = rate_sums[candidates]
+    averages = sums / counts
+    # the variance from exact integers: (n * sum(x^2) - sum(x)^2) / n^2
+    deviations = np.sqrt(counts * rate_squares[candidates] - sums**2) / counts
+    # the most polarizing first, then by id
+    order = np.lexsort((film_ids[candidates], -deviations))[:limit]
+    return [
+        {
+            'id': int(film_ids[row]),
+            'slug': slugs[row],
+            'film_name': film_names[row],
+            'rate_number': int(rate_counts[row]),
+            'average_rate': average,
+            'rate_deviation': deviation,
+        }
+        for row, average, deviation in zip(
+            candidates[order].tolist(),
+            averages[order].tolist(),
+            deviations[order].tolist(),
+        )
+    ]
+
+
+catalog_stats = CatalogStats(RELOAD_INTERVAL, multiprocessing.Value(ctypes.c_uint64, 0))
+
+
+@subscribe
+def _apply_review_change(change: FilmReviewChange) -> None:
+    catalog_stats.apply(change)
+
+
+def load_catalog_stats() -> None:
+    version = catalog_stats.version
+    with create_read_session() as session:
+        catalog_stats.load(get_catalog_stats_films(session), version)
+
+
+def reload_catalog_stats_if_stale() -> None:
+    if catalog_stats.claim_reload():
+        load_catalog_stats()
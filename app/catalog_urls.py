@@ -0,0 +1,84 @@
+"""
+Routes answered from the in-memory state of the whole catalog: the
+leaderboard, the catalog statistics and the similar films.
+"""
+from functools import partial
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from app.catalog_stats import catalog_stats, reload_catalog_stats_if_stale
+from app.constants import (
+    CATALOG_STATS_MIN_VOTES,
+    PAGE_DEFAULT_LIMIT,
+    PAGE_MAX_LIMIT,
+    SIMILAR_FILMS_TOP_K,
+    ErrorMessage,
+)
+from app.db import run_read
+from app.db_queries import check_film_exists
+from app.json_encoding import dump_json
+from app.leaderboard import leaderboard, reload_leaderboard_if_stale
+from app.request_models import (
+    CatalogStatsResponse,
+    SimilarFilmsResponse,
+    TopFilmsResponse,
+)
+from app.similar_films import similar_films
+from app.utils import get_authorized_login
+
+router = APIRouter()
+
+
+@router.get(
+    '/films/top',
+    response_model=TopFilmsResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+async def show_top_films(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+) -> Response:
+    await reload_leaderboard_if_stale()
+    return Response(
+        dump_json({'films': leaderboard.top(limit)}), media_type='application/json'
+    )
+
+
+@router.get(
+    '/films/{film_slug}/similar',
+    response_model=SimilarFilmsResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+async def show_similar_films(
+    film_slug: str,
+    limit: int = Query(SIMILAR_FILMS_TOP_K, ge=1, le=SIMILAR_FILMS_TOP_K),
+) -> Response:
+    index = similar_films.index
+    if index is None:
+        raise HTTPException(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail=ErrorMessage.SIMILAR_FILMS_NOT_READY.value,
+        )
+    films = index.similar(film_slug, limit)
+    if films is None:
+        # unknown, or added since the index was built
+        await run_read(partial(check_film_exists, film_slug))
+        films = []
+    return Response(dump_json({'films': films}), media_type='application/json')
+
+
+@router.get(
+    '/stats',
+    response_model=CatalogStatsResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+def show_catalog_stats(
+    min_votes: int = Query(CATALOG_STATS_MIN_VOTES, ge=1),
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+) -> Response:
+    # a sync endpoint: the reload and the NumPy work run in the thread pool
+    reload_catalog_stats_if_stale()
+    return Response(
+        dump_json(catalog_stats.summarize(min_votes, limit)),
+        media_type='application/json',
+    )
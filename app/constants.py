@@ -2,6 +2,48 @@ from enum import Enum
 
 DB_FILE_PATH = 'app/app.db'
 
+CREDENTIALS_CACHE_MAX_SIZE = 10_000
+CREDENTIALS_CACHE_TTL = 300  # seconds
+
+ACCESS_TOKEN_TTL = 3600  # seconds
+ACCESS_TOKEN_SECRET_ENV = 'ACCESS_TOKEN_SECRET'
+
+RATES = range(0, 11)  # every valid rate, as checked on the rates table
+
+PAGE_DEFAULT_LIMIT = 20
+PAGE_MAX_LIMIT = 100
+
+RESPONSE_CACHE_MAX_SIZE = 1024
+
+# a server process reloads its in-memory state at most this often (seconds) when
+# other processes have changed the reviews
+RELOAD_INTERVAL = 1.0
+
+# the weighted average of a film counts this many extra rates of the prior rate
+LEADERBOARD_PRIOR_VOTES = 10
+LEADERBOARD_PRIOR_RATE = 5.0
+
+# films with fewer rates are left out of the most polarizing ones
+CATALOG_STATS_MIN_VOTES = 10
+
+SIMILAR_FILMS_TOP_K = 20  # neighbors kept per film
+# cells of the film x film similarity matrix computed at once, at most 16M
+# similarities of 8 bytes and their two indexes
+SIMILARITY_BLOCK_CELLS = 2**24
+SIMILARITY_LOAD_BATCH_SIZE = 100_000  # rates fetched at once by a rebuild
+
+REVIEWS_BATCH_MAX_SIZE = 10_000
+# reviews written per transaction, the film slugs of a chunk are bound as
+# parameters of a single query, so it stays below SQLite's variable limit
+REVIEWS_BATCH_CHUNK_SIZE = 500
+
+EXPORT_BATCH_SIZE = 1000
+
+IMPORT_CHUNK_SIZE = 10_000  # rows inserted per transaction
+
+PROFILE_HEADER = b'x-profile'  # lowercase, as ASGI servers pass header names
+PROFILE_TOP_FUNCTIONS = 20  # slowest functions logged of a profiled request
+
 
 class ErrorMessage(Enum):
     INCORRECT_LOGIN = 'incorrect login'
@@ -10,7 +52,44 @@ class ErrorMessage(Enum):
     NOT_FULL_ENTITY = 'not full entity'
     ALREADY_EXIST = 'already exist'
     INCORRECT_RATE_RANGE = 'incorrect range of rate, must be in 0 to 10'
+    NOT_AUTHENTICATED = 'not authenticated'
+    INVALID_TOKEN = 'invalid or expired token'
+    INVALID_CURSOR = 'invalid cursor'
+    SIMILAR_FILMS_NOT_READY = 'similar films are not computed yet, retry later'
 
 
 class Sort(Enum):
     BY_RATE = 'rate'
+    BY_RATE_COUNT = 'rate_count'
+    BY_COMMENT_COUNT = 'comment_count'
+    BY_YEAR = 'year'
+    BY_NAME = 'name'
+
+
+class SortOrder(Enum):
+    ASC = 'asc'
+    DESC = 'desc'
+
+
+class ReviewStatus(Enum):
+    CREATED = 'created'
+    CONFLICT = 'conflict'
+    FILM_NOT_FOUND = 'film not found'
+
+
+class ExportTable(Enum):
+    FILMS = 'films'
+    RATES = 'rates'
+    COMMENTS = 'comments'
+
+
+class ImportTable(Enum):
+    FILMS = 'films'
+    USERS = 'users'
+    RATES = 'rates'
+    COMMENTS = 'comments'
+
+
+class ExportFormat(Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
@@ -1,60 +1,150 @@
+import asyncio
+from functools import partial
 from http import HTTPStatus
+from typing import Any, Sequence, Type, Union
 
 import bcrypt
 from fastapi import HTTPException
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
-from app.constants import ErrorMessage
-from app.db import CommentOrm, RateOrm, UserOrm, create_session
+from app.constants import REVIEWS_BATCH_CHUNK_SIZE, ErrorMessage, ReviewStatus
+from app.db import CommentOrm, RateOrm, UserOrm
 from app.db_queries import (
-    get_film_by_slug,
-    get_user_by_login,
-    get_users_film_comment,
-    get_users_film_rate,
+    apply_review_change,
+    apply_review_changes,
+    get_review_change,
+    get_review_target,
+    get_review_targets,
 )
-from app.request_models import NewRate, NewReview, NewUser
+from app.request_models import BatchRate, BatchReview, NewRate, NewReview, NewUser
+from app.utils import run_bcrypt
+from app.writer import writer
 
 
 def create_comment_with_rate(
     film_slug: str, login: str, review: NewReview, session: sessionmaker
 ) -> None:
-    film = get_film_by_slug(film_slug, session)
-    user = get_user_by_login(login, session)
-    rate_row = get_users_film_rate(film, session, user)
-    comment_row = get_users_film_comment(film, session, user)
-    if rate_row or comment_row:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT, detail=ErrorMessage.ALREADY_EXIST.value
-        )
-    new_rate = RateOrm(user_id=user.id, film_id=film.id, rate=review.rate)
-    new_comment = CommentOrm(user_id=user.id, film_id=film.id, comment=review.comment)
-    session.add_all([new_rate, new_comment])
+    target = get_review_target(film_slug, login, session)
+    _insert_review_row(RateOrm, target, session, rate=review.rate)
+    _insert_review_row(CommentOrm, target, session, comment=review.comment)
+    apply_review_change(
+        get_review_change(film_slug, target, review.rate), session, comment_count=1
+    )
 
 
 def create_rate(
     film_slug: str, login: str, review: NewRate, session: sessionmaker
 ) -> None:
-    film = get_film_by_slug(film_slug, session)
-    user = get_user_by_login(login, session)
-    rate_row = get_users_film_rate(film, session, user)
-    if rate_row:
-        raise HTTPException(
-            status_code=HTTPStatus.CONFLICT, detail=ErrorMessage.ALREADY_EXIST.value
+    target = get_review_target(film_slug, login, session)
+    _insert_review_row(RateOrm, target, session, rate=review.rate)
+    apply_review_change(get_review_change(film_slug, target, review.rate), session)
+
+
+def create_review(
+    film_slug: str,
+    login: str,
+    review: Union[NewReview, NewRate],
+    session: sessionmaker,
+) -> None:
+    if isinstance(review, NewReview):
+        create_comment_with_rate(film_slug, login, review, session)
+    elif isinstance(review, NewRate):
+        create_rate(film_slug, login, review, session)
+
+
+async def create_reviews_batch(
+    login: str, reviews: Sequence[Union[BatchReview, BatchRate]]
+) -> list[ReviewStatus]:
+    """
+    Create many reviews of one author, chunk by chunk: every chunk is a single
+    write with one lookup query and one executemany insert per table.
+    """
+    chunks = [
+        writer.submit(
+            partial(
+                _create_reviews_chunk,
+                login,
+                reviews[start : start + REVIEWS_BATCH_CHUNK_SIZE],
+            )
         )
-    new_rate = RateOrm(user_id=user.id, film_id=film.id, rate=review.rate)
-    session.add(new_rate)
+        for start in range(0, len(reviews), REVIEWS_BATCH_CHUNK_SIZE)
+    ]
+    results = await asyncio.gather(*map(asyncio.wrap_future, chunks))
+    return [status for statuses in results for status in statuses]
 
 
-def create_new_user(user: NewUser) -> None:
+async def create_new_user(user: NewUser) -> None:
+    new_user = UserOrm(
+        user_name=user.login,
+        password=await run_bcrypt(
+            bcrypt.hashpw, user.password.encode('utf-8'), bcrypt.gensalt()
+        ),
+    )
     try:
-        with create_session() as session:
-            new_user = UserOrm(
-                user_name=user.login,
-                password=bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt()),
-            )
-            session.add(new_user)
+        await writer.run_async(lambda session: session.add(new_user))
     except IntegrityError as user_already_exist:
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT, detail=ErrorMessage.ALREADY_EXIST.value
         ) from user_already_exist
+
+
+def _insert_review_row(
+    model: Union[Type[RateOrm], Type[CommentOrm]],
+    target: Row,
+    session: sessionmaker,
+    **values: Union[int, str],
+) -> None:
+    inserted = session.execute(
+        insert(model)
+        .values(film_id=target.film_id, user_id=target.user_id, **values)
+        .on_conflict_do_nothing(index_elements=['film_id', 'user_id'])
+    )
+    if not inserted.rowcount:
+        raise HTTPException(
+            status_code=HTTPStatus.CONFLICT, detail=ErrorMessage.ALREADY_EXIST.value
+        )
+
+
+def _create_reviews_chunk(
+    login: str,
+    reviews: Sequence[Union[BatchReview, BatchRate]],
+    session: sessionmaker,
+) -> list[ReviewStatus]:
+    targets = get_review_targets(
+        {review.film_slug for review in reviews}, login, session
+    )
+    statuses = []
+    rates: list[dict[str, Any]] = []
+    comments: list[dict[str, Any]] = []
+    changes = []
+    reviewed_film_ids = set()
+    for review in reviews:
+        target = targets.get(review.film_slug)
+        if target is None:
+            statuses.append(ReviewStatus.FILM_NOT_FOUND)
+            continue
+        has_comment = isinstance(review, BatchReview)
+        if (
+            target.rate is not None
+            or target.film_id in reviewed_film_ids
+            or (has_comment and target.comment_id is not None)
+        ):
+            statuses.append(ReviewStatus.CONFLICT)
+            continue
+        reviewed_film_ids.add(target.film_id)
+        row = {'film_id': target.film_id, 'user_id': target.user_id}
+        rates.append({**row, 'rate': review.rate})
+        if isinstance(review, BatchReview):
+            comments.append({**row, 'comment': review.comment})
+        changes.append(
+            (get_review_change(review.film_slug, target, review.rate), int(has_comment))
+        )
+        statuses.append(ReviewStatus.CREATED)
+    for table, rows in ((RateOrm.__table__, rates), (CommentOrm.__table__, comments)):
+        if rows:
+            session.execute(table.insert(), rows)
+    apply_review_changes(changes, session)
+    return statuses
@@ -0,0 +1,77 @@
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+from sqlalchemy import event
+
+from app.constants import CREDENTIALS_CACHE_MAX_SIZE, CREDENTIALS_CACHE_TTL
+from app.db import UserOrm
+
+
+class CredentialsCache:
+    """
+    Bounded LRU cache of recently verified credentials.
+
+    Only a keyed digest of the password is kept, so a cache hit proves that the
+    same password was already checked by bcrypt within the last ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._key = secrets.token_bytes(32)
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._lock = Lock()
+
+    def is_verified(self, login: str, password: str) -> bool:
+        digest = self._digest(password)
+        with self._lock:
+            entry = self._entries.get(login)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[login]
+                entry = None
+            if entry is None or not hmac.compare_digest(entry[0], digest):
+                self.misses += 1
+                return False
+            self._entries.move_to_end(login)
+            self.hits += 1
+            return True
+
+    def add(self, login: str, password: str) -> None:
+        digest = self._digest(password)
+        with self._lock:
+            self._entries[login] = (digest, time.monotonic() + self.ttl)
+            self._entries.move_to_end(login)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, login: str) -> None:
+        with self._lock:
+            self._entries.pop(login, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _digest(self, password: str) -> bytes:
+        return hmac.new(self._key, password.encode(), hashlib.sha256).digest()
+
+
+credentials_cache = CredentialsCache(CREDENTIALS_CACHE_MAX_SIZE, CREDENTIALS_CACHE_TTL)
+
+
+@event.listens_for(UserOrm.password, 'set')
+def _invalidate_changed_password(target: UserOrm, *_: Any) -> None:
+    if target.user_name is not None:
+        credentials_cache.invalidate(target.user_name)
@@ -1,21 +1,148 @@
-from contextlib import contextmanager
-from pathlib import Path
-from typing import Any
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
 
 import sqlalchemy as sa
-from sqlalchemy import CheckConstraint
+from sqlalchemy import DDL, CheckConstraint, event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session as OrmSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-from app.constants import DB_FILE_PATH
+from app.file_locks import lock_file
+from app.metrics import listen_sql_metrics
+from app.migrations import (
+    AVERAGE_RATE_SQL,
+    CREATE_FILM_STATS_TRIGGER,
+    FILMS_SEARCH_DDL,
+    migrate,
+    stamp_schema_version,
+)
+from app.profiling import listen_sql_profile
+from app.settings import Settings, settings
 
-engine = sa.create_engine(f'sqlite:///{DB_FILE_PATH}')
+T = TypeVar('T')
+
+
+def create_db_engine(db_settings: Settings, read_only: bool = False) -> Engine:
+    """
+    Readers get a pool of ``query_only`` connections. The writer engine has a
+    single connection, its transactions start with ``BEGIN IMMEDIATE`` to take
+    the write lock up front instead of failing to upgrade a read lock later.
+    """
+    pragmas = db_settings.sqlite_pragmas
+    if read_only:
+        pool_size, max_overflow = db_settings.pool_size, db_settings.max_overflow
+        pragmas = {**pragmas, 'query_only': 'ON'}
+    else:
+        pool_size, max_overflow = 1, 0
+    db_engine = sa.create_engine(
+        db_settings.database_url,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=db_settings.pool_timeout,
+        # a connection is never shared between threads at the same time, but a
+        # streamed response fetches every batch from whichever worker is free
+        connect_args={'check_same_thread': False},
+    )
+    _listen_connection_events(db_engine, read_only, pragmas)
+    return db_engine
+
+
+def create_async_read_engine(db_settings: Settings) -> AsyncEngine:
+    """Same as the read engine of ``create_db_engine``, driven by aiosqlite."""
+    async_engine = create_async_engine(
+        sa.engine.make_url(db_settings.database_url).set(drivername='sqlite+aiosqlite'),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=db_settings.pool_size,
+        max_overflow=db_settings.max_overflow,
+        pool_timeout=db_settings.pool_timeout,
+    )
+    _listen_connection_events(
+        async_engine.sync_engine,
+        True,
+        {**db_settings.sqlite_pragmas, 'query_only': 'ON'},
+    )
+    return async_engine
+
+
+def _listen_connection_events(
+    db_engine: Engine, read_only: bool, pragmas: dict[str, Any]
+) -> None:
+    event.listen(db_engine, 'connect', partial(_set_sqlite_pragmas, pragmas=pragmas))
+    event.listen(
+        db_engine,
+        'begin',
+        partial(_begin, statement='BEGIN' if read_only else 'BEGIN IMMEDIATE'),
+    )
+
+
+def _set_sqlite_pragmas(
+    dbapi_connection: Any, _connection_record: Any, pragmas: dict[str, Any]
+) -> None:
+    # pysqlite's own transaction handling defers BEGIN to the first write and
+    # breaks SAVEPOINTs, so transactions are started by _begin instead
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+def _begin(connection: Connection, statement: str) -> None:
+    cursor = connection.connection.cursor()
+    cursor.execute(statement)
+    cursor.close()
+
+
+engine = create_db_engine(settings)
+read_engine = create_db_engine(settings, read_only=True)
+async_read_engine = create_async_read_engine(settings)
+listen_sql_metrics(engine, 'writer')
+listen_sql_metrics(read_engine, 'read')
+listen_sql_metrics(async_read_engine.sync_engine, 'async_read')
+for profiled_engine in (engine, read_engine, async_read_engine.sync_engine):
+    listen_sql_profile(profiled_engine)
 Base = declarative_base()
 
 
 @contextmanager
 def create_session(**kwargs: Any) -> sessionmaker:
-    new_session = Session(**kwargs)
+    """
+    Session of the writer connection. Request handlers write through
+    ``app.writer.writer`` instead, which serializes and group-commits them.
+    """
+    with _session_scope(Session, **kwargs) as session:
+        yield session
+
+
+@contextmanager
+def create_read_session(**kwargs: Any) -> sessionmaker:
+    with _session_scope(ReadSession, **kwargs) as session:
+        yield session
+
+
+@asynccontextmanager
+async def create_async_read_session(**kwargs: Any) -> AsyncIterator[AsyncSession]:
+    async with AsyncReadSession(**kwargs) as session:
+        yield session
+
+
+async def run_read(read: Callable[[OrmSession], T]) -> T:
+    """
+    Run sync ORM reading code on an async read connection, the event loop is
+    free while the queries wait for the database.
+    """
+    async with create_async_read_session() as session:
+        return await session.run_sync(read)
+
+
+@contextmanager
+def _session_scope(session_factory: sessionmaker, **kwargs: Any) -> sessionmaker:
+    new_session = session_factory(**kwargs)
     try:
         yield new_session
         new_session.commit()
@@ -28,6 +155,10 @@ def create_session(**kwargs: Any) -> sessionmaker:
 
 class FilmOrm(Base):  # type: ignore
     __tablename__ = 'films'
+    __table_args__ = (
+        sa.Index('ix_films_year', 'year'),
+        sa.Index('ix_films_film_name', 'film_name'),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True)
     film_name = sa.Column(sa.String(), nullable=False)
@@ -35,6 +166,10 @@ class FilmOrm(Base):  # type: ignore
     year = sa.Column(sa.Integer, nullable=False)
 
 
+for films_search_statement in FILMS_SEARCH_DDL:
+    event.listen(FilmOrm.__table__, 'after_create', DDL(films_search_statement))
+
+
 class UserOrm(Base):  # type: ignore
     __tablename__ = 'users'
 
@@ -45,7 +180,11 @@ class UserOrm(Base):  # type: ignore
 
 class RateOrm(Base):  # type: ignore
     __tablename__ = 'rates'
-    __table_args__ = (CheckConstraint('0 <= rate <= 10'),)
+    __table_args__ = (
+        CheckConstraint('0 <= rate <= 10'),
+        sa.Index('ix_rates_film_id_user_id', 'film_id', 'user_id', unique=True),
+        sa.Index('ix_rates_film_id', 'film_id'),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True)
     user_id = sa.Column(sa.Integer, sa.ForeignKey('users.id'), nullable=False)
@@ -55,6 +194,10 @@ class RateOrm(Base):  # type: ignore
 
 class CommentOrm(Base):  # type: ignore
     __tablename__ = 'comments'
+    __table_args__ = (
+        sa.Index('ix_comments_film_id_user_id', 'film_id', 'user_id', unique=True),
+        sa.Index('ix_comments_film_id', 'film_id'),
+    )
 
     id = sa.Column(sa.Integer, primary_key=True)
     user_id = sa.Column(sa.Integer, sa.ForeignKey('users.id'), nullable=False)
@@ -62,26 +205,81 @@ class CommentOrm(Base):  # type: ignore
     comment = sa.Column(sa.String(), nullable=False)
 
 
+class FilmStatsOrm(Base):  # type: ignore
+    __tablename__ = 'film_stats'
+    # the sortable columns, an index entry ends with the rowid (film_id), which
+    # breaks ties in the keyset order of the film listings
+    __table_args__ = (
+        sa.Index('ix_film_stats_average_rate', 'average_rate'),
+        sa.Index('ix_film_stats_rate_count', 'rate_count'),
+        sa.Index('ix_film_stats_comment_count', 'comment_count'),
+    )
+
+    film_id = sa.Column(sa.Integer, sa.ForeignKey('films.id'), primary_key=True)
+    rate_sum = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_count = sa.Column(sa.Integer, nullable=False, server_default='0')
+    comment_count = sa.Column(sa.Integer, nullable=False, server_default='0')
+    # how many times the film got each rate, 0 to 10
+    rate_0 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_1 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_2 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_3 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_4 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_5 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_6 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_7 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_8 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_9 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    rate_10 = sa.Column(sa.Integer, nullable=False, server_default='0')
+    average_rate = sa.Column(
+        sa.Float, sa.Computed(AVERAGE_RATE_SQL, persisted=False), nullable=False
+    )
+
+
+# every film gets its (empty) stats row, whichever way it is inserted
+event.listen(FilmStatsOrm.__table__, 'after_create', DDL(CREATE_FILM_STATS_TRIGGER))
+
 Session = sessionmaker(bind=engine)
+ReadSession = sessionmaker(bind=read_engine)
+AsyncReadSession = sessionmaker(bind=async_read_engine, class_=AsyncSession)
 
 
 def init_db(base: declarative_base, db_engine: sa.create_engine) -> None:
-    if not Path(DB_FILE_PATH).is_file():
-        base.metadata.create_all(db_engine)
-        with create_session() as session:
-            films = (
-                FilmOrm(film_name='The Gentlemen', slug='the-gentlemen', year=2019),
-                FilmOrm(film_name='Kizumonogatari', slug='kizumonogatari', year=2016),
-                FilmOrm(film_name='Snatch', slug='snatch', year=2000),
-                FilmOrm(
-                    film_name='Lock, Stock and Two Smoking Barrels',
-                    slug='lock-stock-and-two-smoking-barrels',
-                    year=1998,
-                ),
-                FilmOrm(
-                    film_name='The Shawshank Redemption',
-                    slug='the-shawshank-redemption',
-                    year=1994,
-                ),
-            )
-            session.add_all(films)
+    """
+    Create and seed or migrate the schema. Safe to run from many processes at
+    once: they take turns on a lock file and the schema is created and seeded
+    in a single transaction, so the later ones only find it up to date.
+    """
+    with _schema_lock(db_engine.url.database), db_engine.begin() as connection:
+        if sa.inspect(connection).has_table(FilmOrm.__tablename__):
+            migrate(connection)
+            return
+        base.metadata.create_all(connection)
+        stamp_schema_version(connection)
+        connection.execute(
+            FilmOrm.__table__.insert(),
+            [
+                {'film_name': 'The Gentlemen', 'slug': 'the-gentlemen', 'year': 2019},
+                {'film_name': 'Kizumonogatari', 'slug': 'kizumonogatari', 'year': 2016},
+                {'film_name': 'Snatch', 'slug': 'snatch', 'year': 2000},
+                {
+                    'film_name': 'Lock, Stock and Two Smoking Barrels',
+                    'slug': 'lock-stock-and-two-smoking-barrels',
+                    'year': 1998,
+                },
+                {
+                    'film_name': 'The Shawshank Redemption',
+                    'slug': 'the-shawshank-redemption',
+                    'year': 1994,
+                },
+            ],
+        )
+
+
+@contextmanager
+def _schema_lock(database: Optional[str]) -> Iterator[None]:
+    if not database or database == ':memory:':
+        yield
+        return
+    with lock_file(f'{database}.lock'):
+        yield
@@ -42,6 +42,15 @@ class CommentModel(BaseModel):
         orm_mode = True
 
 
+class RateDistributionModel(BaseModel):
+    histogram: list[int]  # how many times the film got each rate, 0 to 10
+    median: Optional[float]
+    p10: Optional[float]
+    p25: Optional[float]
+    p75: Optional[float]
+    p90: Optional[float]
+
+
 class FilmWithMoreInfoModel(BaseModel):
     id: int
     film_name: str
@@ -50,6 +59,46 @@ class FilmWithMoreInfoModel(BaseModel):
     average_rate: Optional[float]
     rate_number: Optional[int]
     comment_number: Optional[int]
+    rate_distribution: RateDistributionModel
 
     class Config:
         orm_mode = True
+
+
+class TopFilmModel(BaseModel):
+    id: int
+    film_name: str
+    slug: str
+    year: int
+    score: float
+    average_rate: float
+    rate_number: int
+
+
+class SimilarFilmModel(BaseModel):
+    id: int
+    slug: str
+    film_name: str
+    similarity: float  # adjusted cosine of the rates, from 0 to 1
+
+
+class YearStatsModel(BaseModel):
+    year: int
+    films: int
+    rate_number: int
+    average_rate: Optional[float]
+
+
+class RateNumberBucketModel(BaseModel):
+    min_rates: int
+    max_rates: int
+    films: int
+
+
+class PolarizingFilmModel(BaseModel):
+    id: int
+    slug: str
+    film_name: str
+    rate_number: int
+    average_rate: float
+    rate_deviation: float  # standard deviation of the rates of the film
@@ -1,58 +1,253 @@
-from typing import Union
+import re
+from typing import Iterable, Union
 
+import sqlalchemy as sa
 from fastapi import HTTPException
-from sqlalchemy import distinct, func
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, func
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query, sessionmaker
 
-from app.constants import ErrorMessage
-from app.db import CommentOrm, FilmOrm, RateOrm, UserOrm
+from app.constants import RATES, ErrorMessage
+from app.db import CommentOrm, FilmOrm, FilmStatsOrm, RateOrm, UserOrm
+from app.events import FilmReviewChange, record_change
 
+FILMS_SEARCH = sa.table('films_fts', sa.column('rowid'), sa.column('rank'))
 
-def get_users_film_comment(
-    film: FilmOrm, session: sessionmaker, user: UserOrm
-) -> CommentOrm:
-    return (
-        session.query(CommentOrm)
-        .filter(CommentOrm.user_id == user.id, CommentOrm.film_id == film.id)
-        .first()
-    )
+AVERAGE_RATE = func.nullif(FilmStatsOrm.average_rate, -1)
 
+RATE_HISTOGRAM = [getattr(FilmStatsOrm, f'rate_{rate}') for rate in RATES]
 
-def get_user_by_login(login: str, session: sessionmaker) -> UserOrm:
-    return session.query(UserOrm).filter(UserOrm.user_name == login).one()
+
+def get_review_target(film_slug: str, login: str, session: sessionmaker) -> Row:
+    """
+    Resolve the film, the user and the user's current review of the film with a
+    single query, so the write paths don't need a lookup per entity.
+    """
+    target = (
+        _get_review_targets(login, session)
+        .filter(FilmOrm.slug == film_slug)
+        .one_or_none()
+    )
+    if target is None:
+        raise HTTPException(status_code=404, detail=ErrorMessage.FILM_NOT_FOUND.value)
+    return target
 
 
-def get_film_by_slug(film_slug: str, session: sessionmaker) -> FilmOrm:
-    try:
-        return session.query(FilmOrm).filter(FilmOrm.slug == film_slug).one()
-    except SQLAlchemyError as film_not_found:
-        raise HTTPException(
-            status_code=404, detail=ErrorMessage.FILM_NOT_FOUND.value
-        ) from film_not_found
+def get_review_targets(
+    film_slugs: Iterable[str], login: str, session: sessionmaker
+) -> dict[str, Row]:
+    """
+    Same as ``get_review_target`` for many films at once, unknown slugs are
+    missing from the result.
+    """
+    targets = _get_review_targets(login, session).filter(FilmOrm.slug.in_(film_slugs))
+    return {target.film_slug: target for target in targets}
 
 
-def get_users_film_rate(film: FilmOrm, session: sessionmaker, user: UserOrm) -> RateOrm:
+def _get_review_targets(login: str, session: sessionmaker) -> Query:
     return (
-        session.query(RateOrm)
-        .filter(RateOrm.user_id == user.id, RateOrm.film_id == film.id)
-        .first()
+        session.query(
+            FilmOrm.id.label('film_id'),
+            FilmOrm.slug.label('film_slug'),
+            UserOrm.id.label('user_id'),
+            RateOrm.rate,
+            CommentOrm.id.label('comment_id'),
+        )
+        .select_from(FilmOrm)
+        .join(UserOrm, UserOrm.user_name == login)
+        .outerjoin(
+            RateOrm, and_(RateOrm.film_id == FilmOrm.id, RateOrm.user_id == UserOrm.id)
+        )
+        .outerjoin(
+            CommentOrm,
+            and_(CommentOrm.film_id == FilmOrm.id, CommentOrm.user_id == UserOrm.id),
+        )
     )
 
 
 def get_films_with_more_info(
     session: sessionmaker,
-) -> Union[FilmOrm, RateOrm, CommentOrm]:
+) -> Union[FilmOrm, FilmStatsOrm]:
+    return session.query(
+        FilmOrm.id,
+        FilmOrm.film_name,
+        FilmOrm.slug,
+        FilmOrm.year,
+        AVERAGE_RATE.label('average_rate'),
+        FilmStatsOrm.rate_count.label('rate_number'),
+        FilmStatsOrm.comment_count.label('comment_number'),
+        *RATE_HISTOGRAM,
+    ).join(FilmStatsOrm, FilmStatsOrm.film_id == FilmOrm.id)
+
+
+def get_leaderboard_films(session: sessionmaker) -> list[Row]:
+    """Fields of ``LeaderboardFilm``, for every film."""
     return (
         session.query(
             FilmOrm.id,
             FilmOrm.film_name,
             FilmOrm.slug,
             FilmOrm.year,
-            func.avg(RateOrm.rate).label('average_rate'),
-            func.count(distinct(RateOrm.rate)).label('rate_number'),
-            func.count(distinct(CommentOrm.comment)).label('comment_number'),
+            FilmStatsOrm.rate_sum,
+            FilmStatsOrm.rate_count,
+        )
+        .join(FilmStatsOrm, FilmStatsOrm.film_id == FilmOrm.id)
+        .all()
+    )
+
+
+def get_catalog_stats_films(session: sessionmaker) -> list[Row]:
+    """Every film with its rate histogram, by id."""
+    return (
+        session.query(
+            FilmOrm.id, FilmOrm.slug, FilmOrm.film_name, FilmOrm.year, *RATE_HISTOGRAM
         )
-        .outerjoin(RateOrm, RateOrm.film_id == FilmOrm.id)
-        .outerjoin(CommentOrm, CommentOrm.film_id == FilmOrm.id)
+        .join(FilmStatsOrm, FilmStatsOrm.film_id == FilmOrm.id)
+        .order_by(FilmOrm.id)
+        .all()
+    )
+
+
+def get_similar_films_catalog(session: sessionmaker) -> list[Row]:
+    """Every film, by id."""
+    return (
+        session.query(FilmOrm.id, FilmOrm.slug, FilmOrm.film_name)
+        .order_by(FilmOrm.id)
+        .all()
+    )
+
+
+def get_review_change(film_slug: str, target: Row, rate: int) -> FilmReviewChange:
+    return FilmReviewChange(
+        film_id=target.film_id,
+        film_slug=film_slug,
+        user_id=target.user_id,
+        old_rate=target.rate,
+        new_rate=rate,
+    )
+
+
+def apply_review_change(
+    change: FilmReviewChange, session: sessionmaker, comment_count: int = 0
+) -> None:
+    """
+    Account a written rate (and ``comment_count`` new comments) in the film stats
+    and announce the change once the session commits.
+    """
+    is_new_rate = change.old_rate is None
+    values = {
+        FilmStatsOrm.rate_sum: FilmStatsOrm.rate_sum
+        + change.new_rate
+        - (change.old_rate or 0),
+        FilmStatsOrm.rate_count: FilmStatsOrm.rate_count + int(is_new_rate),
+        FilmStatsOrm.comment_count: FilmStatsOrm.comment_count + comment_count,
+    }
+    for rate, delta in _get_histogram_delta(change).items():
+        values[RATE_HISTOGRAM[rate]] = RATE_HISTOGRAM[rate] + delta
+    session.query(FilmStatsOrm).filter(FilmStatsOrm.film_id == change.film_id).update(
+        values, synchronize_session=False
+    )
+    record_change(session, change)
+
+
+def apply_review_changes(
+    changes: Iterable[tuple[FilmReviewChange, int]], session: sessionmaker
+) -> None:
+    """
+    Bulk ``apply_review_change``: the deltas of (change, comment_count) pairs are
+    summed per film and written with one executemany update.
+    """
+    deltas: dict[int, dict[str, int]] = {}
+    for change, comment_count in changes:
+        delta = deltas.setdefault(
+            change.film_id,
+            {
+                'stats_film_id': change.film_id,
+                'rates': 0,
+                'new_rates': 0,
+                'comments': 0,
+                **{f'histogram_{rate}': 0 for rate in RATES},
+            },
+        )
+        delta['rates'] += (change.new_rate or 0) - (change.old_rate or 0)
+        delta['new_rates'] += int(change.old_rate is None)
+        delta['comments'] += comment_count
+        for rate, histogram_delta in _get_histogram_delta(change).items():
+            delta[f'histogram_{rate}'] += histogram_delta
+        record_change(session, change)
+    if not deltas:
+        return
+    stats = FilmStatsOrm.__table__
+    session.execute(
+        stats.update()
+        .where(stats.c.film_id == sa.bindparam('stats_film_id'))
+        .values(
+            rate_sum=stats.c.rate_sum + sa.bindparam('rates'),
+            rate_count=stats.c.rate_count + sa.bindparam('new_rates'),
+            comment_count=stats.c.comment_count + sa.bindparam('comments'),
+            **{
+                f'rate_{rate}': stats.c[f'rate_{rate}']
+                + sa.bindparam(f'histogram_{rate}')
+                for rate in RATES
+            },
+        ),
+        list(deltas.values()),
+    )
+
+
+def _get_histogram_delta(change: FilmReviewChange) -> dict[int, int]:
+    delta = {}
+    if change.old_rate != change.new_rate:
+        if change.old_rate is not None:
+            delta[change.old_rate] = -1
+        if change.new_rate is not None:
+            delta[change.new_rate] = 1
+    return delta
+
+
+def get_film_comments(film_slug: str, session: sessionmaker) -> Query:
+    return (
+        session.query(
+            CommentOrm.id, CommentOrm.user_id, CommentOrm.film_id, CommentOrm.comment
+        )
+        .join(FilmOrm, FilmOrm.id == CommentOrm.film_id)
+        .filter(FilmOrm.slug == film_slug)
+    )
+
+
+def get_film_rates(film_slug: str, session: sessionmaker) -> Query:
+    return (
+        session.query(RateOrm.id, RateOrm.user_id, RateOrm.film_id, RateOrm.rate)
+        .join(FilmOrm, FilmOrm.id == RateOrm.film_id)
+        .filter(FilmOrm.slug == film_slug)
+    )
+
+
+def get_user_password(login: str, session: sessionmaker) -> bytes:
+    return (
+        session.query(UserOrm.password)
+        .filter(UserOrm.user_name == login)
+        .one()
+        .password
+    )
+
+
+def check_film_exists(film_slug: str, session: sessionmaker) -> None:
+    film_query = session.query(FilmOrm.id).filter(FilmOrm.slug == film_slug)
+    if not session.query(film_query.exists()).scalar():
+        raise HTTPException(status_code=404, detail=ErrorMessage.FILM_NOT_FOUND.value)
+
+
+def search_films(films_query: Query, substr: str) -> Query:
+    """
+    Filter films by the full-text index, every word of ``substr`` matches as a
+    prefix of a word in the film name, case and diacritics are ignored.
+    """
+    words = re.findall(r'\w+', substr)
+    films_query = films_query.join(FILMS_SEARCH, FILMS_SEARCH.c.rowid == FilmOrm.id)
+    if not words:
+        return films_query.filter(sa.false())
+    search_query = ' '.join(f'"{word}"*' for word in words)
+    return films_query.filter(
+        sa.literal_column(FILMS_SEARCH.name).op('MATCH')(search_query)
     )
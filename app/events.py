@@ -0,0 +1,151 @@
+"""
+Notifications about committed review changes.
+
+Write paths record what they changed on the session, listeners are called only
+after that session commits, so in-memory state never sees rolled back writes.
+"""
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from multiprocessing.sharedctypes import Synchronized
+from threading import Lock
+from typing import TYPE_CHECKING, Callable, Iterator, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_PENDING_CHANGES = 'film_review_changes'
+
+if TYPE_CHECKING:
+    # a multiprocessing.Value, generic in the typeshed stubs only
+    SharedCounter = Synchronized[int]  # pylint: disable=unsubscriptable-object
+else:
+    SharedCounter = Synchronized
+
+
+class FilmReviewChange(NamedTuple):
+    film_id: int
+    film_slug: str
+    user_id: int
+    old_rate: Optional[int]
+    new_rate: Optional[int]
+
+
+ChangeListener = Callable[[FilmReviewChange], None]
+_listeners: list[ChangeListener] = []
+
+
+def subscribe(listener: ChangeListener) -> ChangeListener:
+    _listeners.append(listener)
+    return listener
+
+
+class FollowedState(ABC):
+    """
+    In-memory state loaded from the database, then kept up to date by the
+    committed review changes of this process.
+
+    Server processes forked from one parent share ``shared_version``, a count
+    of the changes. A process that sees changes made by the others goes stale,
+    and so does one whose load may have missed a change: ``claim_reload`` then
+    asks for a reload, at most once every ``reload_interval`` seconds, the first
+    load included. Subclasses update their state under ``_lock``.
+    """
+
+    def __init__(
+        self,
+        reload_interval: float,
+        shared_version: Optional[SharedCounter] = None,
+    ) -> None:
+        self.reload_interval = reload_interval
+        # grows with every change, local or seen from another process
+        self.version = 0
+        self._loaded = False
+        self._stale = True
+        self._reload_started: Optional[float] = None
+        self._lock = Lock()
+        self._shared_version = shared_version
+        self._seen_shared_version = (
+            shared_version.value if shared_version is not None else 0
+        )
+
+    def apply(self, change: FilmReviewChange) -> None:
+        with self._lock:
+            self._count_change()
+            if self._loaded and not self._apply_change(change):
+                self._stale = True
+
+    def claim_reload(self) -> bool:
+        """
+        Whether the caller should reload the state: it is out of date and no
+        other reload started within ``reload_interval``.
+        """
+        with self._lock:
+            self._sync_shared_version()
+            now = time.monotonic()
+            if not self._stale or (
+                self._reload_started is not None
+                and now < self._reload_started + self.reload_interval
+            ):
+                return False
+            self._reload_started = now
+            return True
+
+    @abstractmethod
+    def _apply_change(self, change: FilmReviewChange) -> bool:
+        """Update the loaded state, false if it can't follow the change."""
+
+    def _mark_loaded(self, version: int) -> None:
+        # the rows were read at ``version``, a later change may be missing
+        self._loaded = True
+        self._stale = version != self.version
+
+    def _count_change(self) -> None:
+        self.version += 1
+        if self._shared_version is None:
+            return
+        with self._shared_version.get_lock():
+            self._sync_shared_version()
+            self._shared_version.value += 1
+            self._seen_shared_version = self._shared_version.value
+
+    def _sync_shared_version(self) -> None:
+        if self._shared_version is None:
+            return
+        shared_version = self._shared_version.value
+        if shared_version != self._seen_shared_version:
+            self._seen_shared_version = shared_version
+            self.version += 1
+            self._stale = True
+
+
+def record_change(session: Session, change: FilmReviewChange) -> None:
+    session.info.setdefault(_PENDING_CHANGES, []).append(change)
+
+
+@contextmanager
+def savepoint(session: Session) -> Iterator[None]:
+    """
+    Run a block in a SAVEPOINT, the changes it recorded are dropped together
+    with its writes when it fails.
+    """
+    pending = session.info.setdefault(_PENDING_CHANGES, [])
+    recorded = len(pending)
+    try:
+        with session.begin_nested():
+            yield
+    except Exception:
+        del pending[recorded:]
+        raise
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session: Session) -> None:
+    for change in session.info.pop(_PENDING_CHANGES, ()):
+        for listener in _listeners:
+            listener(change)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session: Session) -> None:
+    session.info.pop(_PENDING_CHANGES, None)
@@ -0,0 +1,63 @@
+"""
+Streaming export of the films, rates and comments tables.
+
+Rows are read in id order through a streaming cursor and serialized batch by
+batch, so memory use doesn't depend on the table size. An interrupted export is
+resumed with ``after_id`` set to the last received id.
+"""
+import csv
+import io
+import json
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+
+from app.constants import EXPORT_BATCH_SIZE, ExportFormat, ExportTable
+from app.db import CommentOrm, FilmOrm, RateOrm, create_read_session
+
+EXPORT_COLUMNS = {
+    ExportTable.FILMS: (FilmOrm.id, FilmOrm.film_name, FilmOrm.slug, FilmOrm.year),
+    ExportTable.RATES: (RateOrm.id, RateOrm.film_id, RateOrm.user_id, RateOrm.rate),
+    ExportTable.COMMENTS: (
+        CommentOrm.id,
+        CommentOrm.film_id,
+        CommentOrm.user_id,
+        CommentOrm.comment,
+    ),
+}
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: 'application/x-ndjson',
+    ExportFormat.CSV: 'text/csv',
+}
+
+
+def export_rows(
+    table: ExportTable, export_format: ExportFormat, after_id: Optional[int] = None
+) -> Iterator[str]:
+    columns = EXPORT_COLUMNS[table]
+    query = select(*columns).order_by(columns[0])
+    if after_id is not None:
+        query = query.where(columns[0] > after_id)
+    if export_format == ExportFormat.CSV:
+        yield _to_csv([[column.key for column in columns]])
+    with create_read_session() as session:
+        result = session.execute(
+            query, execution_options={'stream_results': True}
+        ).yield_per(EXPORT_BATCH_SIZE)
+        for rows in result.partitions():
+            if export_format == ExportFormat.CSV:
+                yield _to_csv(rows)
+            else:
+                yield _to_ndjson(rows)
+
+
+def _to_ndjson(rows: list[Row]) -> str:
+    return ''.join(json.dumps(row._asdict()) + '\n' for row in rows)
+
+
+def _to_csv(rows: Iterable[Sequence[Any]]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
@@ -0,0 +1,38 @@
+"""
+Locks taken by the server processes on files next to the database.
+
+A lock is a file of its own: closing any descriptor of the database file itself
+would release the POSIX locks SQLite holds on it.
+"""
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # no locking on Windows, run a single worker there
+    fcntl = None  # type: ignore[assignment]
+
+
+@contextmanager
+def lock_file(path: str, blocking: bool = True) -> Iterator[bool]:
+    """
+    Hold an exclusive lock on ``path``, yield whether it was taken: always when
+    ``blocking``, otherwise only if no other process holds it. A process that
+    exits releases its locks.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, 'w', encoding='utf-8') as file:
+        try:
+            fcntl.flock(
+                file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            )
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
@@ -0,0 +1,241 @@
+"""
+Bulk import of films, users, rates and comments from CSV or NDJSON files:
+
+    python -m app.importer rates rates.csv
+
+The files have the columns of ``/export/<table>``, so an export can be loaded
+into another database. ``id`` may be left out to have one assigned. Users have
+a ``user_name`` and a ``password``, which must already be a bcrypt hash.
+
+Rows are inserted with Core ``executemany``, one transaction per chunk. With
+``--defer-indexes`` the indexes of rates and comments are dropped for the import
+and built once at the end, which is much faster than updating them row by row.
+Only pass it when no server uses the database: without the unique indexes, the
+reviews it writes in the meantime could repeat a film and user. A running
+server still doesn't see the imported rows in its in-memory state (cached
+responses, leaderboard, catalog stats and similar films): restart it once the
+import is done.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import IO, Any, Callable, Iterable, Iterator, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.constants import IMPORT_CHUNK_SIZE, ExportFormat, ImportTable
+from app.db import Base, CommentOrm, FilmOrm, RateOrm, UserOrm, engine, init_db
+from app.migrations import fill_film_stats
+
+
+def _to_password_hash(value: str) -> bytes:
+    if not value.startswith('$2'):
+        raise ValueError('password must be a bcrypt hash')
+    return value.encode()
+
+
+IMPORT_TABLES = {
+    ImportTable.FILMS: FilmOrm.__table__,
+    ImportTable.USERS: UserOrm.__table__,
+    ImportTable.RATES: RateOrm.__table__,
+    ImportTable.COMMENTS: CommentOrm.__table__,
+}
+
+IMPORT_COLUMNS: dict[ImportTable, dict[str, Callable[[Any], Any]]] = {
+    ImportTable.FILMS: {'film_name': str, 'slug': str, 'year': int},
+    ImportTable.USERS: {'user_name': str, 'password': _to_password_hash},
+    ImportTable.RATES: {'film_id': int, 'user_id': int, 'rate': int},
+    ImportTable.COMMENTS: {'film_id': int, 'user_id': int, 'comment': str},
+}
+
+IMPORT_FORMATS = {
+    '.csv': ExportFormat.CSV,
+    '.ndjson': ExportFormat.NDJSON,
+    '.jsonl': ExportFormat.NDJSON,
+}
+
+
+def read_rows(
+    file: IO[str], import_format: ExportFormat, table: ImportTable
+) -> Iterator[dict[str, Any]]:
+    records: Iterable[dict[str, Any]]
+    if import_format == ExportFormat.CSV:
+        records = csv.DictReader(file)
+    else:
+        records = (json.loads(line) for line in file if line.strip())
+    columns = IMPORT_COLUMNS[table]
+    for number, record in enumerate(records, start=1):
+        try:
+            row = {'id': int(record['id']) if record.get('id') else None}
+            for name, convert in columns.items():
+                row[name] = convert(record[name])
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError(f'record {number}: {error!r}') from error
+        yield row
+
+
+def import_rows(
+    table: ImportTable,
+    rows: Iterable[dict[str, Any]],
+    db_engine: Engine = engine,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    defer_indexes: bool = False,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Insert the rows and return how many there were. Chunks inserted before a
+    failing one stay imported. With ``defer_indexes``, a review repeated for
+    the same film and user only shows up when the unique index is rebuilt, and
+    then every row of this import is deleted again.
+    """
+    db_table = IMPORT_TABLES[table]
+    indexes = sorted(db_table.indexes, key=lambda index: index.name)
+    if not defer_indexes:
+        indexes = []
+    with db_engine.begin() as connection:
+        for index in indexes:
+            index.drop(connection, checkfirst=True)
+    # (after, last) id ranges of the inserted rows
+    inserted: list[tuple[int, int]] = []
+    try:
+        return _insert_chunks(db_engine, db_table, rows, chunk_size, progress, inserted)
+    finally:
+        _finish_import(db_engine, db_table, indexes, inserted)
+
+
+def _insert_chunks(
+    db_engine: Engine,
+    db_table: sa.Table,
+    rows: Iterable[dict[str, Any]],
+    chunk_size: int,
+    progress: Optional[Callable[[int], None]],
+    inserted: list[tuple[int, int]],
+) -> int:
+    rows = iter(rows)
+    imported = 0
+    max_id = sa.select(sa.func.coalesce(sa.func.max(db_table.c.id), 0))
+    while chunk := list(islice(rows, chunk_size)):
+        with db_engine.begin() as connection:
+            # the transaction holds the write lock, every id above the previous
+            # maximum is a row of this chunk
+            last_id = connection.execute(max_id).scalar()
+            connection.execute(db_table.insert(), chunk)
+            _add_range(inserted, last_id, connection.execute(max_id).scalar())
+        for row in chunk:
+            if row.get('id') is not None and row['id'] <= last_id:
+                _add_range(inserted, row['id'] - 1, row['id'])
+        imported += len(chunk)
+        if progress is not None:
+            progress(imported)
+    return imported
+
+
+def _add_range(ranges: list[tuple[int, int]], after: int, last: int) -> None:
+    if last <= after:
+        return
+    if ranges and ranges[-1][1] == after:
+        ranges[-1] = (ranges[-1][0], last)
+    else:
+        ranges.append((after, last))
+
+
+def _finish_import(
+    db_engine: Engine,
+    db_table: sa.Table,
+    indexes: list[sa.Index],
+    inserted: list[tuple[int, int]],
+) -> None:
+    try:
+        with db_engine.begin() as connection:
+            _create_indexes(connection, indexes)
+    except IntegrityError as duplicate_review:
+        _delete_inserted(db_engine, db_table, inserted)
+        try:
+            with db_engine.begin() as connection:
+                _create_indexes(connection, indexes)
+        except IntegrityError as duplicate_before:
+            raise ValueError(
+                'nothing was imported, but reviews repeated before the import keep '
+                f'the indexes of {db_table.name} from being rebuilt'
+            ) from duplicate_before
+        raise ValueError(
+            'a user reviews a film more than once, nothing was imported'
+        ) from duplicate_review
+    # the film stats are kept up to date by the app's writes only
+    if db_table in (RateOrm.__table__, CommentOrm.__table__):
+        with db_engine.begin() as connection:
+            fill_film_stats(connection)
+
+
+def _delete_inserted(
+    db_engine: Engine, db_table: sa.Table, inserted: list[tuple[int, int]]
+) -> None:
+    if not inserted:
+        return
+    with db_engine.begin() as connection:
+        connection.execute(
+            db_table.delete().where(
+                db_table.c.id > sa.bindparam('after'),
+                db_table.c.id <= sa.bindparam('last'),
+            ),
+            [{'after': after, 'last': last} for after, last in inserted],
+        )
+
+
+def _create_indexes(connection: sa.engine.Connection, indexes: list[sa.Index]) -> None:
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Import rows into the database.')
+    parser.add_argument('table', type=ImportTable, choices=list(ImportTable))
+    parser.add_argument('file', help='.csv, .ndjson or .jsonl file')
+    parser.add_argument('--format', type=ExportFormat, choices=list(ExportFormat))
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument('--defer-indexes', action='store_true')
+    args = parser.parse_args(argv)
+    import_format = args.format or IMPORT_FORMATS.get(os.path.splitext(args.file)[1])
+    if import_format is None:
+        parser.error('unknown file extension, pass --format')
+    init_db(Base, engine)
+    started = time.monotonic()
+    with open(args.file, 'rb') as raw_file, io.TextIOWrapper(
+        raw_file, encoding='utf-8', newline=''
+    ) as file:
+        size = os.fstat(raw_file.fileno()).st_size or 1
+
+        def report(imported: int) -> None:
+            print(
+                f'\r{args.table.value}: {imported} rows, '
+                f'{raw_file.tell() / size:.0%} of the file, '
+                f'{imported / (time.monotonic() - started):.0f} rows/s',
+                end='',
+                file=sys.stderr,
+            )
+
+        try:
+            imported = import_rows(
+                args.table,
+                read_rows(file, import_format, args.table),
+                engine,
+                chunk_size=args.chunk_size,
+                defer_indexes=args.defer_indexes,
+                progress=report,
+            )
+        except IntegrityError as error:
+            sys.exit(f'\nimport failed: {error.orig}')
+        except ValueError as error:
+            sys.exit(f'\nimport failed: {error}')
+    print(f'\n{args.table.value}: imported {imported} rows', file=sys.stderr)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
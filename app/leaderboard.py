@@ -0,0 +1,130 @@
+"""
+In-memory leaderboard of the best rated films, served by ``GET /films/top``.
+
+Films are ranked by a weighted average: their rates plus
+``LEADERBOARD_PRIOR_VOTES`` imaginary rates of ``LEADERBOARD_PRIOR_RATE``, so a
+film rated 10 once doesn't outrank one rated 9 by hundreds of users. The prior
+is a constant instead of the mean of all rates, a new rate then only moves its
+own film: one O(log n) update of a sorted list.
+
+The leaderboard is loaded from ``film_stats`` on startup, then follows the
+committed review changes as a ``FollowedState``.
+"""
+import ctypes
+import multiprocessing
+from typing import Any, Iterable, NamedTuple, Optional
+
+from sortedcontainers import SortedList
+
+from app.constants import (
+    LEADERBOARD_PRIOR_RATE,
+    LEADERBOARD_PRIOR_VOTES,
+    RELOAD_INTERVAL,
+)
+from app.db import create_read_session, run_read
+from app.db_queries import get_leaderboard_films
+from app.events import FilmReviewChange, FollowedState, SharedCounter, subscribe
+
+
+class LeaderboardFilm(NamedTuple):
+    id: int
+    film_name: str
+    slug: str
+    year: int
+    rate_sum: int
+    rate_count: int
+
+
+class Leaderboard(FollowedState):
+    def __init__(
+        self,
+        prior_votes: int,
+        prior_rate: float,
+        reload_interval: float,
+        shared_version: Optional[SharedCounter] = None,
+    ) -> None:
+        super().__init__(reload_interval, shared_version)
+        self.prior_votes = prior_votes
+        self.prior_rate = prior_rate
+        self._films: dict[int, LeaderboardFilm] = {}
+        # (-score, film id) of every rated film, the best first
+        self._ranking = SortedList()
+
+    def score(self, film: LeaderboardFilm) -> float:
+        return (film.rate_sum + self.prior_votes * self.prior_rate) / (
+            film.rate_count + self.prior_votes
+        )
+
+    def load(self, films: Iterable[Any], version: int) -> None:
+        """
+        Replace the ranking with ``films`` (rows of ``get_leaderboard_films``)
+        read at ``version``.
+        """
+        loaded = {film.id: LeaderboardFilm(*film) for film in films}
+        ranking = SortedList(
+            (-self.score(film), film.id) for film in loaded.values() if film.rate_count
+        )
+        with self._lock:
+            self._films = loaded
+            self._ranking = ranking
+            self._mark_loaded(version)
+
+    def top(self, limit: int) -> list[dict[str, Any]]:
+        """Content of ``TopFilmsResponse.films``."""
+        with self._lock:
+            films = [self._films[film_id] for _, film_id in self._ranking[:limit]]
+        return [
+            {
+                'id': film.id,
+                'film_name': film.film_name,
+                'slug': film.slug,
+                'year': film.year,
+                'score': self.score(film),
+                'average_rate': film.rate_sum / film.rate_count,
+                'rate_number': film.rate_count,
+            }
+            for film in films
+        ]
+
+    def _apply_change(self, change: FilmReviewChange) -> bool:
+        film = self._films.get(change.film_id)
+        if film is None:
+            # a film added since the load
+            return False
+        if film.rate_count:
+            self._ranking.remove((-self.score(film), film.id))
+        film = film._replace(
+            rate_sum=film.rate_sum + (change.new_rate or 0) - (change.old_rate or 0),
+            rate_count=film.rate_count
+            + (change.old_rate is None)
+            - (change.new_rate is None),
+        )
+        self._films[film.id] = film
+        if film.rate_count:
+            self._ranking.add((-self.score(film), film.id))
+        return True
+
+
+leaderboard = Leaderboard(
+    LEADERBOARD_PRIOR_VOTES,
+    LEADERBOARD_PRIOR_RATE,
+    RELOAD_INTERVAL,
+    multiprocessing.Value(ctypes.c_uint64, 0),
+)
+
+
+@subscribe
+def _apply_review_change(change: FilmReviewChange) -> None:
+    leaderboard.apply(change)
+
+
+def load_leaderboard() -> None:
+    version = leaderboard.version
+    with create_read_session() as session:
+        leaderboard.load(get_leaderboard_films(session), version)
+
+
+async def reload_leaderboard_if_stale() -> None:
+    if leaderboard.claim_reload():
+        version = leaderboard.version
+        leaderboard.load(await run_read(get_leaderboard_films), version)
@@ -0,0 +1,223 @@
+"""
+Request, SQL and bcrypt metrics in the Prometheus text format, served at
+``/metrics``.
+
+Recording a value is a dict lookup and an increment under a lock, the text is
+only rendered when the endpoint is scraped. Every server process counts its
+own requests, so under ``python -m app`` a scrape reaches one of the workers.
+"""
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Awaitable, Callable, Iterator, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = tuple[str, ...]
+
+# seconds, the default buckets of the Prometheus clients
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = Lock()
+        registry.append(self)
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}\n'
+        yield f'# TYPE {self.name} {self.type}\n'
+        with self._lock:
+            yield from self._samples()
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def _sample(
+        self, suffix: str, labels: Labels, value: float, extra_label: str = ''
+    ) -> str:
+        pairs = [
+            f'{name}="{_escape(label)}"'
+            for name, label in zip(self.label_names, labels)
+        ]
+        if extra_label:
+            pairs.append(extra_label)
+        label_text = f'{{{",".join(pairs)}}}' if pairs else ''
+        return f'{self.name}{suffix}{label_text} {value:g}\n'
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for labels, value in self._values.items():
+            yield self._sample('', labels, value)
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labels: str) -> None:
+        self.inc(*labels, amount=-1)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Labels = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+        # per labels: count of each bucket (not cumulative, the last one is
+        # +Inf), then the sum of the observed values
+        self._values: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def _samples(self) -> Iterator[str]:
+        for labels, counts in self._values.items():
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                yield self._sample('_bucket', labels, cumulative, f'le="{le}"')
+            yield self._sample('_count', labels, cumulative)
+            yield self._sample('_sum', labels, counts[-1])
+
+
+def _escape(label: str) -> str:
+    return label.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+registry: list[Metric] = []
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total',
+    'HTTP requests by route and status code.',
+    ('method', 'route', 'status'),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time from receiving a request to sending the last byte of its response.',
+    ('method', 'route'),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'HTTP requests being served.', ('method',)
+)
+SQL_STATEMENTS = Counter(
+    'sql_statements_total', 'SQL statements executed.', ('engine', 'statement')
+)
+SQL_STATEMENT_DURATION = Histogram(
+    'sql_statement_duration_seconds',
+    'Time spent executing SQL statements.',
+    ('engine',),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1),
+)
+SQL_ERRORS = Counter('sql_errors_total', 'SQL statements that failed.', ('engine',))
+BCRYPT_DURATION = Histogram(
+    'bcrypt_duration_seconds',
+    'Time spent hashing and checking passwords.',
+    ('function',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+def render_metrics() -> str:
+    return ''.join(line for metric in registry for line in metric.render())
+
+
+def listen_sql_metrics(db_engine: Engine, engine_name: str) -> None:
+    # statements of a connection can't overlap, the start time of the current
+    # one is kept on the connection
+    def before_cursor_execute(connection: Any, *_: Any) -> None:
+        connection.info['statement_started'] = time.perf_counter()
+
+    def after_cursor_execute(
+        connection: Any, _cursor: Any, statement: str, *_: Any
+    ) -> None:
+        started = connection.info.pop('statement_started', None)
+        if started is not None:
+            SQL_STATEMENT_DURATION.observe(time.perf_counter() - started, engine_name)
+        SQL_STATEMENTS.inc(engine_name, statement.split(None, 1)[0].upper())
+
+    def handle_error(context: Any) -> None:
+        if context.connection is not None:
+            context.connection.info.pop('statement_started', None)
+        SQL_ERRORS.inc(engine_name)
+
+    event.listen(db_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(db_engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(db_engine, 'handle_error', handle_error)
+
+
+class MetricsMiddleware:
+    """
+    Counts and times every request by the path of its route, so that all the
+    films share one ``/films/{film_slug}`` series.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]) -> None:
+        self.app = app
+        self._route_paths: dict[Callable[..., Any], str] = {}
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        status = 500
+
+        async def send_with_status(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec(method)
+            # the router has put the matched endpoint into the scope by now
+            route = self._route_path(scope)
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+
+    def _route_path(self, scope: dict[str, Any]) -> str:
+        endpoint: Optional[Callable[..., Any]] = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        if endpoint not in self._route_paths:
+            self._route_paths = {
+                route.endpoint: route.path for route in scope['app'].routes
+            }
+        return self._route_paths.get(endpoint, 'unmatched')
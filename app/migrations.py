@@ -0,0 +1,163 @@
+"""
+Versioned migrations for existing database files.
+
+The applied version is kept in SQLite's ``PRAGMA user_version``. New databases
+are created from the ORM models and stamped with the latest version, so the
+migrations below only ever run against files created by older releases.
+"""
+from typing import Callable
+
+from sqlalchemy.engine import Connection
+
+from app.constants import RATES
+
+CREATE_FILM_STATS_TRIGGER = (
+    'CREATE TRIGGER IF NOT EXISTS films_create_stats AFTER INSERT ON films '
+    'BEGIN INSERT INTO film_stats (film_id) VALUES (new.id); END'
+)
+
+# -1 for a film without rates: it sorts below every rated film, and the keyset
+# pagination of the films by rate never has to compare NULLs
+AVERAGE_RATE_SQL = 'coalesce(CAST(rate_sum AS REAL) / nullif(rate_count, 0), -1)'
+
+# the columns the films can be sorted by, with an index each
+SORT_INDEXES = (
+    ('films', 'year'),
+    ('films', 'film_name'),
+    ('film_stats', 'average_rate'),
+    ('film_stats', 'rate_count'),
+    ('film_stats', 'comment_count'),
+)
+
+# films_fts is an external content FTS5 index over films.film_name, the
+# triggers keep it in sync with every insert, update and delete of a film
+FILMS_SEARCH_DDL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS films_fts USING fts5('
+    "film_name, content='films', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS films_fts_insert AFTER INSERT ON films BEGIN '
+    'INSERT INTO films_fts (rowid, film_name) VALUES (new.id, new.film_name); END',
+    'CREATE TRIGGER IF NOT EXISTS films_fts_delete AFTER DELETE ON films BEGIN '
+    "INSERT INTO films_fts (films_fts, rowid, film_name) "
+    "VALUES ('delete', old.id, old.film_name); END",
+    'CREATE TRIGGER IF NOT EXISTS films_fts_update AFTER UPDATE OF film_name ON films '
+    "BEGIN INSERT INTO films_fts (films_fts, rowid, film_name) "
+    "VALUES ('delete', old.id, old.film_name); "
+    'INSERT INTO films_fts (rowid, film_name) VALUES (new.id, new.film_name); END',
+)
+
+
+def fill_film_stats(connection: Connection) -> None:
+    histogram_columns = ''.join(f', rate_{rate}' for rate in RATES)
+    histogram_counts = ''.join(
+        f', coalesce(sum(rates.rate = {rate}), 0)' for rate in RATES
+    )
+    connection.exec_driver_sql(
+        'INSERT OR REPLACE INTO film_stats '
+        f'(film_id, rate_sum, rate_count, comment_count{histogram_columns}) '
+        'SELECT films.id, coalesce(sum(rates.rate), 0), count(rates.id), '
+        '(SELECT count(*) FROM comments WHERE film_id = films.id)'
+        f'{histogram_counts} '
+        'FROM films LEFT JOIN rates ON rates.film_id = films.id GROUP BY films.id'
+    )
+
+
+def _fill_film_stats_totals(connection: Connection) -> None:
+    # fill_film_stats before the rate histogram was added
+    connection.exec_driver_sql(
+        'INSERT OR REPLACE INTO film_stats '
+        '(film_id, rate_sum, rate_count, comment_count) '
+        'SELECT films.id, '
+        '(SELECT coalesce(sum(rate), 0) FROM rates WHERE film_id = films.id), '
+        '(SELECT count(*) FROM rates WHERE film_id = films.id), '
+        '(SELECT count(*) FROM comments WHERE film_id = films.id) '
+        'FROM films'
+    )
+
+
+def _add_film_stats(connection: Connection) -> None:
+    connection.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS film_stats ('
+        'film_id INTEGER NOT NULL, '
+        "rate_sum INTEGER DEFAULT '0' NOT NULL, "
+        "rate_count INTEGER DEFAULT '0' NOT NULL, "
+        "comment_count INTEGER DEFAULT '0' NOT NULL, "
+        'PRIMARY KEY (film_id), '
+        'FOREIGN KEY(film_id) REFERENCES films (id))'
+    )
+    connection.exec_driver_sql(CREATE_FILM_STATS_TRIGGER)
+    _fill_film_stats_totals(connection)
+
+
+def _add_unique_review_indexes(connection: Connection) -> None:
+    for table in ('rates', 'comments'):
+        # only the latest review of a user survives, as it did for readers
+        connection.exec_driver_sql(
+            f'DELETE FROM {table} WHERE id NOT IN '
+            f'(SELECT max(id) FROM {table} GROUP BY film_id, user_id)'
+        )
+        connection.exec_driver_sql(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS ix_{table}_film_id_user_id '
+            f'ON {table} (film_id, user_id)'
+        )
+    _fill_film_stats_totals(connection)
+
+
+def _add_film_review_indexes(connection: Connection) -> None:
+    # entries of a single-column index are ordered by (film_id, id), which is
+    # exactly the keyset order of the per-film review listings
+    for table in ('rates', 'comments'):
+        connection.exec_driver_sql(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_film_id ON {table} (film_id)'
+        )
+
+
+def _add_films_search(connection: Connection) -> None:
+    for statement in FILMS_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO films_fts (films_fts) VALUES ('rebuild')")
+
+
+def _add_sort_indexes(connection: Connection) -> None:
+    # a virtual column costs no space in the table, only in its index
+    connection.exec_driver_sql(
+        'ALTER TABLE film_stats ADD COLUMN average_rate FLOAT NOT NULL '
+        f'GENERATED ALWAYS AS ({AVERAGE_RATE_SQL}) VIRTUAL'
+    )
+    for table, column in SORT_INDEXES:
+        connection.exec_driver_sql(
+            f'CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})'
+        )
+
+
+def _add_rate_histogram(connection: Connection) -> None:
+    for rate in RATES:
+        connection.exec_driver_sql(
+            f"ALTER TABLE film_stats ADD COLUMN rate_{rate} INTEGER DEFAULT '0' NOT NULL"
+        )
+    fill_film_stats(connection)
+
+
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    _add_film_stats,
+    _add_unique_review_indexes,
+    _add_film_review_indexes,
+    _add_films_search,
+    _add_sort_indexes,
+    _add_rate_histogram,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection: Connection) -> int:
+    return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def stamp_schema_version(connection: Connection, version: int = SCHEMA_VERSION) -> None:
+    connection.exec_driver_sql(f'PRAGMA user_version = {int(version)}')
+
+
+def migrate(connection: Connection) -> None:
+    for version in range(get_schema_version(connection), SCHEMA_VERSION):
+        MIGRATIONS[version](connection)
+        stamp_schema_version(connection, version + 1)
@@ -0,0 +1,79 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from http import HTTPStatus
+from typing import Any, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import asc, desc, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query
+
+from app.constants import ErrorMessage
+from app.json_encoding import row_to_dict
+
+# the values SQLite stores in an INTEGER column
+SQLITE_INTEGERS = range(-(2**63), 2**63)
+
+
+class Page(NamedTuple):
+    rows: list[Row]
+    next_cursor: Optional[str]
+
+
+def paginate(
+    query: Query,
+    keys: Sequence[Any],
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = False,
+    kind: str = '',
+) -> Page:
+    """
+    Keyset pagination: rows are ordered by ``keys`` (the last one must be unique)
+    and the next page starts right after the keys of the last returned row, so
+    every page costs the same however deep it is.
+
+    ``kind`` is stored in the cursor to reject cursors issued for another listing.
+    """
+    query = query.add_columns(*(key.label(f'cursor_{i}') for i, key in enumerate(keys)))
+    if cursor is not None:
+        position, after = tuple_(*keys), tuple_(*_decode(cursor, kind, len(keys)))
+        query = query.filter(position < after if descending else position > after)
+    direction = desc if descending else asc
+    rows = query.order_by(*(direction(key) for key in keys)).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+    last_row = row_to_dict(rows[limit - 1])
+    after_values = [last_row[f'cursor_{i}'] for i in range(len(keys))]
+    return Page(rows[:limit], _encode(kind, after_values))
+
+
+def _encode(kind: str, values: list[Any]) -> str:
+    payload = json.dumps({'kind': kind, 'after': values}).encode()
+    return urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+
+def _decode(cursor: str, kind: str, size: int) -> list[Any]:
+    try:
+        payload = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values = payload['after']
+        if (
+            payload['kind'] != kind
+            or not isinstance(values, list)
+            or len(values) != size
+            or not all(map(_is_key, values))
+        ):
+            raise ValueError(cursor)
+    except (ValueError, TypeError, KeyError) as invalid_cursor:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=ErrorMessage.INVALID_CURSOR.value,
+        ) from invalid_cursor
+    return values
+
+
+def _is_key(value: Any) -> bool:
+    # anything else fails in the driver or in SQLite, not as a bad request
+    if isinstance(value, int):
+        return value in SQLITE_INTEGERS
+    return isinstance(value, (float, str))
@@ -0,0 +1,215 @@
+"""
+Opt-in request profiling and the slow request log.
+
+A request is profiled when ``settings.profiling_enabled`` is set, or when it
+sends the ``X-Profile`` header with ``settings.profiling_token``. Its SQL
+statements, named spans and a cProfile of the Python code are recorded. The
+time of each goes back in the ``Server-Timing`` header, and the whole profile
+is logged as JSON.
+
+Requests slower than ``settings.slow_request_threshold`` are logged as well,
+with their profile when they have one. Without a profile, a request only pays
+for a ``ContextVar`` lookup per span and SQL statement.
+"""
+import cProfile
+import hmac
+import logging
+import pstats
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.constants import PROFILE_HEADER, PROFILE_TOP_FUNCTIONS
+from app.json_encoding import dump_json
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# a cProfile sees every task of the event loop, so only one request at a time
+# gets one, requests profiled meanwhile record SQL and spans only
+_python_profiler_lock = Lock()
+
+
+def configure_logging() -> None:
+    """Print the profiles and slow requests to stderr, one JSON per line."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+class RequestProfile:
+    def __init__(self) -> None:
+        self.statements: list[tuple[str, float]] = []
+        self.spans: list[tuple[str, float]] = []
+        self.python_profile: Optional[cProfile.Profile] = None
+
+    def server_timing(self, duration: float) -> str:
+        sql_duration = sum(seconds for _, seconds in self.statements)
+        statements = len(self.statements)
+        metrics = [
+            f'total;dur={duration * 1000:.3f}',
+            f'sql;dur={sql_duration * 1000:.3f};desc="{statements} statements"',
+        ]
+        metrics.extend(
+            f'{name};dur={seconds * 1000:.3f}' for name, seconds in self.spans
+        )
+        return ', '.join(metrics)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'statements': [
+                {'sql': statement, 'ms': round(seconds * 1000, 3)}
+                for statement, seconds in self.statements
+            ],
+            'spans': [
+                {'name': name, 'ms': round(seconds * 1000, 3)}
+                for name, seconds in self.spans
+            ],
+            'functions': self._top_functions(),
+        }
+
+    def _top_functions(self) -> list[dict[str, Any]]:
+        if self.python_profile is None:
+            return []
+        stats = pstats.Stats(self.python_profile).stats  # type: ignore[attr-defined]
+        # slowest first, by the time spent in the function and its callees
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[
+            :PROFILE_TOP_FUNCTIONS
+        ]
+        return [
+            {
+                'function': f'{file}:{line}({name})',
+                'calls': calls,
+                'own_ms': round(own_time * 1000, 3),
+                'cumulative_ms': round(cumulative_time * 1000, 3),
+            }
+            for (file, line, name), (_, calls, own_time, cumulative_time, _) in top
+        ]
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    'current_profile', default=None
+)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a named part of the request, when it is profiled."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans.append((name, time.perf_counter() - started))
+
+
+def listen_sql_profile(db_engine: Engine) -> None:
+    def before_cursor_execute(connection: Any, *_: Any) -> None:
+        if current_profile.get() is not None:
+            connection.info['profiled_statement_started'] = time.perf_counter()
+
+    def after_cursor_execute(
+        connection: Any, _cursor: Any, statement: str, *_: Any
+    ) -> None:
+        started = connection.info.pop('profiled_statement_started', None)
+        profile = current_profile.get()
+        if profile is not None and started is not None:
+            profile.statements.append((statement, time.perf_counter() - started))
+
+    event.listen(db_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(db_engine, 'after_cursor_execute', after_cursor_execute)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: Callable[..., Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile() if self._is_profiled(scope) else None
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_timing(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if profile is not None:
+                    timing = profile.server_timing(time.perf_counter() - started)
+                    message = {
+                        **message,
+                        'headers': [
+                            *message.get('headers', []),
+                            (b'server-timing', timing.encode()),
+                        ],
+                    }
+            await send(message)
+
+        token = current_profile.set(profile)
+        python_profiler = self._start_python_profiler(profile)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if python_profiler is not None:
+                python_profiler.disable()
+                _python_profiler_lock.release()
+            current_profile.reset(token)
+            self._log(scope, status, time.perf_counter() - started, profile)
+
+    @staticmethod
+    def _is_profiled(scope: dict[str, Any]) -> bool:
+        if settings.profiling_enabled:
+            return True
+        if not settings.profiling_token:
+            return False
+        for name, value in scope['headers']:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, settings.profiling_token.encode())
+        return False
+
+    @staticmethod
+    def _start_python_profiler(
+        profile: Optional[RequestProfile],
+    ) -> Optional[cProfile.Profile]:
+        # released by __call__ once the request is done, a with block can't
+        # span it, and a request finding it taken isn't python profiled
+        # pylint: disable=consider-using-with
+        if profile is None or not _python_profiler_lock.acquire(blocking=False):
+            return None
+        profile.python_profile = cProfile.Profile()
+        profile.python_profile.enable()
+        return profile.python_profile
+
+    @staticmethod
+    def _log(
+        scope: dict[str, Any],
+        status: int,
+        duration: float,
+        profile: Optional[RequestProfile],
+    ) -> None:
+        slow = duration >= settings.slow_request_threshold
+        if profile is None and not slow:
+            return
+        entry = {
+            'event': 'slow_request' if slow else 'profiled_request',
+            'method': scope['method'],
+            'path': scope['path'],
+            'query': scope['query_string'].decode('latin-1'),
+            'status': status,
+            'ms': round(duration * 1000, 3),
+        }
+        if profile is not None:
+            entry.update(profile.to_dict())
+        logger.log(logging.WARNING if slow else logging.INFO, dump_json(entry).decode())
@@ -0,0 +1,57 @@
+"""
+Distribution of the rates of a film, derived from the count of every rate kept
+in ``film_stats``: reading it costs the same however many rates the film has.
+"""
+from math import floor
+from typing import Any, Optional, Sequence
+
+from sqlalchemy.engine import Row
+
+from app.constants import RATES
+from app.json_encoding import row_to_dict
+
+PERCENTILES = (10, 25, 75, 90)
+
+
+def get_rate_distribution(film: Row) -> dict[str, Any]:
+    """Content of ``RateDistributionModel``, from a ``get_films_with_more_info`` row."""
+    columns = row_to_dict(film)
+    return describe_histogram([columns[f'rate_{rate}'] for rate in RATES])
+
+
+def describe_histogram(histogram: list[int]) -> dict[str, Any]:
+    """Content of ``RateDistributionModel``, from the count of every rate."""
+    return {
+        'histogram': histogram,
+        'median': get_percentile(histogram, 50),
+        **{
+            f'p{percent}': get_percentile(histogram, percent) for percent in PERCENTILES
+        },
+    }
+
+
+def get_percentile(histogram: Sequence[int], percent: float) -> Optional[float]:
+    """
+    The rate below which ``percent`` % of the rates fall, interpolated between
+    the two closest rates like ``statistics.quantiles(method='inclusive')``.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    position = percent / 100 * (total - 1)
+    lower = floor(position)
+    lower_rate = _get_nth_rate(histogram, lower)
+    if position == lower:
+        return float(lower_rate)
+    upper_rate = _get_nth_rate(histogram, lower + 1)
+    return lower_rate + (position - lower) * (upper_rate - lower_rate)
+
+
+def _get_nth_rate(histogram: Sequence[int], index: int) -> int:
+    # the rate at ``index`` of the sorted rates
+    seen = 0
+    for rate, count in zip(RATES, histogram):
+        seen += count
+        if index < seen:
+            return rate
+    raise IndexError(index)  # pragma: no cover
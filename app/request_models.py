@@ -1,8 +1,19 @@
-from typing import Union
+from typing import Optional, Union
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 
-from app.db_models import CommentModel, FilmWithMoreInfoModel, RateModel
+from app.constants import ACCESS_TOKEN_TTL, REVIEWS_BATCH_MAX_SIZE, ReviewStatus
+from app.db_models import (
+    CommentModel,
+    FilmWithMoreInfoModel,
+    PolarizingFilmModel,
+    RateDistributionModel,
+    RateModel,
+    RateNumberBucketModel,
+    SimilarFilmModel,
+    TopFilmModel,
+    YearStatsModel,
+)
 
 
 class NewUser(BaseModel):
@@ -31,8 +42,41 @@ class NewRate(BaseModel):
         return v
 
 
+class BatchReview(NewReview):
+    film_slug: str
+
+
+class BatchRate(NewRate):
+    film_slug: str
+
+
+class NewReviewsBatch(BaseModel):
+    reviews: list[Union[BatchReview, BatchRate]] = Field(
+        ..., max_items=REVIEWS_BATCH_MAX_SIZE
+    )
+
+
 class FilmsResponse(BaseModel):
     films: list[FilmWithMoreInfoModel]
+    next_cursor: Optional[str] = None
+
+
+class TopFilmsResponse(BaseModel):
+    films: list[TopFilmModel]
+
+
+class SimilarFilmsResponse(BaseModel):
+    films: list[SimilarFilmModel]
+
+
+class CatalogStatsResponse(BaseModel):
+    films: int
+    rate_number: int
+    average_rate: Optional[float]
+    rate_distribution: RateDistributionModel
+    years: list[YearStatsModel]
+    rate_number_distribution: list[RateNumberBucketModel]
+    polarizing_films: list[PolarizingFilmModel]
 
 
 class CreatedReviewResponse(BaseModel):
@@ -43,11 +87,38 @@ class UpdatedReviewResponse(BaseModel):
     updated: Union[NewReview, NewRate]
 
 
+class BatchReviewResult(BaseModel):
+    film_slug: str
+    status: ReviewStatus
+
+
+class ReviewsBatchResponse(BaseModel):
+    results: list[BatchReviewResult]
+
+
 class CertainFilmResponse(BaseModel):
     film_info: FilmWithMoreInfoModel
     comments: list[CommentModel]
     rates: list[RateModel]
+    comments_next_cursor: Optional[str] = None
+    rates_next_cursor: Optional[str] = None
+
+
+class FilmCommentsResponse(BaseModel):
+    comments: list[CommentModel]
+    next_cursor: Optional[str] = None
+
+
+class FilmRatesResponse(BaseModel):
+    rates: list[RateModel]
+    next_cursor: Optional[str] = None
 
 
 class RegisteredUserResponse(BaseModel):
     registered_user_login: str
+
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = 'bearer'
+    expires_in: int = ACCESS_TOKEN_TTL
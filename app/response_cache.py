@@ -0,0 +1,135 @@
+import ctypes
+import hashlib
+import multiprocessing
+import re
+from collections import OrderedDict
+from http import HTTPStatus
+from threading import Lock
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple, Optional
+
+from fastapi import Response
+
+from app.constants import RESPONSE_CACHE_MAX_SIZE
+from app.events import FilmReviewChange, SharedCounter, subscribe
+from app.json_encoding import dump_json
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    film_slug: Optional[str]
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of serialized GET responses.
+
+    Entries of a film (``film_slug``) are dropped when its reviews change, film
+    lists (no slug) are dropped on every change because they show film stats.
+    ``generation`` grows with every invalidation, so a response computed before
+    a concurrent write can't be stored after that write was committed.
+
+    Server processes forked from one parent share ``shared_generation``, a
+    change made by another process drops the whole cache.
+    """
+
+    def __init__(
+        self, max_size: int, shared_generation: Optional[SharedCounter] = None
+    ) -> None:
+        self.max_size = max_size
+        self.generation = 0
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._lock = Lock()
+        self._shared_generation = shared_generation
+        self._seen_shared_generation = (
+            shared_generation.value if shared_generation is not None else 0
+        )
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            self._sync_shared_generation()
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            return cached
+
+    def set(
+        self,
+        key: Hashable,
+        body: bytes,
+        generation: int,
+        film_slug: Optional[str] = None,
+    ) -> CachedResponse:
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        cached = CachedResponse(body, etag, film_slug)
+        with self._lock:
+            self._sync_shared_generation()
+            if generation == self.generation:
+                self._entries[key] = cached
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return cached
+
+    def invalidate_film(self, film_slug: str) -> None:
+        with self._lock:
+            if self._shared_generation is not None:
+                with self._shared_generation.get_lock():
+                    self._sync_shared_generation()
+                    self._shared_generation.value += 1
+                    self._seen_shared_generation = self._shared_generation.value
+            self.generation += 1
+            for key, cached in list(self._entries.items()):
+                if cached.film_slug in (None, film_slug):
+                    del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def _sync_shared_generation(self) -> None:
+        if self._shared_generation is None:
+            return
+        shared_generation = self._shared_generation.value
+        if shared_generation != self._seen_shared_generation:
+            self._seen_shared_generation = shared_generation
+            self.generation += 1
+            self._entries.clear()
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_SIZE, multiprocessing.Value(ctypes.c_uint64, 0)
+)
+
+
+@subscribe
+def _invalidate_changed_film(change: FilmReviewChange) -> None:
+    response_cache.invalidate_film(change.film_slug)
+
+
+def normalize_substr(substr: Optional[str]) -> Optional[str]:
+    # the search ignores case and everything but words
+    return ' '.join(re.findall(r'\w+', substr.lower())) if substr else None
+
+
+async def cached_json_response(
+    key: Hashable,
+    if_none_match: Optional[str],
+    build: Callable[[], Awaitable[Any]],
+    film_slug: Optional[str] = None,
+) -> Response:
+    cached = response_cache.get(key)
+    if cached is None:
+        generation = response_cache.generation
+        body = dump_json(await build())
+        cached = response_cache.set(key, body, generation, film_slug)
+    headers = {'ETag': cached.etag}
+    if if_none_match is not None and _etag_matches(if_none_match, cached.etag):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(cached.body, media_type='application/json', headers=headers)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = {candidate.strip() for candidate in if_none_match.split(',')}
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
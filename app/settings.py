@@ -0,0 +1,109 @@
+"""
+Application settings.
+
+Values are read, by priority, from ``FILMS_*`` environment variables, from the
+JSON file named by ``FILMS_CONFIG_FILE`` and from the defaults of the selected
+``profile``. The production profile trades a little durability (a power loss
+may drop the last commits, never corrupt the file) for write throughput and
+keeps a warm connection pool.
+"""
+import json
+import os
+from enum import Enum
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+from pydantic import BaseSettings, Field, root_validator, validator
+from pydantic.env_settings import SettingsSourceCallable
+
+from app.constants import DB_FILE_PATH
+
+CONFIG_FILE_ENV = 'FILMS_CONFIG_FILE'
+
+
+class Profile(Enum):
+    DEVELOPMENT = 'development'
+    PRODUCTION = 'production'
+
+
+PROFILES: dict[Profile, dict[str, Any]] = {
+    Profile.DEVELOPMENT: {},
+    Profile.PRODUCTION: {
+        'pool_size': 20,
+        'max_overflow': 20,
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,  # KiB, 64 MiB per connection
+        'mmap_size': 268435456,  # 256 MiB
+        'busy_timeout': 10000,
+    },
+}
+
+
+class Settings(BaseSettings):
+    profile: Profile = Profile.DEVELOPMENT
+    database_url: str = f'sqlite:///{DB_FILE_PATH}'
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30  # seconds
+    journal_mode: Literal['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL'] = 'WAL'
+    synchronous: Literal['OFF', 'NORMAL', 'FULL', 'EXTRA'] = 'FULL'
+    cache_size: int = -2000  # negative is KiB, positive is pages
+    mmap_size: int = 0
+    busy_timeout: int = 5000  # milliseconds
+    write_group_size: int = 64  # writes committed in one transaction at most
+    # threads hashing passwords, bcrypt is CPU bound and releases the GIL
+    bcrypt_workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    # server processes started by ``python -m app``
+    workers: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    bind: str = '0.0.0.0:8000'
+    # profile every request, or only those sending X-Profile: <profiling_token>
+    profiling_enabled: bool = False
+    profiling_token: Optional[str] = None
+    slow_request_threshold: float = 1.0  # seconds, slower requests are logged
+    # processes of the server process rebuilding the similar films index, and
+    # the seconds between two rebuilds when the rates have changed
+    similar_films_workers: int = 1
+    similar_films_rebuild_interval: float = 600
+
+    class Config:
+        env_prefix = 'FILMS_'
+
+        @classmethod
+        def customise_sources(
+            cls,
+            init_settings: SettingsSourceCallable,
+            env_settings: SettingsSourceCallable,
+            **_: SettingsSourceCallable,
+        ) -> tuple[SettingsSourceCallable, ...]:
+            return init_settings, env_settings, _config_file_settings
+
+    @root_validator(pre=True)
+    def apply_profile_defaults(cls, values: dict[str, Any]) -> dict[str, Any]:
+        profile = Profile(values.get('profile', Profile.DEVELOPMENT))
+        return {**PROFILES[profile], **values}
+
+    @validator('journal_mode', 'synchronous', pre=True)
+    def pragma_value_to_upper(cls, v: str) -> str:
+        return v.upper()
+
+    @property
+    def sqlite_pragmas(self) -> dict[str, Any]:
+        # busy_timeout goes first, switching to WAL has to wait for other
+        # processes starting at the same time
+        return {
+            'busy_timeout': self.busy_timeout,
+            'journal_mode': self.journal_mode,
+            'synchronous': self.synchronous,
+            'cache_size': self.cache_size,
+            'mmap_size': self.mmap_size,
+        }
+
+
+def _config_file_settings(_settings: BaseSettings) -> dict[str, Any]:
+    config_file: Optional[str] = os.environ.get(CONFIG_FILE_ENV)
+    if not config_file:
+        return {}
+    return json.loads(Path(config_file).read_text(encoding='utf-8'))
+
+
+settings = Settings()
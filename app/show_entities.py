@@ -0,0 +1,195 @@
+from http import HTTPStatus
+from typing import Any, Optional, Union
+
+from fastapi import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import sessionmaker
+
+from app.constants import ErrorMessage, Sort, SortOrder
+from app.db import CommentOrm, FilmOrm, FilmStatsOrm, RateOrm
+from app.db_models import CommentModel, FilmWithMoreInfoModel, RateModel
+from app.db_queries import (
+    FILMS_SEARCH,
+    check_film_exists,
+    get_film_comments,
+    get_film_rates,
+    get_films_with_more_info,
+    search_films,
+)
+from app.json_encoding import rows_to_dicts
+from app.pagination import Page, paginate
+from app.profiling import span
+from app.rate_distribution import get_rate_distribution
+
+# the column of every sort, and the unique one breaking its ties: both are in
+# one index, so a page reads only its own rows
+SORT_KEYS = {
+    Sort.BY_RATE: (FilmStatsOrm.average_rate, FilmStatsOrm.film_id),
+    Sort.BY_RATE_COUNT: (FilmStatsOrm.rate_count, FilmStatsOrm.film_id),
+    Sort.BY_COMMENT_COUNT: (FilmStatsOrm.comment_count, FilmStatsOrm.film_id),
+    Sort.BY_YEAR: (FilmOrm.year, FilmOrm.id),
+    Sort.BY_NAME: (FilmOrm.film_name, FilmOrm.id),
+}
+
+
+def show_films_page(
+    substr: Optional[str],
+    year: Optional[int],
+    sort: Optional[Sort],
+    film_id: Optional[int],
+    cursor: Optional[str],
+    limit: int,
+    session: sessionmaker,
+    *,
+    order: Optional[SortOrder] = None,
+    min_votes: int = 0,
+) -> dict[str, Any]:
+    """Content of ``FilmsResponse``."""
+    with span('films.query'):
+        page = _get_films_page(
+            substr, year, sort, order, film_id, min_votes, cursor, limit, session
+        )
+    with span('films.serialize'):
+        return {
+            'films': rows_to_dicts(
+                page.rows,
+                FilmWithMoreInfoModel,
+                rate_distribution=get_rate_distribution,
+            ),
+            'next_cursor': page.next_cursor,
+        }
+
+
+def _get_films_page(
+    substr: Optional[str],
+    year: Optional[int],
+    sort: Optional[Sort],
+    order: Optional[SortOrder],
+    film_id: Optional[int],
+    min_votes: int,
+    cursor: Optional[str],
+    limit: int,
+    session: sessionmaker,
+) -> Page:
+    films_query = get_films_with_more_info(session).filter(
+        *get_filters(year, film_id, min_votes)
+    )
+    if substr:
+        films_query = search_films(films_query, substr)
+    if sort is not None:
+        # names read best from A to Z, the rest from the top
+        order = order or (SortOrder.ASC if sort == Sort.BY_NAME else SortOrder.DESC)
+        page = paginate(
+            films_query,
+            SORT_KEYS[sort],
+            cursor,
+            limit,
+            descending=order == SortOrder.DESC,
+            kind=f'{sort.value}:{order.value}',
+        )
+    elif substr:
+        page = paginate(
+            films_query,
+            [FILMS_SEARCH.c.rank, FilmOrm.id],
+            cursor,
+            limit,
+            kind='search',
+        )
+    else:
+        page = paginate(films_query, [FilmOrm.id], cursor, limit)
+    return page
+
+
+def get_filters(
+    year: Optional[int],
+    film_id: Optional[int],
+    min_votes: int = 0,
+) -> list[Union[Any, bool]]:
+    filters = []
+    if year:
+        filters.append(FilmOrm.year == year)
+    if film_id:
+        filters.append(FilmOrm.id >= film_id)
+    if min_votes:
+        filters.append(FilmStatsOrm.rate_count >= min_votes)
+    return filters
+
+
+def show_certain_film_page(
+    film_slug: str, limit: int, session: sessionmaker
+) -> dict[str, Any]:
+    """Content of ``CertainFilmResponse``."""
+    try:
+        with span('film.query'):
+            film = (
+                get_films_with_more_info(session)
+                .filter(FilmOrm.slug == film_slug)
+                .one()
+            )
+    except SQLAlchemyError as film_not_found:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail=ErrorMessage.FILM_NOT_FOUND.value,
+        ) from film_not_found
+    with span('film.comments'):
+        comments = paginate(
+            get_film_comments(film_slug, session),
+            [CommentOrm.id],
+            None,
+            limit,
+            kind='comments',
+        )
+    with span('film.rates'):
+        rates = paginate(
+            get_film_rates(film_slug, session), [RateOrm.id], None, limit, kind='rates'
+        )
+    with span('film.serialize'):
+        return {
+            'film_info': rows_to_dicts(
+                [film],
+                FilmWithMoreInfoModel,
+                rate_distribution=get_rate_distribution,
+            )[0],
+            'comments': rows_to_dicts(comments.rows, CommentModel),
+            'rates': rows_to_dicts(rates.rows, RateModel),
+            'comments_next_cursor': comments.next_cursor,
+            'rates_next_cursor': rates.next_cursor,
+        }
+
+
+def show_film_comments_page(
+    film_slug: str, cursor: Optional[str], limit: int, session: sessionmaker
+) -> dict[str, Any]:
+    """Content of ``FilmCommentsResponse``."""
+    page = paginate(
+        get_film_comments(film_slug, session),
+        [CommentOrm.id],
+        cursor,
+        limit,
+        kind='comments',
+    )
+    if not page.rows:
+        check_film_exists(film_slug, session)
+    return {
+        'comments': rows_to_dicts(page.rows, CommentModel),
+        'next_cursor': page.next_cursor,
+    }
+
+
+def show_film_rates_page(
+    film_slug: str, cursor: Optional[str], limit: int, session: sessionmaker
+) -> dict[str, Any]:
+    """Content of ``FilmRatesResponse``."""
+    page = paginate(
+        get_film_rates(film_slug, session),
+        [RateOrm.id],
+        cursor,
+        limit,
+        kind='rates',
+    )
+    if not page.rows:
+        check_film_exists(film_slug, session)
+    return {
+        'rates': rows_to_dicts(page.rows, RateModel),
+        'next_cursor': page.next_cursor,
+    }
@@ -0,0 +1,184 @@
+"""
+Item-to-item recommendations, served by ``GET /films/{film_slug}/similar``.
+
+The ``SIMILAR_FILMS_TOP_K`` most similar films of every film, computed by
+``app.similarity_index``. That takes seconds to minutes, so the index is rebuilt
+in the background by a pool of ``settings.similar_films_workers`` processes,
+then swapped in by replacing a single reference: a request sees the old index or
+the new one, never a mix. As a ``FollowedState``, the index goes stale on any
+committed rate change and is rebuilt at most every
+``settings.similar_films_rebuild_interval`` seconds.
+
+Only one server process builds it, the one holding a lock file next to the
+database. It writes every index it builds to a file, which the other server
+processes load.
+"""
+import asyncio
+import ctypes
+import logging
+import multiprocessing
+import signal
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack, suppress
+from typing import Optional
+
+import sqlalchemy as sa
+
+from app.constants import RELOAD_INTERVAL, SIMILAR_FILMS_TOP_K
+from app.events import FilmReviewChange, FollowedState, SharedCounter, subscribe
+from app.file_locks import lock_file
+from app.settings import settings
+from app.similarity_index import (
+    SimilarityIndex,
+    build_similarity_index,
+    load_similarity_index,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarFilms(FollowedState):
+    """
+    Server processes forked from one parent share the index through the file
+    ``path`` and ``published``, a count of the indexes written to it.
+    """
+
+    def __init__(
+        self,
+        top_k: int,
+        workers: int,
+        reload_interval: float,
+        shared_version: Optional[SharedCounter] = None,
+        path: Optional[str] = None,
+        published: Optional[SharedCounter] = None,
+    ) -> None:
+        super().__init__(reload_interval, shared_version)
+        self.top_k = top_k
+        self.workers = workers
+        self.path = path
+        # replaced whole by a rebuild, never changed, read without the lock
+        self.index: Optional[SimilarityIndex] = None
+        # the default thread pool of the event loop until this process builds
+        # the index in the background
+        self._executor: Optional[Executor] = None
+        self._rebuilding: Optional[asyncio.Task[None]] = None
+        self._published = published
+        self._seen_published = published.value if published is not None else 0
+        # held open while this process is the one building the index
+        self._builder_lock: Optional[ExitStack] = None
+
+    def start(self) -> None:
+        """
+        Build the index in the background now, then whenever it goes stale, or
+        load the ones another server process builds.
+        """
+        self._rebuilding = asyncio.get_running_loop().create_task(
+            self._rebuild_periodically()
+        )
+
+    async def close(self) -> None:
+        if self._rebuilding is not None:
+            self._rebuilding.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._rebuilding
+            self._rebuilding = None
+        if self._executor is not None:
+            # waits for a running rebuild, a pool left behind leaks semaphores
+            await asyncio.to_thread(self._executor.shutdown, cancel_futures=True)
+            self._executor = None
+        if self._builder_lock is not None:
+            # another server process builds the index from now on
+            self._builder_lock.close()
+            self._builder_lock = None
+
+    async def rebuild(self) -> None:
+        version = self.version
+        index = await asyncio.get_running_loop().run_in_executor(
+            self._executor, build_similarity_index, self.top_k, self.path
+        )
+        with self._lock:
+            self.index = index
+            self._mark_loaded(version)
+        if self.path is not None and self._published is not None:
+            with self._published.get_lock():
+                self._published.value += 1
+
+    async def _rebuild_periodically(self) -> None:
+        while True:
+            try:
+                if not self._claim_builder():
+                    await self._load_published()
+                elif self.claim_reload():
+                    # at most every reload_interval
+                    await self.rebuild()
+            except Exception:  # pylint: disable=broad-except
+                # the old index is served until a rebuild succeeds
+                logger.exception('updating the similar films index failed')
+            await asyncio.sleep(RELOAD_INTERVAL)
+
+    def _claim_builder(self) -> bool:
+        """
+        Whether this process builds the index: the first one to lock the lock
+        file of ``path``, until it closes. The lock is released when a process
+        exits, another one then takes over.
+        """
+        if self._executor is not None:
+            return True
+        if self.path is not None and self._published is not None:
+            # held past this method, until close
+            builder_lock = ExitStack()
+            if not builder_lock.enter_context(
+                lock_file(f'{self.path}.lock', blocking=False)
+            ):
+                builder_lock.close()
+                return False
+            self._builder_lock = builder_lock
+        # spawned, a process forked from the running server would inherit its
+        # threads' locks and connections
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_ignore_interrupts,
+        )
+        return True
+
+    async def _load_published(self) -> None:
+        if self.path is None or self._published is None:
+            return
+        published = self._published.value
+        if published == self._seen_published:
+            return
+        self.index = await asyncio.to_thread(load_similarity_index, self.path)
+        self._seen_published = published
+
+    def _apply_change(self, change: FilmReviewChange) -> bool:
+        # a new rate moves the average of its user, and so every film they rated
+        return change.old_rate == change.new_rate
+
+
+def _ignore_interrupts() -> None:
+    # Ctrl+C reaches the whole process group, the server shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _get_index_path(database_url: str) -> Optional[str]:
+    database = sa.engine.make_url(database_url).database
+    if not database or database == ':memory:':
+        # every server process builds its own index
+        return None
+    return f'{database}.similar.npz'
+
+
+similar_films = SimilarFilms(
+    SIMILAR_FILMS_TOP_K,
+    settings.similar_films_workers,
+    settings.similar_films_rebuild_interval,
+    multiprocessing.Value(ctypes.c_uint64, 0),
+    _get_index_path(settings.database_url),
+    multiprocessing.Value(ctypes.c_uint64, 0),
+)
+
+
+@subscribe
+def _apply_review_change(change: FilmReviewChange) -> None:
+    similar_films.apply(change)
@@ -0,0 +1,193 @@
+"""
+The similar films index of ``app.similar_films``.
+
+Two films are similar when the same users rate them alike: the adjusted cosine
+of their columns in the sparse user x film matrix of rates, each rate minus the
+average rate of its user, so that a harsh and a generous user agree on a film
+they both find better than usual. The ``top_k`` most similar films of every film
+are kept, a request is a dict lookup and a slice.
+
+The film x film similarities are computed a block of films at a time and never
+held whole.
+"""
+import os
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+import numpy.typing as npt
+from scipy import sparse
+
+from app.constants import SIMILARITY_BLOCK_CELLS, SIMILARITY_LOAD_BATCH_SIZE
+from app.db import create_read_session
+from app.db_queries import get_similar_films_catalog
+
+
+class SimilarityIndex(NamedTuple):
+    film_ids: list[int]
+    slugs: list[str]
+    film_names: list[str]
+    rows: dict[str, int]  # row of every film slug
+    # per row, the rows of the most similar films first, -1 after the last one
+    neighbors: npt.NDArray[np.int64]
+    similarities: npt.NDArray[np.float64]
+
+    def similar(self, film_slug: str, limit: int) -> Optional[list[dict[str, Any]]]:
+        """Content of ``SimilarFilmsResponse.films``, None for an unknown film."""
+        row = self.rows.get(film_slug)
+        if row is None:
+            return None
+        return [
+            {
+                'id': self.film_ids[neighbor],
+                'slug': self.slugs[neighbor],
+                'film_name': self.film_names[neighbor],
+                'similarity': similarity,
+            }
+            for neighbor, similarity in zip(
+                self.neighbors[row, :limit].tolist(),
+                self.similarities[row, :limit].tolist(),
+            )
+            if neighbor >= 0
+        ]
+
+
+def compute_neighbors(
+    user_indexes: npt.NDArray[np.int64],
+    film_indexes: npt.NDArray[np.int64],
+    rates: npt.NDArray[np.int64],
+    films: int,
+    top_k: int,
+    block_cells: int = SIMILARITY_BLOCK_CELLS,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    The ``top_k`` films most similar to each of ``films`` films, given every
+    rate as its user index, film index and value. Returns the ``films`` x
+    ``top_k`` arrays of ``SimilarityIndex.neighbors`` and ``similarities``.
+    """
+    users = int(user_indexes.max()) + 1 if len(user_indexes) else 0
+    rate_counts = np.bincount(user_indexes, minlength=users)
+    user_averages = np.bincount(user_indexes, rates, minlength=users) / np.maximum(
+        rate_counts, 1
+    )
+    values = rates - user_averages[user_indexes]
+    # unit columns, their dot products are the cosines
+    norms = np.sqrt(np.bincount(film_indexes, values**2, minlength=films))
+    values = np.divide(
+        values,
+        norms[film_indexes],
+        out=np.zeros_like(values),
+        where=norms[film_indexes] > 0,
+    )
+    matrix = sparse.csr_matrix(
+        (values, (user_indexes, film_indexes)), shape=(users, films)
+    )
+    transposed = matrix.T.tocsr()
+    neighbors = np.full((films, top_k), -1, dtype=np.int64)
+    similarities = np.zeros((films, top_k))
+    block = max(1, block_cells // max(films, 1))
+    for start in range(0, films, block):
+        # a row per film of the block, a column per film
+        product = transposed[start : start + block] @ matrix
+        rows, columns, values = _get_candidates(product, top_k)
+        rows = rows + start
+        # films rated the other way round aren't similar, nor a film to itself
+        kept = (values > 0) & (rows != columns)
+        rows, columns, values = rows[kept], columns[kept], values[kept]
+        # by film, the most similar first, then by row
+        order = np.lexsort((columns, -values, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        top = ranks < top_k
+        neighbors[rows[top], ranks[top]] = columns[top]
+        similarities[rows[top], ranks[top]] = values[top]
+    return neighbors, similarities
+
+
+def _get_candidates(
+    product: sparse.csr_matrix, top_k: int
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    Row, column and value of the nonzero similarities of ``product``, or of the
+    ``top_k + 1`` largest of every row when most of them are nonzero.
+    """
+    block, films = product.shape
+    if product.nnz * 2 <= block * films or films <= top_k + 1:
+        product = product.tocoo()
+        return product.row, product.col, product.data
+    # sorting every similarity of a dense block takes far longer, one more than
+    # top_k as the film itself is usually the most similar
+    dense = product.toarray()
+    columns = np.argpartition(dense, -(top_k + 1), axis=1)[:, -(top_k + 1) :]
+    rows = np.broadcast_to(np.arange(block)[:, None], columns.shape)
+    return rows.ravel(), columns.ravel(), dense[rows, columns].ravel()
+
+
+def build_similarity_index(top_k: int, path: Optional[str] = None) -> SimilarityIndex:
+    """
+    Read every rate and compute the index, in a process of the pool, then write
+    it to ``path`` if given.
+    """
+    with create_read_session() as session:
+        # one transaction, the films and rates are read at the same point
+        films = get_similar_films_catalog(session)
+        # plain tuples of the driver, NumPy reads them 10 times faster than rows
+        cursor = session.connection().connection.cursor()
+        cursor.execute('SELECT user_id, film_id, rate FROM rates')
+        batches = []
+        while rows := cursor.fetchmany(SIMILARITY_LOAD_BATCH_SIZE):
+            batches.append(np.array(rows, dtype=np.int64))
+        cursor.close()
+    rates = np.concatenate(batches) if batches else np.empty((0, 3), dtype=np.int64)
+    film_ids = [film.id for film in films]
+    sorted_film_ids = np.array(film_ids, dtype=np.int64)
+    # foreign keys aren't enforced and the importer takes any film id, a rate
+    # of a missing film would be counted for its neighbour by searchsorted
+    rates = rates[np.isin(rates[:, 1], sorted_film_ids)]
+    _, user_indexes = np.unique(rates[:, 0], return_inverse=True)
+    neighbors, similarities = compute_neighbors(
+        user_indexes.reshape(-1),
+        np.searchsorted(sorted_film_ids, rates[:, 1]),
+        rates[:, 2],
+        len(films),
+        top_k,
+    )
+    slugs = [film.slug for film in films]
+    index = SimilarityIndex(
+        film_ids=film_ids,
+        slugs=slugs,
+        film_names=[film.film_name for film in films],
+        rows={slug: row for row, slug in enumerate(slugs)},
+        neighbors=neighbors,
+        similarities=similarities,
+    )
+    if path is not None:
+        save_similarity_index(index, path)
+    return index
+
+
+def save_similarity_index(index: SimilarityIndex, path: str) -> None:
+    # written aside and renamed, a process loading it never reads half of it
+    written = f'{path}.{os.getpid()}.tmp'
+    with open(written, 'wb') as file:
+        np.savez(
+            file,
+            film_ids=np.array(index.film_ids, dtype=np.int64),
+            slugs=np.array(index.slugs, dtype=str),
+            film_names=np.array(index.film_names, dtype=str),
+            neighbors=index.neighbors,
+            similarities=index.similarities,
+        )
+    os.replace(written, path)
+
+
+def load_similarity_index(path: str) -> SimilarityIndex:
+    with np.load(path) as arrays:
+        slugs = np.asarray(arrays['slugs']).tolist()
+        return SimilarityIndex(
+            film_ids=np.asarray(arrays['film_ids']).tolist(),
+            slugs=slugs,
+            film_names=np.asarray(arrays['film_names']).tolist(),
+            rows={slug: row for row, slug in enumerate(slugs)},
+            neighbors=arrays['neighbors'],
+            similarities=arrays['similarities'],
+        )
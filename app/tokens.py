@@ -0,0 +1,61 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.constants import ACCESS_TOKEN_SECRET_ENV, ACCESS_TOKEN_TTL, ErrorMessage
+
+# Tokens signed with a random key stop being valid after a restart, so set
+# ACCESS_TOKEN_SECRET when running several processes behind one address.
+_secret_key = (
+    os.environ.get(ACCESS_TOKEN_SECRET_ENV) or secrets.token_hex(32)
+).encode()
+
+
+def create_access_token(login: str, ttl: int = ACCESS_TOKEN_TTL) -> str:
+    payload = json.dumps({'sub': login, 'exp': int(time.time()) + ttl}).encode()
+    return f'{_encode(payload)}.{_encode(_sign(payload))}'
+
+
+def get_token_login(token: str) -> str:
+    login = _verify(token)
+    if login is None:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail=ErrorMessage.INVALID_TOKEN.value,
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+    return login
+
+
+def _verify(token: str) -> Optional[str]:
+    try:
+        encoded_payload, encoded_signature = token.split('.')
+        payload = _decode(encoded_payload)
+        if not hmac.compare_digest(_decode(encoded_signature), _sign(payload)):
+            return None
+        claims = json.loads(payload)
+    except ValueError:
+        return None
+    if claims['exp'] < time.time():
+        return None
+    return claims['sub']
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_secret_key, payload, hashlib.sha256).digest()
+
+
+def _encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + '=' * (-len(data) % 4))
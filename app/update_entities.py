@@ -1,43 +1,64 @@
 from http import HTTPStatus
+from typing import Type, Union
 
 from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import sessionmaker
 
 from app.constants import ErrorMessage
-from app.db_queries import (
-    get_film_by_slug,
-    get_user_by_login,
-    get_users_film_comment,
-    get_users_film_rate,
-)
+from app.db import CommentOrm, RateOrm
+from app.db_queries import apply_review_change, get_review_change, get_review_target
 from app.request_models import NewRate, NewReview
 
 
+def update_review(
+    film_slug: str,
+    login: str,
+    review: Union[NewReview, NewRate],
+    session: sessionmaker,
+) -> None:
+    if isinstance(review, NewReview):
+        update_comment_with_rate(film_slug, login, review, session)
+    elif isinstance(review, NewRate):
+        update_rate(film_slug, login, review, session)
+
+
 def update_comment_with_rate(
     film_slug: str, login: str, review: NewReview, session: sessionmaker
 ) -> None:
-    film = get_film_by_slug(film_slug, session)
-    user = get_user_by_login(login, session)
-    rate_row = get_users_film_rate(film, session, user)
-    comment_row = get_users_film_comment(film, session, user)
-    if not rate_row or not comment_row:
+    target = get_review_target(film_slug, login, session)
+    if target.rate is None or target.comment_id is None:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail=ErrorMessage.NOT_FULL_ENTITY.value,
         )
-    rate_row.rate = review.rate
-    comment_row.comment = review.comment
+    _update_review_row(RateOrm, target, session, rate=review.rate)
+    _update_review_row(CommentOrm, target, session, comment=review.comment)
+    apply_review_change(get_review_change(film_slug, target, review.rate), session)
 
 
 def update_rate(
     film_slug: str, login: str, review: NewRate, session: sessionmaker
 ) -> None:
-    user = get_user_by_login(login, session)
-    film = get_film_by_slug(film_slug, session)
-    rate_row = get_users_film_rate(film, session, user)
-    if not rate_row:
+    target = get_review_target(film_slug, login, session)
+    if target.rate is None:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail=ErrorMessage.NOT_FULL_ENTITY.value,
         )
-    rate_row.rate = review.rate
+    _update_review_row(RateOrm, target, session, rate=review.rate)
+    apply_review_change(get_review_change(film_slug, target, review.rate), session)
+
+
+def _update_review_row(
+    model: Union[Type[RateOrm], Type[CommentOrm]],
+    target: Row,
+    session: sessionmaker,
+    **values: Union[int, str],
+) -> None:
+    session.execute(
+        update(model)
+        .where(model.film_id == target.film_id, model.user_id == target.user_id)
+        .values(**values)
+    )
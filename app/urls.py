@@ -1,99 +1,136 @@
+from functools import partial
 from http import HTTPStatus
-from typing import Any, Optional, Union
+from typing import Optional, Union
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, Query
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from pydantic.error_wrappers import ValidationError
-from sqlalchemy import desc
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 
-from app.constants import ErrorMessage, Sort
-from app.create_entities import create_comment_with_rate, create_new_user, create_rate
-from app.db import Base, CommentOrm, FilmOrm, RateOrm, create_session, engine, init_db
-from app.db_models import CommentModel, FilmWithMoreInfoModel, RateModel
-from app.db_queries import get_films_with_more_info
+from app.catalog_stats import load_catalog_stats
+from app.catalog_urls import router as catalog_router
+from app.constants import (
+    PAGE_DEFAULT_LIMIT,
+    PAGE_MAX_LIMIT,
+    ErrorMessage,
+    ExportFormat,
+    ExportTable,
+    Sort,
+    SortOrder,
+)
+from app.create_entities import create_new_user, create_review, create_reviews_batch
+from app.db import Base, async_read_engine, engine, init_db, run_read
+from app.export import EXPORT_MEDIA_TYPES, export_rows
+from app.leaderboard import load_leaderboard
+from app.metrics import METRICS_MEDIA_TYPE, MetricsMiddleware, render_metrics
+from app.profiling import ProfilingMiddleware, configure_logging
 from app.request_models import (
+    BatchReviewResult,
     CertainFilmResponse,
     CreatedReviewResponse,
+    FilmCommentsResponse,
+    FilmRatesResponse,
     FilmsResponse,
     NewRate,
     NewReview,
+    NewReviewsBatch,
     NewUser,
     RegisteredUserResponse,
+    ReviewsBatchResponse,
+    TokenResponse,
     UpdatedReviewResponse,
 )
-from app.update_entities import update_comment_with_rate, update_rate
-from app.utils import check_user_registration
+from app.response_cache import cached_json_response, normalize_substr
+from app.show_entities import (
+    show_certain_film_page,
+    show_film_comments_page,
+    show_film_rates_page,
+    show_films_page,
+)
+from app.similar_films import similar_films
+from app.tokens import create_access_token
+from app.update_entities import update_review
+from app.utils import check_user_registration, get_authorized_login
+from app.writer import writer
 
 app = FastAPI()
-security = HTTPBasic()
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# before /films/{film_slug}, which would take "top" for a slug
+app.include_router(catalog_router)
 
 
 @app.on_event("startup")
-def startup():
+def startup() -> None:
+    configure_logging()
     init_db(Base, engine)
+    # loaded before the first requests, which would see them empty
+    load_leaderboard()
+    load_catalog_stats()
+    similar_films.start()
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await similar_films.close()
+    writer.close()
+    await async_read_engine.dispose()
 
 
-@app.get('/films')
-def show_films(
-        credentials: HTTPBasicCredentials = Depends(security),
+@app.get(
+    '/films',
+    response_model=FilmsResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+async def show_films(
         substr: Optional[str] = Query(None),
         year: Optional[int] = Query(None),
-        sort: Optional[str] = Query(None),
+        sort: Optional[Sort] = Query(None),
+        order: Optional[SortOrder] = Query(None),
+        min_votes: int = Query(0, ge=0),
         film_id: Optional[int] = Query(None),
-        limit: Optional[int] = Query(None),
-) -> FilmsResponse:
-    login, password = credentials.username, credentials.password
-    check_user_registration(login, password)
-    response = FilmsResponse(films=[])
-    with create_session() as session:
-        films_query = (
-            get_films_with_more_info(session)
-                .group_by(FilmOrm.id)
-                .filter(*get_filters(substr, year, film_id))
-        )
-        if sort == Sort.BY_RATE.value:
-            films_query = films_query.order_by(desc(RateOrm.rate))
-        if limit:
-            films_query = films_query.limit(limit)
-        films = films_query.all()
-        for film in films:
-            response.films.append(FilmWithMoreInfoModel.from_orm(film))
-    return response
-
-
-# не получается перенести эту функцию в другой файл
-def get_filters(
-        substr: Optional[str],
-        year: Optional[int],
-        film_id: Optional[int],
-) -> list[Union[Any, bool]]:
-    filters = []
-    if substr:
-        filters.append(FilmOrm.film_name.contains(substr))
-    if year:
-        filters.append(FilmOrm.year == year)
-    if film_id:
-        filters.append(FilmOrm.id >= film_id)
-    return filters
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+        if_none_match: Optional[str] = Header(None),
+) -> Response:
+    return await cached_json_response(
+        (
+            'films',
+            normalize_substr(substr),
+            year,
+            sort,
+            order,
+            min_votes,
+            film_id,
+            cursor,
+            limit,
+        ),
+        if_none_match,
+        lambda: run_read(
+            partial(
+                show_films_page,
+                substr,
+                year,
+                sort,
+                film_id,
+                cursor,
+                limit,
+                order=order,
+                min_votes=min_votes,
+            )
+        ),
+    )
 
 
 @app.post('/films/{film_slug}')
-def create_review_to_film(
+async def create_review_to_film(
         film_slug: str,
         review: Union[NewReview, NewRate],
-        credentials: HTTPBasicCredentials = Depends(security),
+        login: str = Depends(get_authorized_login),
 ) -> CreatedReviewResponse:
-    login, password = credentials.username, credentials.password
-    check_user_registration(login, password)
     try:
-        with create_session() as session:
-            if isinstance(review, NewReview):
-                create_comment_with_rate(film_slug, login, review, session)
-            elif isinstance(review, NewRate):
-                create_rate(film_slug, login, review, session)
-            return CreatedReviewResponse(created=review)
+        await writer.run_async(partial(create_review, film_slug, login, review))
+        return CreatedReviewResponse(created=review)
     except SQLAlchemyError as film_not_found:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=ErrorMessage.FILM_NOT_FOUND.value
@@ -101,64 +138,119 @@ def create_review_to_film(
 
 
 @app.put('/films/{film_slug}')
-def update_review_to_film(
+async def update_review_to_film(
         film_slug: str,
         review: Union[NewReview, NewRate],
-        credentials: HTTPBasicCredentials = Depends(security),
+        login: str = Depends(get_authorized_login),
 ) -> UpdatedReviewResponse:
-    login, password = credentials.username, credentials.password
-    check_user_registration(login, password)
     try:
-        with create_session() as session:
-            if isinstance(review, NewReview):
-                update_comment_with_rate(film_slug, login, review, session)
-            elif isinstance(review, NewRate):
-                update_rate(film_slug, login, review, session)
-            return UpdatedReviewResponse(updated=review)
+        await writer.run_async(partial(update_review, film_slug, login, review))
+        return UpdatedReviewResponse(updated=review)
     except SQLAlchemyError as film_not_found:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail=ErrorMessage.FILM_NOT_FOUND.value
         ) from film_not_found
 
 
-@app.get('/films/{film_slug}')
-def show_certain_film(
-        film_slug: str, credentials: HTTPBasicCredentials = Depends(security)
-) -> CertainFilmResponse:
-    login, password = credentials.username, credentials.password
-    check_user_registration(login, password)
-    showing_comments = []
-    showing_rates = []
-    with create_session() as session:
-        try:
-            film = FilmWithMoreInfoModel.from_orm(
-                get_films_with_more_info(session)
-                    .filter(FilmOrm.slug == film_slug)
-                    .one()
-            )
-        except ValidationError as film_not_found:
-            raise HTTPException(
-                status_code=HTTPStatus.NOT_FOUND,
-                detail=ErrorMessage.FILM_NOT_FOUND.value,
-            ) from film_not_found
-        comments = session.query(CommentOrm).filter(CommentOrm.film_id == film.id).all()
-        rates = session.query(RateOrm).filter(RateOrm.film_id == film.id).all()
-        for comment in comments:
-            showing_comments.append(CommentModel.from_orm(comment))
-        for rate in rates:
-            showing_rates.append(RateModel.from_orm(rate))
-
-    return CertainFilmResponse(
-        film_info=film, comments=showing_comments, rates=showing_rates
+@app.get(
+    '/films/{film_slug}',
+    response_model=CertainFilmResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+async def show_certain_film(
+        film_slug: str,
+        limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+        if_none_match: Optional[str] = Header(None),
+) -> Response:
+    return await cached_json_response(
+        ('film', film_slug, limit),
+        if_none_match,
+        lambda: run_read(partial(show_certain_film_page, film_slug, limit)),
+        film_slug=film_slug,
+    )
+
+
+@app.get(
+    '/films/{film_slug}/comments',
+    response_model=FilmCommentsResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+async def show_film_comments(
+        film_slug: str,
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+        if_none_match: Optional[str] = Header(None),
+) -> Response:
+    return await cached_json_response(
+        ('comments', film_slug, cursor, limit),
+        if_none_match,
+        lambda: run_read(partial(show_film_comments_page, film_slug, cursor, limit)),
+        film_slug=film_slug,
     )
 
 
+@app.get(
+    '/films/{film_slug}/rates',
+    response_model=FilmRatesResponse,
+    dependencies=[Depends(get_authorized_login)],
+)
+async def show_film_rates(
+        film_slug: str,
+        cursor: Optional[str] = Query(None),
+        limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+        if_none_match: Optional[str] = Header(None),
+) -> Response:
+    return await cached_json_response(
+        ('rates', film_slug, cursor, limit),
+        if_none_match,
+        lambda: run_read(partial(show_film_rates_page, film_slug, cursor, limit)),
+        film_slug=film_slug,
+    )
+
+
+@app.post('/reviews/batch')
+async def create_reviews_batch_to_films(
+        batch: NewReviewsBatch,
+        login: str = Depends(get_authorized_login),
+) -> ReviewsBatchResponse:
+    statuses = await create_reviews_batch(login, batch.reviews)
+    return ReviewsBatchResponse(
+        results=[
+            BatchReviewResult(film_slug=review.film_slug, status=status)
+            for review, status in zip(batch.reviews, statuses)
+        ]
+    )
+
+
+@app.get('/export/{table}', dependencies=[Depends(get_authorized_login)])
+def export_table(
+        table: ExportTable,
+        export_format: ExportFormat = Query(ExportFormat.NDJSON, alias='format'),
+        after_id: Optional[int] = Query(None),
+) -> StreamingResponse:
+    return StreamingResponse(
+        export_rows(table, export_format, after_id),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+    )
+
+
+@app.get('/metrics', include_in_schema=False)
+async def show_metrics() -> Response:
+    return Response(render_metrics(), media_type=METRICS_MEDIA_TYPE)
+
+
 @app.post('/register')
-def register_new_user(user: NewUser) -> RegisteredUserResponse:
-    create_new_user(user)
+async def register_new_user(user: NewUser) -> RegisteredUserResponse:
+    await create_new_user(user)
     return RegisteredUserResponse(registered_user_login=user.login)
 
 
+@app.post('/login')
+async def login_user(user: NewUser) -> TokenResponse:
+    await check_user_registration(user.login, user.password)
+    return TokenResponse(access_token=create_access_token(user.login))
+
+
 if __name__ == '__main__':
     init_db(Base, engine)
     uvicorn.run(app, host='0.0.0.0', port=8000)
@@ -1,25 +1,90 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from http import HTTPStatus
+from typing import Any, Callable, Optional, TypeVar
 
 import bcrypt
-from fastapi import HTTPException
+from fastapi import Depends, HTTPException
+from fastapi.security import (
+    HTTPAuthorizationCredentials,
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+)
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.constants import ErrorMessage
-from app.db import UserOrm, create_session
+from app.credentials_cache import credentials_cache
+from app.db import run_read
+from app.db_queries import get_user_password
+from app.metrics import BCRYPT_DURATION
+from app.profiling import span
+from app.settings import settings
+from app.tokens import get_token_login
 
+T = TypeVar('T')
 
-def check_user_registration(login: str, password: str) -> None:
+basic_security = HTTPBasic(auto_error=False)
+bearer_security = HTTPBearer(auto_error=False)
+
+bcrypt_executor = ThreadPoolExecutor(
+    max_workers=settings.bcrypt_workers, thread_name_prefix='bcrypt'
+)
+
+
+async def run_bcrypt(function: Callable[..., T], *args: Any) -> T:
+    """
+    Hash in the bounded bcrypt pool, so password checks can't take all the
+    threads and the event loop keeps serving other requests meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        bcrypt_executor, partial(_timed_bcrypt, function, *args)
+    )
+
+
+def _timed_bcrypt(function: Callable[..., T], *args: Any) -> T:
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        BCRYPT_DURATION.observe(time.perf_counter() - started, function.__name__)
+
+
+async def check_user_registration(login: str, password: str) -> None:
+    if credentials_cache.is_verified(login, password):
+        return
     try:
-        with create_session() as session:
-            user = session.query(UserOrm).filter(UserOrm.user_name == login).one()
-            hashed_password = user.password
-            if not bcrypt.hashpw(password.encode(), hashed_password) == hashed_password:
-                raise HTTPException(
-                    status_code=HTTPStatus.UNAUTHORIZED,
-                    detail=ErrorMessage.INCORRECT_PASSWORD.value,
-                )
+        with span('auth.lookup'):
+            hashed_password = await run_read(partial(get_user_password, login))
     except SQLAlchemyError as incorrect_login:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail=ErrorMessage.INCORRECT_LOGIN.value,
         ) from incorrect_login
+    with span('auth.bcrypt'):
+        verified = await run_bcrypt(bcrypt.checkpw, password.encode(), hashed_password)
+    if not verified:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail=ErrorMessage.INCORRECT_PASSWORD.value,
+        )
+    credentials_cache.add(login, password)
+
+
+async def get_authorized_login(
+    bearer: Optional[HTTPAuthorizationCredentials] = Depends(bearer_security),
+    basic: Optional[HTTPBasicCredentials] = Depends(basic_security),
+) -> str:
+    if bearer is not None:
+        return get_token_login(bearer.credentials)
+    if basic is not None:
+        await check_user_registration(basic.username, basic.password)
+        return basic.username
+    raise HTTPException(
+        status_code=HTTPStatus.UNAUTHORIZED,
+        detail=ErrorMessage.NOT_AUTHENTICATED.value,
+        headers={'WWW-Authenticate': 'Basic'},
+    )
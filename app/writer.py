@@ -0,0 +1,119 @@
+"""
+Single writer thread.
+
+SQLite runs one write transaction at a time, so instead of letting request
+threads queue up on the database lock, their writes are sent to one thread
+owning the writer connection. Writes that are waiting when a transaction starts
+are committed together in it, every one inside its own SAVEPOINT, so a failing
+write is rolled back alone and the others still share a single commit.
+"""
+import asyncio
+import os
+from concurrent.futures import Future
+from contextvars import Context, copy_context
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, ContextManager, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db import create_session
+from app.events import savepoint
+from app.settings import settings
+
+Write = Callable[[Session], Any]
+# a write runs in the context of its submitter, which sees its profile
+QueuedWrite = tuple[Write, Future[Any], Context]
+
+
+class Writer:
+    def __init__(
+        self,
+        session_scope: Callable[[], ContextManager[Session]],
+        group_size: int,
+    ) -> None:
+        self._session_scope = session_scope
+        self._group_size = group_size
+        self._queue: Queue[Optional[QueuedWrite]] = Queue()
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+        # the thread of a preloading server doesn't exist in its forked workers
+        os.register_at_fork(after_in_child=self._forget_thread)
+
+    def submit(self, write: Write) -> Future[Any]:
+        future: Future[Any] = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._serve, name='writer', daemon=True)
+                self._thread.start()
+            self._queue.put((write, future, copy_context()))
+        return future
+
+    def run(self, write: Write) -> Any:
+        """Write in the writer thread, wait for the commit and return the result."""
+        return self.submit(write).result()
+
+    async def run_async(self, write: Write) -> Any:
+        """Same as ``run``, the event loop is free while the write waits."""
+        return await asyncio.wrap_future(self.submit(write))
+
+    def close(self) -> None:
+        """Commit the queued writes and stop the thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _forget_thread(self) -> None:
+        self._queue = Queue()
+        self._thread = None
+        self._lock = Lock()
+
+    def _serve(self) -> None:
+        while True:
+            group = [self._queue.get()]
+            while group[-1] is not None and len(group) < self._group_size:
+                try:
+                    group.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            self._commit_group([item for item in group if item is not None])
+            if group[-1] is None:
+                return
+
+    def _commit_group(self, group: list[QueuedWrite]) -> None:
+        outcomes: list[tuple[Future[Any], Any, Optional[BaseException]]] = []
+        try:
+            with self._session_scope() as session:
+                for write, future, context in group:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        result = context.run(_write_in_savepoint, write, session)
+                    except Exception as error:  # pylint: disable=broad-except
+                        outcomes.append((future, None, error))
+                    else:
+                        outcomes.append((future, result, None))
+        except Exception as commit_error:  # pylint: disable=broad-except
+            for future, _, write_error in outcomes:
+                future.set_exception(write_error or commit_error)
+            for _, future, _ in group:
+                if future.running():
+                    future.set_exception(commit_error)
+            return
+        for future, result, write_error in outcomes:
+            if write_error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(write_error)
+
+
+def _write_in_savepoint(write: Write, session: Session) -> Any:
+    # releasing the savepoint flushes, so it may fail too
+    with savepoint(session):
+        return write(session)
+
+
+writer = Writer(create_session, settings.write_group_size)
@@ -0,0 +1,6 @@
+BENCH_PASSWORD = 'bench'
+
+WORDS = (
+    'love night city dark last man star war river house ghost summer king road '
+    'blood dream time fire secret island winter heart story shadow money game'
+).split()
@@ -0,0 +1,123 @@
+"""
+Synthetic dataset for the benchmarks:
+
+    python -m benchmarks.dataset --database app/bench.db \\
+        --films 100000 --users 1000000 --rates 10000000 --comments 10000000
+
+Films are named ``film-1`` to ``film-<films>`` and users ``user-1`` to
+``user-<users>``, all with the password ``BENCH_PASSWORD``, so the runner can
+address them without reading the database. Rows are generated from ``--seed``,
+the same arguments always give the same dataset, and loaded by ``app.importer``.
+"""
+import argparse
+import os
+import random
+import sys
+from typing import Any, Iterable, Iterator
+
+import bcrypt
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Engine
+
+from app.constants import ImportTable
+from app.db import Base, FilmOrm, UserOrm, create_db_engine, init_db
+from app.importer import import_rows
+from app.settings import Settings
+from benchmarks.constants import BENCH_PASSWORD, WORDS
+
+# the first reviewers of consecutive films are this many users apart
+USER_STRIDE = 7919
+
+
+def generate_dataset(
+    db_engine: Engine,
+    films: int,
+    users: int,
+    rates: int,
+    comments: int,
+    seed: int = 0,
+) -> None:
+    if max(rates, comments) > films * users:
+        raise ValueError('a user reviews a film only once, add films or users')
+    init_db(Base, db_engine)
+    rng = random.Random(seed)
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt())
+    with db_engine.connect() as connection:
+        first_film_id = _next_id(connection, FilmOrm.__table__)
+        first_user_id = _next_id(connection, UserOrm.__table__)
+    film_rows = (
+        {
+            'film_name': f'{" ".join(rng.choices(WORDS, k=3)).title()} {i}',
+            'slug': f'film-{i}',
+            'year': rng.randint(1920, 2022),
+        }
+        for i in range(1, films + 1)
+    )
+    user_rows = (
+        {'user_name': f'user-{i}', 'password': password} for i in range(1, users + 1)
+    )
+    _import(db_engine, ImportTable.FILMS, film_rows, films)
+    _import(db_engine, ImportTable.USERS, user_rows, users)
+    rate_rows = (
+        {**review, 'rate': rng.randint(0, 10)}
+        for review in _reviews(rates, films, users, first_film_id, first_user_id)
+    )
+    comment_rows = (
+        {**review, 'comment': ' '.join(rng.choices(WORDS, k=rng.randint(3, 30)))}
+        for review in _reviews(comments, films, users, first_film_id, first_user_id)
+    )
+    _import(db_engine, ImportTable.RATES, rate_rows, rates)
+    _import(db_engine, ImportTable.COMMENTS, comment_rows, comments)
+    with db_engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+
+def _next_id(connection: Connection, table: sa.Table) -> int:
+    return (connection.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _reviews(
+    count: int, films: int, users: int, first_film_id: int, first_user_id: int
+) -> Iterator[dict[str, Any]]:
+    # review k is of film k % films, the reviews of a film are by distinct
+    # users as long as there are no more of them than users
+    for k in range(count):
+        film = k % films
+        user = (k // films + film * USER_STRIDE) % users
+        yield {'film_id': first_film_id + film, 'user_id': first_user_id + user}
+
+
+def _import(
+    db_engine: Engine, table: ImportTable, rows: Iterable[dict[str, Any]], total: int
+) -> None:
+    def report(imported: int) -> None:
+        print(f'{table.value}: {imported}/{total}', file=sys.stderr)
+
+    import_rows(table, rows, db_engine, defer_indexes=True, progress=report)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a benchmark database.')
+    parser.add_argument('--database', required=True, help='new SQLite file to fill')
+    parser.add_argument('--films', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--rates', type=int, default=10_000_000)
+    parser.add_argument('--comments', type=int, default=10_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+    # nothing is lost if the generation crashes, the file is just made again
+    db_engine = create_db_engine(
+        Settings(database_url=f'sqlite:///{args.database}', synchronous='OFF')
+    )
+    try:
+        generate_dataset(
+            db_engine, args.films, args.users, args.rates, args.comments, args.seed
+        )
+    finally:
+        db_engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Load test of every endpoint against a dataset made by ``benchmarks.dataset``:
+
+    python -m benchmarks.run --database app/bench.db --films 100000
+    python -m benchmarks.run --url http://127.0.0.1:8000 --films 100000
+
+Each scenario sends ``--requests`` requests from ``--concurrency`` concurrent
+clients, one scenario after another. The app runs in-process and is called
+straight through ASGI, unless ``--url`` points at a running server. The
+results are printed as JSON: the latency percentiles in milliseconds and the
+throughput in requests per second of every scenario, to be compared between
+commits run on the same dataset and machine.
+
+Every run registers its own users, so the write scenarios don't conflict with
+the reviews of an earlier run on the same database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from typing import Any, Callable, NamedTuple, Optional
+
+from benchmarks.constants import BENCH_PASSWORD, WORDS
+from benchmarks.senders import AsgiSender, HttpSender, Request, Send
+
+# films per export request, the last ones of the table
+EXPORT_ROWS = 1000
+
+
+class Scenario(NamedTuple):
+    name: str
+    # builds the i-th request of the scenario
+    request: Callable[[int], Request]
+
+
+def get_scenarios(films: int, run_id: str, rng: random.Random) -> list[Scenario]:
+    def slug(i: int) -> str:
+        return f'film-{i % films + 1}'
+
+    def random_slug() -> str:
+        return slug(rng.randrange(films))
+
+    return [
+        Scenario('list_films', lambda i: Request('GET', '/films')),
+        Scenario(
+            'list_films_by_year',
+            lambda i: Request('GET', f'/films?year={rng.randint(1920, 2022)}'),
+        ),
+        Scenario(
+            'search_films',
+            lambda i: Request('GET', f'/films?substr={rng.choice(WORDS)}'),
+        ),
+        Scenario('sort_films_by_rate', lambda i: Request('GET', '/films?sort=rate')),
+        Scenario('top_films', lambda i: Request('GET', '/films/top')),
+        Scenario('catalog_stats', lambda i: Request('GET', '/stats')),
+        Scenario(
+            'similar_films',
+            lambda i: Request('GET', f'/films/{random_slug()}/similar'),
+        ),
+        Scenario('show_film', lambda i: Request('GET', f'/films/{random_slug()}')),
+        Scenario(
+            'show_film_comments',
+            lambda i: Request('GET', f'/films/{random_slug()}/comments'),
+        ),
+        Scenario(
+            'show_film_rates',
+            lambda i: Request('GET', f'/films/{random_slug()}/rates'),
+        ),
+        # the run's user has no reviews yet, request i reviews film i
+        Scenario(
+            'create_review',
+            lambda i: Request(
+                'POST', f'/films/{slug(i)}', {'rate': i % 11, 'comment': 'benchmark'}
+            ),
+        ),
+        Scenario(
+            'update_review',
+            lambda i: Request(
+                'PUT', f'/films/{slug(i)}', {'rate': (i + 1) % 11, 'comment': 'edited'}
+            ),
+        ),
+        Scenario(
+            'create_reviews_batch',
+            lambda i: Request(
+                'POST',
+                '/reviews/batch',
+                {
+                    'reviews': [
+                        {'film_slug': random_slug(), 'rate': rng.randint(0, 10)}
+                        for _ in range(100)
+                    ]
+                },
+            ),
+        ),
+        Scenario(
+            'export_films',
+            lambda i: Request('GET', f'/export/films?after_id={films - EXPORT_ROWS}'),
+        ),
+        Scenario(
+            'login',
+            lambda i: Request(
+                'POST',
+                '/login',
+                {'login': f'bench-{run_id}', 'password': BENCH_PASSWORD},
+            ),
+        ),
+        Scenario(
+            'register',
+            lambda i: Request(
+                'POST',
+                '/register',
+                {'login': f'bench-{run_id}-{i}', 'password': BENCH_PASSWORD},
+            ),
+        ),
+    ]
+
+
+async def run_scenario(
+    send: Send, scenario: Scenario, requests: int, concurrency: int, token: str
+) -> dict[str, Any]:
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies: list[float] = []
+    errors = 0
+    next_request = iter(range(requests))
+
+    async def client() -> None:
+        nonlocal errors
+        for i in next_request:
+            request = scenario.request(i)
+            started = time.perf_counter()
+            response = await send(request, headers)
+            latencies.append(time.perf_counter() - started)
+            errors += response.status >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': round(requests / elapsed, 1),
+        **latency_percentiles(latencies),
+    }
+
+
+def latency_percentiles(latencies: list[float]) -> dict[str, float]:
+    if len(latencies) > 1:
+        cut_points = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cut_points[49], cut_points[94], cut_points[98]
+    else:
+        p50 = p95 = p99 = latencies[0]
+    return {
+        name: round(seconds * 1000, 3)
+        for name, seconds in (
+            ('p50_ms', p50),
+            ('p95_ms', p95),
+            ('p99_ms', p99),
+            ('max_ms', max(latencies)),
+        )
+    }
+
+
+async def run_benchmark(send: Send, args: argparse.Namespace) -> dict[str, Any]:
+    run_id = uuid.uuid4().hex[:8]
+    credentials = {'login': f'bench-{run_id}', 'password': BENCH_PASSWORD}
+    for path in ('/register', '/login'):
+        response = await send(Request('POST', path, credentials), {})
+        if response.status >= 400:
+            raise RuntimeError(f'POST {path} failed with {response.status}')
+    token = json.loads(response.content)['access_token']
+    rng = random.Random(args.seed)
+    results = {}
+    for scenario in get_scenarios(args.films, run_id, rng):
+        if args.scenario and scenario.name not in args.scenario:
+            continue
+        results[scenario.name] = await run_scenario(
+            send, scenario, args.requests, args.concurrency, token
+        )
+    return {
+        'commit': _get_commit(),
+        'target': args.url or 'in-process',
+        'films': args.films,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'scenarios': results,
+    }
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _run_in_process(args: argparse.Namespace) -> dict[str, Any]:
+    # the app reads its settings on import
+    os.environ['FILMS_DATABASE_URL'] = f'sqlite:///{args.database}'
+    # pylint: disable=import-outside-toplevel
+    from app.db import async_read_engine, engine, read_engine
+    from app.similar_films import similar_films
+    from app.urls import app
+    from app.writer import writer
+
+    # a server builds it in the background on startup, which isn't run here
+    await similar_films.rebuild()
+    try:
+        return await run_benchmark(AsgiSender(app), args)
+    finally:
+        writer.close()
+        await async_read_engine.dispose()
+        engine.dispose()
+        read_engine.dispose()
+
+
+async def _run_against_server(args: argparse.Namespace) -> dict[str, Any]:
+    sender = HttpSender(args.url, args.concurrency)
+    try:
+        return await run_benchmark(sender, args)
+    finally:
+        sender.executor.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the films API.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--database', help='SQLite file to serve in-process')
+    target.add_argument('--url', help='address of a running server')
+    parser.add_argument('--films', type=int, required=True, help='films in dataset')
+    parser.add_argument('--requests', type=int, default=1000, help='per scenario')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--scenario', action='append', help='run only these')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    args = parser.parse_args()
+    run = _run_against_server if args.url else _run_in_process
+    results = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(results + '\n')
+    else:
+        print(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+The ways ``benchmarks.run`` sends a request: straight to the app through ASGI,
+or over HTTP to a running server.
+"""
+import asyncio
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    body: Optional[dict[str, Any]] = None
+
+
+class Response(NamedTuple):
+    status: int
+    content: bytes
+
+
+Send = Callable[[Request, dict[str, str]], Awaitable[Response]]
+
+
+class AsgiSender:
+    """Calls the app directly, a bare ASGI server without networking."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, request: Request, headers: dict[str, str]) -> Response:
+        path, _, query = request.path.partition('?')
+        body = b'' if request.body is None else json.dumps(request.body).encode()
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': request.method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [
+                (name.lower().encode(), value.encode())
+                for name, value in {
+                    **headers,
+                    'Content-Type': 'application/json',
+                    'Content-Length': str(len(body)),
+                }.items()
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('127.0.0.1', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        done = asyncio.Event()
+        status = 0
+        chunks: list[bytes] = []
+
+        async def receive() -> dict[str, Any]:
+            if messages:
+                return messages.pop()
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:  # pylint: disable=broad-except
+            # the app has answered 500 already, log it like a server would
+            traceback.print_exc()
+        return Response(status, b''.join(chunks))
+
+
+class HttpSender:
+    """Sends the requests from a thread per client, over keep-alive connections."""
+
+    def __init__(self, url: str, concurrency: int) -> None:
+        self.address = urlsplit(url).netloc
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.connections = threading.local()
+
+    async def __call__(self, request: Request, headers: dict[str, str]) -> Response:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._send, request, headers)
+
+    def _send(self, request: Request, headers: dict[str, str]) -> Response:
+        if not hasattr(self.connections, 'connection'):
+            self.connections.connection = HTTPConnection(self.address)
+        connection = self.connections.connection
+        body = None if request.body is None else json.dumps(request.body)
+        connection.request(
+            request.method,
+            request.path,
+            body,
+            {**headers, 'Content-Type': 'application/json'},
+        )
+        response = connection.getresponse()
+        return Response(response.status, response.read())
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from base64 import b64encode
 from typing import Union
@@ -8,17 +9,36 @@ from fastapi.testclient import TestClient
 from requests import Response
 
 from app.constants import DB_FILE_PATH
-from app.db import Base, CommentOrm, RateOrm, UserOrm, create_session, engine, init_db
+from app.db import (
+    Base,
+    CommentOrm,
+    RateOrm,
+    UserOrm,
+    async_read_engine,
+    create_session,
+    engine,
+    init_db,
+    read_engine,
+)
 from app.db_models import UserModel
 from app.request_models import NewRate, NewReview, NewUser
 from app.urls import app
+from app.writer import writer
 
 
 @pytest.fixture(scope='session', autouse=True)
 def _init_db():
     init_db(Base, engine)
     yield
+    # closing the pooled connections checkpoints and removes the WAL files
+    writer.close()
+    engine.dispose()
+    read_engine.dispose()
+    # the pooled aiosqlite connections run in threads that would keep the
+    # interpreter alive
+    asyncio.run(async_read_engine.dispose())
     os.remove(DB_FILE_PATH)
+    os.remove(f'{DB_FILE_PATH}.lock')
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -95,6 +115,15 @@ def response_create_review(_fill_test_user, test_client):
     return _response_create_new_review('snatch', token, full_review, test_client)
 
 
+@pytest.fixture()
+def response_create_existing_review(_fill_test_user, test_client):
+    user = CorrectTestUser()
+    token = _get_basic_decoded_token(user)
+    full_review = TestingReviewInformation().review_to_post
+    _response_create_new_review('snatch', token, full_review, test_client)
+    return _response_create_new_review('snatch', token, full_review, test_client)
+
+
 @pytest.fixture()
 def new_review_added_to_db() -> bool:
     needed_review = TestingReviewInformation().review_to_post
@@ -236,3 +265,13 @@ class TestingReviewInformation:
 class TestingRateInformation:
     rate_to_post = NewRate(rate=10)
     rate_to_put = NewRate(rate=9)
+
+
+def _add_user_to_db(user_name: str, password: str) -> None:
+    with create_session() as session:
+        session.add(
+            UserOrm(
+                user_name=user_name,
+                password=bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()),
+            )
+        )
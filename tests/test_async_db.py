@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+from functools import partial
+from typing import Any
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import create_async_read_engine, run_read
+from app.settings import Settings, settings
+from app.show_entities import show_films_page
+from app.utils import run_bcrypt
+
+
+async def _read_films_concurrently(reads: int) -> list[dict[str, Any]]:
+    engine = create_async_read_engine(Settings(pool_size=2, max_overflow=0))
+
+    async def read_films() -> dict[str, Any]:
+        async with AsyncSession(engine) as session:
+            return await session.run_sync(
+                partial(show_films_page, None, None, None, None, None, 3)
+            )
+
+    try:
+        return await asyncio.gather(*(read_films() for _ in range(reads)))
+    finally:
+        await engine.dispose()
+
+
+def test_more_concurrent_reads_than_connections():
+    pages = asyncio.run(_read_films_concurrently(20))
+    assert len(pages) == 20
+    assert all(page == pages[0] for page in pages)
+    assert [film['id'] for film in pages[0]['films']] == [1, 2, 3]
+
+
+def test_async_read_session_cant_write():
+    def write(session):
+        session.execute(text('UPDATE films SET year = 1900 WHERE id = 1'))
+
+    with pytest.raises(OperationalError):
+        asyncio.run(run_read(write))
+
+
+def test_bcrypt_runs_in_bounded_pool():
+    def hash_password() -> str:
+        time.sleep(0.01)
+        return threading.current_thread().name
+
+    async def hash_passwords(count: int) -> list[str]:
+        return await asyncio.gather(*(run_bcrypt(hash_password) for _ in range(count)))
+
+    thread_names = set(asyncio.run(hash_passwords(settings.bcrypt_workers * 4)))
+    assert all(name.startswith('bcrypt') for name in thread_names)
+    assert len(thread_names) <= settings.bcrypt_workers
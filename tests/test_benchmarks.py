@@ -0,0 +1,77 @@
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.db import create_db_engine
+from app.settings import Settings
+from benchmarks.dataset import generate_dataset
+from benchmarks.run import get_scenarios, latency_percentiles
+
+
+def test_generate_dataset(tmp_path: Path):
+    db_engine = create_db_engine(
+        Settings(database_url=f'sqlite:///{tmp_path / "b.db"}')
+    )
+    generate_dataset(db_engine, films=20, users=10, rates=150, comments=30)
+    with db_engine.connect() as connection:
+        counts = [
+            connection.exec_driver_sql(f'SELECT count(*) FROM {table}').scalar()
+            for table in ('films', 'users', 'rates', 'comments')
+        ]
+        stats = connection.exec_driver_sql(
+            'SELECT sum(rate_count), sum(comment_count) FROM film_stats'
+        ).one()
+        slug = connection.exec_driver_sql(
+            'SELECT slug FROM films ORDER BY id DESC LIMIT 1'
+        ).scalar()
+    db_engine.dispose()
+    assert counts == [5 + 20, 10, 150, 30]
+    assert tuple(stats) == (150, 30)
+    assert slug == 'film-20'
+
+
+def test_generate_dataset_needs_a_user_per_review_of_a_film(tmp_path: Path):
+    db_engine = create_db_engine(
+        Settings(database_url=f'sqlite:///{tmp_path / "b.db"}')
+    )
+    with pytest.raises(ValueError):
+        generate_dataset(db_engine, films=2, users=3, rates=7, comments=0)
+    db_engine.dispose()
+
+
+def test_latency_percentiles():
+    latencies = [i / 1000 for i in range(1, 101)]
+    assert latency_percentiles(latencies) == {
+        'p50_ms': 50.5,
+        'p95_ms': 95.05,
+        'p99_ms': 99.01,
+        'max_ms': 100.0,
+    }
+
+
+def test_benchmark_runs_every_scenario(tmp_path: Path):
+    database = tmp_path / 'b.db'
+    db_engine = create_db_engine(Settings(database_url=f'sqlite:///{database}'))
+    generate_dataset(db_engine, films=20, users=10, rates=40, comments=40)
+    db_engine.dispose()
+    run = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.run', '--database', str(database)]
+        + ['--films', '20', '--requests', '4', '--concurrency', '2'],
+        capture_output=True,
+        check=True,
+    )
+    results = json.loads(run.stdout)
+    scenarios = results['scenarios']
+    assert list(scenarios) == [
+        scenario.name for scenario in get_scenarios(20, '', random.Random())
+    ]
+    for result in scenarios.values():
+        assert result['requests'] == 4
+        assert result['errors'] == 0
+        assert (
+            result['p50_ms'] <= result['p95_ms'] <= result['p99_ms'] <= result['max_ms']
+        )
@@ -0,0 +1,112 @@
+import json
+import statistics
+from typing import Any
+
+from app.catalog_stats import CatalogStats
+from app.db_models import UserModel
+from app.events import FilmReviewChange
+from app.request_models import NewRate
+from tests.conftest import (
+    CorrectTestUser,
+    _add_user_to_db,
+    _get_basic_decoded_token,
+    _get_headers,
+    _response_create_new_review,
+)
+
+
+class StatsFilm:
+    def __init__(self, film_id: int, year: int, rates: list[int]) -> None:
+        self.id = film_id
+        self.slug = f'film-{film_id}'
+        self.film_name = f'Film {film_id}'
+        self.year = year
+        self.rates = rates
+
+    def _asdict(self) -> dict[str, int]:
+        # the rate columns of a get_catalog_stats_films row
+        return {f'rate_{rate}': self.rates.count(rate) for rate in range(11)}
+
+
+FILMS = [
+    StatsFilm(1, 2000, [5, 5, 5]),
+    StatsFilm(2, 2000, [0, 10, 0, 10]),
+    StatsFilm(3, 1999, [1, 9]),
+    StatsFilm(5, 1999, []),
+]
+
+
+def test_stats_summarize_the_catalog():
+    stats = _get_stats().summarize(min_votes=1, limit=10)
+    rates = [rate for film in FILMS for rate in film.rates]
+    assert (stats['films'], stats['rate_number']) == (4, 9)
+    assert stats['average_rate'] == statistics.mean(rates)
+    assert stats['rate_distribution']['median'] == statistics.median(rates)
+    assert stats['years'] == [
+        {'year': 1999, 'films': 2, 'rate_number': 2, 'average_rate': 5},
+        {'year': 2000, 'films': 2, 'rate_number': 7, 'average_rate': 35 / 7},
+    ]
+    assert stats['rate_number_distribution'] == [
+        {'min_rates': 0, 'max_rates': 0, 'films': 1},
+        {'min_rates': 1, 'max_rates': 1, 'films': 0},
+        {'min_rates': 2, 'max_rates': 3, 'films': 2},
+        {'min_rates': 4, 'max_rates': 7, 'films': 1},
+    ]
+
+
+def test_stats_find_polarizing_films():
+    polarizing = _get_stats().summarize(min_votes=1, limit=10)['polarizing_films']
+    assert [film['slug'] for film in polarizing] == ['film-2', 'film-3', 'film-1']
+    for film in polarizing:
+        rates = next(
+            stats_film.rates for stats_film in FILMS if stats_film.id == film['id']
+        )
+        assert film['rate_deviation'] == statistics.pstdev(rates)
+        assert film['average_rate'] == statistics.mean(rates)
+
+
+def test_polarizing_films_have_min_votes():
+    polarizing = _get_stats().summarize(min_votes=3, limit=1)['polarizing_films']
+    assert [film['slug'] for film in polarizing] == ['film-2']
+
+
+def test_stats_follow_review_changes():
+    stats = _get_stats()
+    stats.apply(FilmReviewChange(5, 'film-5', 1, None, 7))
+    stats.apply(FilmReviewChange(1, 'film-1', 1, 5, 6))
+    summary = stats.summarize(min_votes=1, limit=10)
+    assert summary['rate_number'] == 10
+    assert summary['rate_distribution']['histogram'][5:8] == [2, 1, 1]
+    assert not stats.claim_reload()
+
+
+def test_stats_reload_for_new_film():
+    stats = _get_stats()
+    stats.apply(FilmReviewChange(4, 'film-4', 1, None, 7))
+    assert stats.claim_reload()
+
+
+def test_show_catalog_stats(_fill_test_user, test_client):
+    before = _get_catalog_stats(test_client)
+    _add_user_to_db('stats_reviewer', 'stats_reviewer')
+    reviewer = UserModel(id=0, user_name='stats_reviewer', password='stats_reviewer')
+    _response_create_new_review(
+        'snatch', _get_basic_decoded_token(reviewer), NewRate(rate=4), test_client
+    )
+    after = _get_catalog_stats(test_client)
+    assert after['rate_number'] == before['rate_number'] + 1
+    assert after['rate_distribution']['histogram'][4] == (
+        before['rate_distribution']['histogram'][4] + 1
+    )
+    assert [year['year'] for year in after['years']] == [1994, 1998, 2000, 2016, 2019]
+
+
+def _get_stats() -> CatalogStats:
+    stats = CatalogStats(reload_interval=0)
+    stats.load(FILMS, stats.version)
+    return stats
+
+
+def _get_catalog_stats(client) -> dict[str, Any]:
+    token = _get_basic_decoded_token(CorrectTestUser())
+    return json.loads(client.get('/stats', headers=_get_headers(token)).content)
@@ -0,0 +1,61 @@
+from http import HTTPStatus
+
+import bcrypt
+import pytest
+
+from app.credentials_cache import CredentialsCache, credentials_cache
+from app.db import UserOrm, create_session
+from tests.conftest import (
+    CorrectTestUser,
+    _get_basic_decoded_token,
+    _get_response_films_get_request_with_token,
+)
+
+
+@pytest.fixture()
+def cache() -> CredentialsCache:
+    return CredentialsCache(max_size=2, ttl=60)
+
+
+def test_cache_verifies_only_same_password(cache: CredentialsCache):
+    cache.add('kek', 'kek')
+    assert cache.is_verified('kek', 'kek')
+    assert not cache.is_verified('kek', 'kekSHREK')
+    assert not cache.is_verified('SHREK', 'kek')
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 1}
+
+
+def test_cache_drops_expired_entries():
+    cache = CredentialsCache(max_size=2, ttl=0)
+    cache.add('kek', 'kek')
+    assert not cache.is_verified('kek', 'kek')
+    assert cache.stats()['size'] == 0
+
+
+def test_cache_evicts_least_recently_used(cache: CredentialsCache):
+    cache.add('kek', 'kek')
+    cache.add('meow', 'meow')
+    cache.is_verified('kek', 'kek')
+    cache.add('shrek', 'shrek')
+    assert cache.is_verified('kek', 'kek')
+    assert not cache.is_verified('meow', 'meow')
+
+
+def test_repeated_request_hits_cache(_fill_test_user, test_client):
+    token = _get_basic_decoded_token(CorrectTestUser())
+    credentials_cache.clear()
+    first = _get_response_films_get_request_with_token(token, test_client)
+    second = _get_response_films_get_request_with_token(token, test_client)
+    assert first.status_code == second.status_code == HTTPStatus.OK
+    assert credentials_cache.stats()['hits'] == 1
+
+
+def test_password_change_invalidates_cache(_fill_test_user):
+    user = CorrectTestUser()
+    credentials_cache.add(user.user_name, user.password)
+    with create_session() as session:
+        user_row = (
+            session.query(UserOrm).filter(UserOrm.user_name == user.user_name).one()
+        )
+        user_row.password = bcrypt.hashpw(user.password.encode(), bcrypt.gensalt())
+    assert not credentials_cache.is_verified(user.user_name, user.password)
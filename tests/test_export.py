@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from http import HTTPStatus
+
+import pytest
+
+from app import export
+from app.constants import ExportFormat, ExportTable
+from app.export import export_rows
+from tests.conftest import CorrectTestUser, _get_basic_decoded_token, _get_headers
+
+
+@pytest.fixture()
+def _small_batches(monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_BATCH_SIZE', 2)
+
+
+def _get_export(client, url: str):
+    return client.get(
+        url, headers=_get_headers(_get_basic_decoded_token(CorrectTestUser()))
+    )
+
+
+def test_export_films_as_ndjson(_fill_test_user, _small_batches, test_client):
+    response = _get_export(test_client, '/export/films')
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    films = [json.loads(line) for line in response.text.splitlines()]
+    assert [film['id'] for film in films] == [1, 2, 3, 4, 5]
+    assert films[0] == {
+        'id': 1,
+        'film_name': 'The Gentlemen',
+        'slug': 'the-gentlemen',
+        'year': 2019,
+    }
+
+
+def test_export_films_as_csv(_fill_test_user, _small_batches, test_client):
+    response = _get_export(test_client, '/export/films?format=csv')
+
+    assert response.headers['content-type'].startswith('text/csv')
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ['id', 'film_name', 'slug', 'year']
+    assert rows[4] == [
+        '4',
+        'Lock, Stock and Two Smoking Barrels',
+        'lock-stock-and-two-smoking-barrels',
+        '1998',
+    ]
+    assert len(rows) == 6
+
+
+def test_export_resumes_after_id(_small_batches):
+    lines = ''.join(export_rows(ExportTable.FILMS, ExportFormat.NDJSON, after_id=3))
+    assert [json.loads(line)['id'] for line in lines.splitlines()] == [4, 5]
+
+
+@pytest.mark.parametrize('table', [ExportTable.RATES, ExportTable.COMMENTS])
+def test_export_reviews_in_id_order(_small_batches, table):
+    lines = ''.join(export_rows(table, ExportFormat.NDJSON)).splitlines()
+    ids = [json.loads(line)['id'] for line in lines]
+    assert ids == sorted(ids)
+
+
+def test_export_rejects_unknown_table(_fill_test_user, test_client):
+    response = _get_export(test_client, '/export/users')
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
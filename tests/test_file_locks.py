@@ -0,0 +1,11 @@
+from app.file_locks import lock_file
+
+
+def test_lock_is_taken_once(tmp_path):
+    path = str(tmp_path / 'file.lock')
+    with lock_file(path) as taken:
+        assert taken
+        with lock_file(path, blocking=False) as taken_again:
+            assert not taken_again
+    with lock_file(path, blocking=False) as taken:
+        assert taken
@@ -0,0 +1,86 @@
+import json
+from http import HTTPStatus
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.db import create_session
+from tests.conftest import CorrectTestUser, _get_basic_decoded_token, _get_headers
+
+FILM = 'the-shawshank-redemption'
+REVIEWERS = ('reviewer_1', 'reviewer_2', 'reviewer_3')
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _fill_reviews(_fill_test_user):
+    with create_session() as session:
+        film_id = session.execute(
+            text('SELECT id FROM films WHERE slug = :slug'), {'slug': FILM}
+        ).scalar()
+        for reviewer in REVIEWERS:
+            user_id = session.execute(
+                text('INSERT INTO users (user_name, password) VALUES (:login, :login)'),
+                {'login': reviewer},
+            ).lastrowid
+            review = {'film_id': film_id, 'user_id': user_id}
+            session.execute(
+                text(
+                    'INSERT INTO rates (film_id, user_id, rate) VALUES (:film_id, :user_id, 7)'
+                ),
+                review,
+            )
+            session.execute(
+                text(
+                    'INSERT INTO comments (film_id, user_id, comment) '
+                    "VALUES (:film_id, :user_id, 'classic')"
+                ),
+                review,
+            )
+
+
+@pytest.fixture()
+def film_first_page(test_client) -> dict[str, Any]:
+    return json.loads(_get(test_client, f'/films/{FILM}', {'limit': 2}).content)
+
+
+@pytest.mark.parametrize('reviews', ['comments', 'rates'])
+def test_show_certain_film_returns_first_page(
+    film_first_page: dict[str, Any], reviews: str
+):
+    assert len(film_first_page[reviews]) == 2
+    assert film_first_page[f'{reviews}_next_cursor'] is not None
+
+
+@pytest.mark.parametrize('reviews', ['comments', 'rates'])
+def test_show_next_page_of_film_reviews(
+    film_first_page: dict[str, Any], test_client, reviews
+):
+    cursor = film_first_page[f'{reviews}_next_cursor']
+    response = _get(test_client, f'/films/{FILM}/{reviews}', {'cursor': cursor})
+    next_page = json.loads(response.content)
+    shown_ids = [review['id'] for review in film_first_page[reviews]]
+    assert response.status_code == HTTPStatus.OK
+    assert len(next_page[reviews]) == 1
+    assert next_page[reviews][0]['id'] > max(shown_ids)
+    assert next_page['next_cursor'] is None
+
+
+def test_dont_show_comments_with_rates_cursor(
+    film_first_page: dict[str, Any], test_client
+):
+    cursor = film_first_page['rates_next_cursor']
+    response = _get(test_client, f'/films/{FILM}/comments', {'cursor': cursor})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize('reviews', ['comments', 'rates'])
+def test_dont_show_reviews_of_unknown_film(test_client, reviews: str):
+    response = _get(test_client, f'/films/shrek/{reviews}', {})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def _get(client: TestClient, url: str, params: dict[str, Any]):
+    token = _get_basic_decoded_token(CorrectTestUser())
+    return client.get(url, params=params, headers=_get_headers(token))
@@ -0,0 +1,93 @@
+import json
+from http import HTTPStatus
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db_models import UserModel
+from app.request_models import NewRate, NewReview
+from tests.conftest import (
+    _add_user_to_db,
+    _get_basic_decoded_token,
+    _response_create_new_review,
+    _response_show_certain_film,
+    _response_update_review,
+)
+
+FILM = 'kizumonogatari'
+
+
+class FirstReviewer(UserModel):
+    id = 0
+    user_name = 'stats_first'
+    password = 'stats_first'
+
+
+class SecondReviewer(UserModel):
+    id = 0
+    user_name = 'stats_second'
+    password = 'stats_second'
+
+
+@pytest.fixture(scope='module')
+def _fill_reviewers():
+    for reviewer in (FirstReviewer(), SecondReviewer()):
+        _add_user_to_db(reviewer.user_name, reviewer.password)
+
+
+@pytest.fixture()
+def _reviews(_fill_reviewers, test_client):
+    first_token = _get_basic_decoded_token(FirstReviewer())
+    second_token = _get_basic_decoded_token(SecondReviewer())
+    _response_create_new_review(
+        FILM, first_token, NewReview(comment='nice', rate=8), test_client
+    )
+    _response_create_new_review(FILM, second_token, NewRate(rate=8), test_client)
+
+
+@pytest.fixture()
+def film_info_after_reviews(_reviews, test_client) -> dict[str, Any]:
+    return _film_info(_get_basic_decoded_token(FirstReviewer()), test_client)
+
+
+@pytest.fixture()
+def film_info_after_update(_reviews, test_client) -> dict[str, Any]:
+    token = _get_basic_decoded_token(SecondReviewer())
+    _response_update_review(FILM, token, NewRate(rate=2), test_client)
+    return _film_info(token, test_client)
+
+
+def test_film_stats_count_every_review(film_info_after_reviews: dict[str, Any]):
+    assert film_info_after_reviews['average_rate'] == 8
+    assert film_info_after_reviews['rate_number'] == 2
+    assert film_info_after_reviews['comment_number'] == 1
+
+
+def test_rate_distribution_counts_every_rate(film_info_after_reviews: dict[str, Any]):
+    distribution = film_info_after_reviews['rate_distribution']
+    assert distribution['histogram'] == [0, 0, 0, 0, 0, 0, 0, 0, 2, 0, 0]
+    assert distribution['median'] == 8
+
+
+def test_film_stats_follow_updated_rate(film_info_after_update: dict[str, Any]):
+    assert film_info_after_update['average_rate'] == 5
+    assert film_info_after_update['rate_number'] == 2
+
+
+def test_rate_distribution_follows_updated_rate(film_info_after_update: dict[str, Any]):
+    distribution = film_info_after_update['rate_distribution']
+    assert distribution['histogram'] == [0, 0, 1, 0, 0, 0, 0, 0, 1, 0, 0]
+    assert distribution['median'] == 5
+    assert (distribution['p10'], distribution['p90']) == (2.6, 7.4)
+
+
+def test_show_unknown_film(_fill_reviewers, test_client):
+    token = _get_basic_decoded_token(FirstReviewer())
+    response = _response_show_certain_film('shrek', token, test_client)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def _film_info(token: str, client: TestClient) -> dict[str, Any]:
+    response = _response_show_certain_film(FILM, token, client)
+    return json.loads(response.content)['film_info']
@@ -0,0 +1,200 @@
+import io
+import json
+from pathlib import Path
+from typing import Any
+
+import bcrypt
+import pytest
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app import importer
+from app.constants import ExportFormat, ImportTable
+from app.db import Base, create_db_engine, init_db
+from app.importer import import_rows, read_rows
+from app.settings import Settings
+
+FILMS_CSV = 'film_name,slug,year\nHeat,heat,1995\nRonin,ronin,1998\n'
+
+
+@pytest.fixture()
+def db_engine(tmp_path: Path) -> Engine:
+    db_engine = create_db_engine(
+        Settings(database_url=f'sqlite:///{tmp_path / "i.db"}')
+    )
+    init_db(Base, db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+def _query(db_engine: Engine, sql: str) -> list[tuple[Any, ...]]:
+    with db_engine.connect() as connection:
+        return [tuple(row) for row in connection.exec_driver_sql(sql)]
+
+
+def _ndjson(*records: dict[str, Any]) -> io.StringIO:
+    return io.StringIO(''.join(json.dumps(record) + '\n' for record in records))
+
+
+def _review_indexes(db_engine: Engine) -> list[tuple[Any, ...]]:
+    return _query(
+        db_engine,
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = 'rates' AND name LIKE 'ix_%' ORDER BY name",
+    )
+
+
+def test_import_films_from_csv(db_engine):
+    rows = read_rows(io.StringIO(FILMS_CSV), ExportFormat.CSV, ImportTable.FILMS)
+    assert import_rows(ImportTable.FILMS, rows, db_engine) == 2
+    assert _query(db_engine, 'SELECT id, slug, year FROM films WHERE id > 5') == [
+        (6, 'heat', 1995),
+        (7, 'ronin', 1998),
+    ]
+    assert _query(db_engine, 'SELECT count(*) FROM film_stats') == [(7,)]
+    assert _query(
+        db_engine, "SELECT rowid FROM films_fts WHERE films_fts MATCH 'ronin'"
+    ) == [(7,)]
+
+
+def test_import_rates_rebuilds_indexes_and_stats(db_engine):
+    indexes = _review_indexes(db_engine)
+    rates = _ndjson(
+        {'id': 10, 'film_id': 3, 'user_id': 1, 'rate': 8},
+        {'id': 11, 'film_id': 3, 'user_id': 2, 'rate': 4},
+        {'id': 12, 'film_id': 1, 'user_id': 1, 'rate': 10},
+    )
+    progress: list[int] = []
+    imported = import_rows(
+        ImportTable.RATES,
+        read_rows(rates, ExportFormat.NDJSON, ImportTable.RATES),
+        db_engine,
+        chunk_size=2,
+        defer_indexes=True,
+        progress=progress.append,
+    )
+    assert imported == 3
+    assert progress == [2, 3]
+    assert _review_indexes(db_engine) == indexes
+    assert _query(
+        db_engine,
+        'SELECT film_id, rate_sum, rate_count, rate_4, rate_8, rate_10 '
+        'FROM film_stats WHERE rate_count > 0 ORDER BY film_id',
+    ) == [(1, 10, 1, 0, 0, 1), (3, 12, 2, 1, 1, 0)]
+
+
+def test_repeated_review_takes_the_import_back(db_engine):
+    rates = _ndjson(
+        {'film_id': 3, 'user_id': 1, 'rate': 8},
+        {'film_id': 3, 'user_id': 1, 'rate': 4},
+    )
+    with pytest.raises(ValueError, match='more than once'):
+        import_rows(
+            ImportTable.RATES,
+            read_rows(rates, ExportFormat.NDJSON, ImportTable.RATES),
+            db_engine,
+            chunk_size=1,
+            defer_indexes=True,
+        )
+    assert _query(db_engine, 'SELECT count(*) FROM rates') == [(0,)]
+    assert len(_review_indexes(db_engine)) == 2
+
+
+def test_repeated_review_takes_back_rows_below_existing_ids(db_engine):
+    _import_rates(db_engine, {'id': 50, 'film_id': 2, 'user_id': 2, 'rate': 1})
+    with pytest.raises(ValueError, match='more than once'):
+        _import_rates(
+            db_engine,
+            {'id': 5, 'film_id': 3, 'user_id': 1, 'rate': 8},
+            {'id': 6, 'film_id': 3, 'user_id': 1, 'rate': 4},
+            {'film_id': 4, 'user_id': 1, 'rate': 4},
+        )
+    assert _query(db_engine, 'SELECT id FROM rates') == [(50,)]
+    assert len(_review_indexes(db_engine)) == 2
+
+
+def test_repeated_review_fails_its_chunk_by_default(db_engine):
+    indexes = _review_indexes(db_engine)
+    rates = _ndjson(
+        {'film_id': 3, 'user_id': 1, 'rate': 8},
+        {'film_id': 3, 'user_id': 1, 'rate': 4},
+    )
+    with pytest.raises(IntegrityError):
+        import_rows(
+            ImportTable.RATES,
+            read_rows(rates, ExportFormat.NDJSON, ImportTable.RATES),
+            db_engine,
+            chunk_size=1,
+        )
+    # the unique index was never dropped, a server's writes can't repeat a review
+    assert _query(db_engine, 'SELECT rate FROM rates') == [(8,)]
+    assert _review_indexes(db_engine) == indexes
+
+
+def test_reviews_repeated_before_the_import_keep_indexes_down(db_engine):
+    indexes = _review_indexes(db_engine)
+    with db_engine.begin() as connection:
+        for (name,) in indexes:
+            connection.exec_driver_sql(f'DROP INDEX {name}')
+        connection.exec_driver_sql(
+            'INSERT INTO rates (film_id, user_id, rate) VALUES (1, 1, 2), (1, 1, 3)'
+        )
+    with pytest.raises(ValueError, match='repeated before the import'):
+        _import_rates(db_engine, {'film_id': 2, 'user_id': 1, 'rate': 8})
+    assert _query(db_engine, 'SELECT film_id FROM rates') == [(1,), (1,)]
+
+
+def test_chunks_before_an_invalid_record_stay_imported(db_engine):
+    comments = _ndjson(
+        {'film_id': 1, 'user_id': 1, 'comment': 'good'},
+        {'film_id': 1, 'user_id': 2},
+    )
+    with pytest.raises(ValueError, match='record 2'):
+        import_rows(
+            ImportTable.COMMENTS,
+            read_rows(comments, ExportFormat.NDJSON, ImportTable.COMMENTS),
+            db_engine,
+            chunk_size=1,
+        )
+    assert _query(
+        db_engine, 'SELECT comment_count FROM film_stats WHERE film_id = 1'
+    ) == [(1,)]
+
+
+def test_user_password_must_be_a_hash():
+    hashed = bcrypt.hashpw(b'secret', bcrypt.gensalt(4)).decode()
+    users = _ndjson(
+        {'user_name': 'hashed', 'password': hashed},
+        {'user_name': 'plain', 'password': 'secret'},
+    )
+    rows = read_rows(users, ExportFormat.NDJSON, ImportTable.USERS)
+    assert next(rows)['password'] == hashed.encode()
+    with pytest.raises(ValueError, match='bcrypt'):
+        next(rows)
+
+
+def test_main_reports_progress(db_engine, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(importer, 'engine', db_engine)
+    films = tmp_path / 'films.csv'
+    films.write_text(FILMS_CSV)
+    importer.main(['films', str(films), '--defer-indexes'])
+    assert 'films: imported 2 rows' in capsys.readouterr().err
+
+    films.write_text(FILMS_CSV)
+    with pytest.raises(SystemExit, match='UNIQUE constraint failed'):
+        importer.main(['films', str(films)])
+    films.write_text('film_name,slug,year\nHeat,heat-2,unknown\n')
+    with pytest.raises(SystemExit, match='record 1'):
+        importer.main(['films', str(films)])
+    with pytest.raises(SystemExit):
+        importer.main(['films', str(tmp_path / 'films.txt')])
+
+
+def _import_rates(db_engine: Engine, *rates: dict[str, Any]) -> int:
+    return import_rows(
+        ImportTable.RATES,
+        read_rows(_ndjson(*rates), ExportFormat.NDJSON, ImportTable.RATES),
+        db_engine,
+        chunk_size=1,
+        defer_indexes=True,
+    )
@@ -0,0 +1,41 @@
+import multiprocessing
+from pathlib import Path
+
+from app.db import Base, create_db_engine, init_db
+from app.migrations import SCHEMA_VERSION, get_schema_version
+from app.settings import Settings
+
+
+def _init_db(database_url: str) -> None:
+    db_engine = create_db_engine(Settings(database_url=database_url))
+    init_db(Base, db_engine)
+    db_engine.dispose()
+
+
+def test_concurrent_init_creates_schema_once(tmp_path: Path):
+    database_url = f'sqlite:///{tmp_path / "films.db"}'
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_init_db, args=(database_url,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    db_engine = create_db_engine(Settings(database_url=database_url))
+    with db_engine.connect() as connection:
+        films = connection.exec_driver_sql('SELECT count(*) FROM films').scalar()
+        stats = connection.exec_driver_sql('SELECT count(*) FROM film_stats').scalar()
+        version = get_schema_version(connection)
+    db_engine.dispose()
+    assert [worker.exitcode for worker in workers] == [0, 0, 0, 0]
+    assert (films, stats, version) == (5, 5, SCHEMA_VERSION)
+
+
+def test_init_db_is_idempotent(tmp_path: Path):
+    database_url = f'sqlite:///{tmp_path / "films.db"}'
+    _init_db(database_url)
+    _init_db(database_url)
+    db_engine = create_db_engine(Settings(database_url=database_url))
+    with db_engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT count(*) FROM films').scalar() == 5
+    db_engine.dispose()
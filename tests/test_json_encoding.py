@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.json_encoding import dump_json
+from app.request_models import (
+    CatalogStatsResponse,
+    CertainFilmResponse,
+    FilmCommentsResponse,
+    FilmRatesResponse,
+    FilmsResponse,
+    TopFilmsResponse,
+)
+from app.urls import app
+from tests.conftest import CorrectTestUser, _get_basic_decoded_token, _get_headers
+
+
+def test_dump_json_is_compact():
+    assert dump_json({'rate': 1.5, 'next_cursor': None}) == (
+        b'{"rate":1.5,"next_cursor":null}'
+    )
+
+
+@pytest.mark.parametrize(
+    'url, model',
+    [
+        ('/films?limit=2', FilmsResponse),
+        ('/films?sort=rate', FilmsResponse),
+        ('/films/snatch', CertainFilmResponse),
+        ('/films/snatch/comments', FilmCommentsResponse),
+        ('/films/snatch/rates', FilmRatesResponse),
+        ('/films/top', TopFilmsResponse),
+        ('/stats', CatalogStatsResponse),
+    ],
+)
+def test_response_matches_schema(_fill_test_user, test_client, url, model):
+    response = test_client.get(
+        url, headers=_get_headers(_get_basic_decoded_token(CorrectTestUser()))
+    )
+    content = json.loads(response.content)
+    assert content == json.loads(model.parse_obj(content).json())
+
+
+@pytest.mark.parametrize(
+    'path, model',
+    [
+        ('/films', FilmsResponse),
+        ('/films/top', TopFilmsResponse),
+        ('/films/{film_slug}', CertainFilmResponse),
+    ],
+)
+def test_openapi_documents_response_model(path, model):
+    schema = app.openapi()['paths'][path]['get']['responses']['200']
+    assert schema['content']['application/json']['schema'] == {
+        '$ref': f'#/components/schemas/{model.__name__}'
+    }
@@ -0,0 +1,135 @@
+import ctypes
+import json
+import multiprocessing
+from typing import Any
+
+import sqlalchemy as sa
+
+from app.db import async_read_engine, engine, read_engine
+from app.db_models import UserModel
+from app.events import FilmReviewChange
+from app.leaderboard import Leaderboard, LeaderboardFilm
+from app.request_models import NewRate
+from tests.conftest import (
+    CorrectTestUser,
+    _add_user_to_db,
+    _get_basic_decoded_token,
+    _get_headers,
+    _response_create_new_review,
+)
+
+FILMS = [
+    LeaderboardFilm(1, 'Once', 'once', 2000, rate_sum=10, rate_count=1),
+    LeaderboardFilm(2, 'Often', 'often', 2001, rate_sum=900, rate_count=100),
+    LeaderboardFilm(3, 'Never', 'never', 2002, rate_sum=0, rate_count=0),
+]
+
+
+def test_leaderboard_ranks_by_weighted_average():
+    leaderboard = _get_leaderboard()
+    top = leaderboard.top(10)
+    assert [film['slug'] for film in top] == ['often', 'once']
+    assert top[1]['average_rate'] == 10
+    assert top[1]['score'] == (10 + 10 * 5) / (1 + 10)
+
+
+def test_leaderboard_follows_review_changes():
+    leaderboard = _get_leaderboard()
+    leaderboard.apply(_change(3, None, 10))
+    leaderboard.apply(_change(2, 9, 0))
+    top = leaderboard.top(10)
+    # equal scores go by id
+    assert [film['slug'] for film in top] == ['often', 'once', 'never']
+    assert (top[0]['average_rate'], top[0]['rate_number']) == (8.91, 100)
+    assert (top[2]['average_rate'], top[2]['rate_number']) == (10, 1)
+
+
+def test_leaderboard_is_limited():
+    assert [film['slug'] for film in _get_leaderboard().top(1)] == ['often']
+
+
+def test_leaderboard_reloads_after_change_in_another_worker():
+    shared_version = multiprocessing.Value(ctypes.c_uint64, 0)
+    writer_leaderboard = _get_leaderboard(shared_version)
+    reader_leaderboard = _get_leaderboard(shared_version)
+    writer_leaderboard.apply(_change(1, 10, 0))
+    assert not writer_leaderboard.claim_reload()
+    assert reader_leaderboard.claim_reload()
+    # the next reload is due after reload_interval only
+    assert not reader_leaderboard.claim_reload()
+
+
+def test_first_load_is_claimed_once():
+    leaderboard = Leaderboard(10, 5, reload_interval=60)
+    assert leaderboard.claim_reload()
+    # concurrent first requests don't load it again
+    assert not leaderboard.claim_reload()
+
+
+def test_leaderboard_stays_stale_after_change_during_load():
+    leaderboard = Leaderboard(10, 5, reload_interval=0)
+    version = leaderboard.version
+    leaderboard.apply(_change(1, None, 10))
+    leaderboard.load(FILMS, version)
+    assert leaderboard.claim_reload()
+
+
+def test_leaderboard_reloads_for_new_film():
+    leaderboard = _get_leaderboard(reload_interval=0)
+    leaderboard.apply(_change(4, None, 10))
+    assert leaderboard.claim_reload()
+
+
+def test_show_top_films_without_database(_fill_test_user, test_client):
+    _get_top_films(test_client)
+    _add_user_to_db('leaderboard_reviewer', 'leaderboard_reviewer')
+    reviewer = UserModel(
+        id=0, user_name='leaderboard_reviewer', password='leaderboard_reviewer'
+    )
+    _response_create_new_review(
+        'kizumonogatari',
+        _get_basic_decoded_token(reviewer),
+        NewRate(rate=10),
+        test_client,
+    )
+    statements: list[str] = []
+
+    def count_statement(*args: Any) -> None:
+        statements.append(args[2])
+
+    db_engines = (engine, read_engine, async_read_engine.sync_engine)
+    for db_engine in db_engines:
+        sa.event.listen(db_engine, 'before_cursor_execute', count_statement)
+    try:
+        top = _get_top_films(test_client)
+    finally:
+        for db_engine in db_engines:
+            sa.event.remove(db_engine, 'before_cursor_execute', count_statement)
+    film_info = json.loads(
+        test_client.get(
+            '/films/kizumonogatari',
+            headers=_get_headers(_get_basic_decoded_token(CorrectTestUser())),
+        ).content
+    )['film_info']
+    film = next(film for film in top if film['slug'] == 'kizumonogatari')
+    assert not statements
+    assert (film['average_rate'], film['rate_number']) == (
+        film_info['average_rate'],
+        film_info['rate_number'],
+    )
+
+
+def _get_leaderboard(shared_version=None, reload_interval: float = 60) -> Leaderboard:
+    leaderboard = Leaderboard(10, 5, reload_interval, shared_version)
+    leaderboard.load(FILMS, leaderboard.version)
+    return leaderboard
+
+
+def _change(film_id: int, old_rate, new_rate) -> FilmReviewChange:
+    return FilmReviewChange(film_id, '', 1, old_rate, new_rate)
+
+
+def _get_top_films(client) -> list[dict[str, Any]]:
+    token = _get_basic_decoded_token(CorrectTestUser())
+    response = client.get('/films/top', headers=_get_headers(token))
+    return json.loads(response.content)['films']
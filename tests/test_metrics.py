@@ -0,0 +1,85 @@
+import re
+
+from app.metrics import Counter, Histogram, registry
+from tests.conftest import _add_user_to_db, _get_headers
+
+
+def _sample(metrics: str, name: str, **labels: str) -> float:
+    label_text = ','.join(f'{label}="{value}"' for label, value in labels.items())
+    match = re.search(
+        rf'^{re.escape(name)}{{{re.escape(label_text)}}} (\S+)$', metrics, re.MULTILINE
+    )
+    assert match is not None, f'{name}{labels} not in metrics'
+    return float(match.group(1))
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_seconds', 'Test.', ('kind',), buckets=(0.1, 1))
+    registry.remove(histogram)
+    for value in (0.1, 0.5, 2):
+        histogram.observe(value, 'a')
+    assert ''.join(histogram.render()) == (
+        '# HELP test_seconds Test.\n'
+        '# TYPE test_seconds histogram\n'
+        'test_seconds_bucket{kind="a",le="0.1"} 1\n'
+        'test_seconds_bucket{kind="a",le="1"} 2\n'
+        'test_seconds_bucket{kind="a",le="+Inf"} 3\n'
+        'test_seconds_count{kind="a"} 3\n'
+        'test_seconds_sum{kind="a"} 2.6\n'
+    )
+
+
+def test_label_values_are_escaped():
+    counter = Counter('test_total', 'Test.', ('path',))
+    registry.remove(counter)
+    counter.inc('a"b\\c\n')
+    assert list(counter.render())[-1] == 'test_total{path="a\\"b\\\\c\\n"} 1\n'
+
+
+def test_metrics_of_requests_sql_and_bcrypt(test_client):
+    _add_user_to_db('metrics', 'metrics')
+    basic_token = 'Basic bWV0cmljczptZXRyaWNz'  # metrics:metrics
+    test_client.get('/films/snatch', headers=_get_headers(basic_token))
+    test_client.get('/films/no-such-film', headers=_get_headers(basic_token))
+    test_client.get('/no-such-route')
+
+    response = test_client.get('/metrics')
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    metrics = response.text
+    route = '/films/{film_slug}'
+    assert (
+        _sample(metrics, 'http_requests_total', method='GET', route=route, status='200')
+        >= 1
+    )
+    assert (
+        _sample(metrics, 'http_requests_total', method='GET', route=route, status='404')
+        >= 1
+    )
+    assert (
+        _sample(
+            metrics,
+            'http_requests_total',
+            method='GET',
+            route='unmatched',
+            status='404',
+        )
+        >= 1
+    )
+    assert (
+        _sample(
+            metrics, 'http_request_duration_seconds_count', method='GET', route=route
+        )
+        >= 2
+    )
+    # the scrape itself is in progress
+    assert _sample(metrics, 'http_requests_in_progress', method='GET') == 1
+    assert (
+        _sample(
+            metrics, 'sql_statements_total', engine='async_read', statement='SELECT'
+        )
+        >= 1
+    )
+    assert (
+        _sample(metrics, 'sql_statement_duration_seconds_count', engine='writer') >= 1
+    )
+    assert _sample(metrics, 'bcrypt_duration_seconds_count', function='checkpw') >= 1
@@ -0,0 +1,90 @@
+import pytest
+import sqlalchemy as sa
+
+from app.migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+BASELINE_SCHEMA = (
+    'CREATE TABLE films (id INTEGER NOT NULL, film_name VARCHAR NOT NULL, '
+    'slug VARCHAR NOT NULL, year INTEGER NOT NULL, PRIMARY KEY (id), UNIQUE (slug))',
+    'CREATE TABLE users (id INTEGER NOT NULL, user_name VARCHAR NOT NULL, '
+    'password VARCHAR NOT NULL, PRIMARY KEY (id), UNIQUE (user_name))',
+    'CREATE TABLE rates (id INTEGER NOT NULL, user_id INTEGER NOT NULL, '
+    'film_id INTEGER NOT NULL, rate INTEGER NOT NULL, PRIMARY KEY (id), '
+    'CHECK (0 <= rate <= 10))',
+    'CREATE TABLE comments (id INTEGER NOT NULL, user_id INTEGER NOT NULL, '
+    'film_id INTEGER NOT NULL, comment VARCHAR NOT NULL, PRIMARY KEY (id))',
+    "INSERT INTO films VALUES (1, 'Snatch', 'snatch', 2000)",
+    "INSERT INTO users VALUES (1, 'kek', 'kek')",
+    'INSERT INTO rates VALUES (1, 1, 1, 2), (2, 1, 1, 8)',
+    "INSERT INTO comments VALUES (1, 1, 1, 'bad'), (2, 1, 1, 'good')",
+)
+
+
+@pytest.fixture()
+def baseline_engine(tmp_path) -> sa.engine.Engine:
+    baseline_engine = sa.create_engine(f'sqlite:///{tmp_path / "baseline.db"}')
+    with baseline_engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.exec_driver_sql(statement)
+    return baseline_engine
+
+
+@pytest.fixture()
+def migrated_engine(baseline_engine: sa.engine.Engine) -> sa.engine.Engine:
+    with baseline_engine.begin() as connection:
+        migrate(connection)
+    return baseline_engine
+
+
+def test_migrate_stamps_schema_version(migrated_engine: sa.engine.Engine):
+    with migrated_engine.connect() as connection:
+        assert get_schema_version(connection) == SCHEMA_VERSION
+
+
+def test_migrate_keeps_latest_review(migrated_engine: sa.engine.Engine):
+    with migrated_engine.connect() as connection:
+        rates = connection.exec_driver_sql('SELECT rate FROM rates').all()
+        comments = connection.exec_driver_sql('SELECT comment FROM comments').all()
+        stats = connection.exec_driver_sql(
+            'SELECT film_id, rate_sum, rate_count, comment_count, rate_2, rate_8 '
+            'FROM film_stats'
+        ).all()
+    assert rates == [(8,)]
+    assert comments == [('good',)]
+    assert stats == [(1, 8, 1, 1, 0, 1)]
+
+
+def test_migrate_adds_unique_review_index(migrated_engine: sa.engine.Engine):
+    with pytest.raises(sa.exc.IntegrityError):
+        with migrated_engine.begin() as connection:
+            connection.exec_driver_sql('INSERT INTO rates VALUES (3, 1, 1, 5)')
+
+
+def test_migrate_is_noop_for_current_schema(migrated_engine: sa.engine.Engine):
+    with migrated_engine.begin() as connection:
+        migrate(connection)
+        assert connection.exec_driver_sql('SELECT count(*) FROM rates').scalar() == 1
+
+
+def test_migrate_indexes_film_names(migrated_engine: sa.engine.Engine):
+    with migrated_engine.connect() as connection:
+        found = connection.exec_driver_sql(
+            "SELECT rowid FROM films_fts WHERE films_fts MATCH 'snat*'"
+        ).all()
+    assert found == [(1,)]
+
+
+def test_migrate_adds_average_rate(migrated_engine: sa.engine.Engine):
+    with migrated_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO films VALUES (2, 'Kizumonogatari', 'kizumonogatari', 2016)"
+        )
+        averages = connection.exec_driver_sql(
+            'SELECT average_rate FROM film_stats ORDER BY average_rate DESC'
+        ).all()
+        plan = connection.exec_driver_sql(
+            'EXPLAIN QUERY PLAN SELECT film_id FROM film_stats '
+            'ORDER BY average_rate DESC LIMIT 1'
+        ).all()
+    assert averages == [(8.0,), (-1.0,)]
+    assert 'ix_film_stats_average_rate' in plan[0][-1]
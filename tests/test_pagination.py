@@ -0,0 +1,127 @@
+import json
+from base64 import urlsafe_b64encode
+from http import HTTPStatus
+from typing import Any, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.constants import PAGE_MAX_LIMIT, ErrorMessage
+from tests.conftest import CorrectTestUser, _get_basic_decoded_token, _get_headers
+
+
+@pytest.mark.parametrize('sort', [None, 'rate'])
+def test_pages_cover_every_film_once(_fill_test_user, test_client, sort):
+    pages = _walk_films(test_client, sort)
+    film_ids = [film['id'] for page in pages for film in page['films']]
+    assert len(pages) == 3
+    assert sorted(film_ids) == [1, 2, 3, 4, 5]
+    assert pages[-1]['next_cursor'] is None
+
+
+def test_rate_pages_are_sorted_by_average_rate(_fill_test_user, test_client):
+    pages = _walk_films(test_client, 'rate')
+    rates = [film['average_rate'] or -1 for page in pages for film in page['films']]
+    assert rates == sorted(rates, reverse=True)
+
+
+SORT_FIELDS = {
+    'rate': 'average_rate',
+    'rate_count': 'rate_number',
+    'comment_count': 'comment_number',
+    'year': 'year',
+    'name': 'film_name',
+}
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('sort', list(SORT_FIELDS))
+def test_film_pages_are_sorted(_fill_test_user, test_client, sort, order):
+    pages = _walk_films(test_client, sort, order=order)
+    films = [film for page in pages for film in page['films']]
+    field = SORT_FIELDS[sort]
+    keys = [(-1 if film[field] is None else film[field], film['id']) for film in films]
+    assert keys == sorted(keys, reverse=order == 'desc')
+    assert len(keys) == 5
+
+
+def test_films_are_sorted_by_name_from_a_to_z(_fill_test_user, test_client):
+    films = json.loads(_get_films(test_client, {'sort': 'name'}).content)['films']
+    assert [film['slug'] for film in films] == [
+        'kizumonogatari',
+        'lock-stock-and-two-smoking-barrels',
+        'snatch',
+        'the-gentlemen',
+        'the-shawshank-redemption',
+    ]
+
+
+def test_show_films_with_min_votes(_fill_test_user, test_client):
+    token = _get_basic_decoded_token(CorrectTestUser())
+    test_client.post(
+        '/films/kizumonogatari', json={'rate': 7}, headers=_get_headers(token)
+    )
+    all_films = json.loads(_get_films(test_client, {'sort': 'rate'}).content)
+    rated_films = json.loads(
+        _get_films(test_client, {'sort': 'rate', 'min_votes': 1}).content
+    )
+    assert rated_films['films'] == [
+        film for film in all_films['films'] if film['rate_number'] >= 1
+    ]
+    assert any(film['slug'] == 'kizumonogatari' for film in rated_films['films'])
+
+
+def test_dont_show_films_with_unknown_sort(_fill_test_user, test_client):
+    response = _get_films(test_client, {'sort': 'popularity'})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_dont_show_films_with_invalid_cursor(_fill_test_user, test_client):
+    response = _get_films(test_client, {'cursor': 'kek'})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert json.loads(response.content) == {'detail': ErrorMessage.INVALID_CURSOR.value}
+
+
+@pytest.mark.parametrize('after', [[{}], [[1, 2]], [10**30], [None], 'a'])
+def test_dont_show_films_with_forged_cursor(_fill_test_user, test_client, after):
+    payload = json.dumps({'kind': '', 'after': after}).encode()
+    response = _get_films(test_client, {'cursor': urlsafe_b64encode(payload).decode()})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert json.loads(response.content) == {'detail': ErrorMessage.INVALID_CURSOR.value}
+
+
+def test_dont_show_films_with_cursor_of_other_sort(_fill_test_user, test_client):
+    rate_cursor = _walk_films(test_client, 'rate')[0]['next_cursor']
+    response = _get_films(test_client, {'cursor': rate_cursor})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_dont_show_films_with_cursor_of_other_order(_fill_test_user, test_client):
+    rate_cursor = _walk_films(test_client, 'rate')[0]['next_cursor']
+    response = _get_films(
+        test_client, {'sort': 'rate', 'order': 'asc', 'cursor': rate_cursor}
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_dont_show_films_over_page_limit(_fill_test_user, test_client):
+    response = _get_films(test_client, {'limit': PAGE_MAX_LIMIT + 1})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def _walk_films(
+    client: TestClient, sort: Optional[str] = None, **params: Any
+) -> list[dict[str, Any]]:
+    params['limit'] = 2
+    if sort is not None:
+        params['sort'] = sort
+    pages = [json.loads(_get_films(client, params).content)]
+    while pages[-1]['next_cursor'] is not None:
+        params['cursor'] = pages[-1]['next_cursor']
+        pages.append(json.loads(_get_films(client, params).content))
+    return pages
+
+
+def _get_films(client: TestClient, params: dict[str, Any]):
+    token = _get_basic_decoded_token(CorrectTestUser())
+    return client.get('/films', params=params, headers=_get_headers(token))
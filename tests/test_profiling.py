@@ -0,0 +1,125 @@
+import json
+import logging
+from typing import Any
+
+import pytest
+
+from app.profiling import _python_profiler_lock
+from app.settings import settings
+from tests.conftest import _add_user_to_db, _get_headers
+
+PROFILED = {'X-Profile': 'secret'}
+
+
+@pytest.fixture()
+def _profiling_token(monkeypatch, caplog):
+    monkeypatch.setattr(settings, 'profiling_token', 'secret')
+    caplog.set_level(logging.INFO, logger='app.profiling')
+
+
+@pytest.fixture(scope='module')
+def profiled_user_headers() -> dict[str, str]:
+    _add_user_to_db('profiled', 'profiled')
+    return _get_headers('Basic cHJvZmlsZWQ6cHJvZmlsZWQ=')  # profiled:profiled
+
+
+def _timing_names(response) -> list[str]:
+    return [
+        metric.split(';')[0].strip()
+        for metric in response.headers['server-timing'].split(',')
+    ]
+
+
+def _logged_entry(caplog) -> dict[str, Any]:
+    return json.loads(caplog.records[-1].getMessage())
+
+
+def test_requests_are_not_profiled_by_default(test_client, profiled_user_headers):
+    response = test_client.get('/films?year=1998', headers=profiled_user_headers)
+    assert 'server-timing' not in response.headers
+
+
+def test_wrong_token_is_not_profiled(
+    _profiling_token, test_client, profiled_user_headers
+):
+    response = test_client.get(
+        '/films?year=1998', headers={**profiled_user_headers, 'X-Profile': 'guess'}
+    )
+    assert 'server-timing' not in response.headers
+
+
+def test_profiled_films_request(
+    _profiling_token, caplog, test_client, profiled_user_headers
+):
+    response = test_client.get(
+        '/films?year=2000&limit=7', headers={**profiled_user_headers, **PROFILED}
+    )
+    assert response.status_code == 200
+    assert _timing_names(response) == [
+        'total',
+        'sql',
+        'films.query',
+        'films.serialize',
+    ]
+    entry = _logged_entry(caplog)
+    assert entry['event'] == 'profiled_request'
+    assert entry['path'] == '/films'
+    assert entry['query'] == 'year=2000&limit=7'
+    assert any(s['sql'].startswith('SELECT films.id') for s in entry['statements'])
+    assert entry['functions']
+
+
+def test_profiled_film_request_with_auth_spans(_profiling_token, test_client):
+    _add_user_to_db('profiled_auth', 'profiled_auth')
+    token = 'Basic cHJvZmlsZWRfYXV0aDpwcm9maWxlZF9hdXRo'  # profiled_auth:profiled_auth
+    response = test_client.get(
+        '/films/lock-stock-and-two-smoking-barrels?limit=3',
+        headers={**_get_headers(token), **PROFILED},
+    )
+    assert _timing_names(response)[2:] == [
+        'auth.lookup',
+        'auth.bcrypt',
+        'film.query',
+        'film.comments',
+        'film.rates',
+        'film.serialize',
+    ]
+
+
+def test_profiled_write_records_writer_statements(
+    _profiling_token, caplog, test_client, profiled_user_headers
+):
+    response = test_client.post(
+        '/films/kizumonogatari',
+        data=json.dumps({'rate': 7}),
+        headers={**profiled_user_headers, **PROFILED},
+    )
+    assert response.status_code == 200
+    statements = [s['sql'] for s in _logged_entry(caplog)['statements']]
+    assert any(statement.startswith('INSERT INTO rates') for statement in statements)
+
+
+def test_slow_request_is_logged(monkeypatch, caplog, test_client):
+    monkeypatch.setattr(settings, 'slow_request_threshold', 0)
+    test_client.get('/no-such-route?page=1')
+    warning = caplog.records[-1]
+    entry = json.loads(warning.getMessage())
+    assert warning.levelno == logging.WARNING
+    assert entry.pop('ms') >= 0
+    assert entry == {
+        'event': 'slow_request',
+        'method': 'GET',
+        'path': '/no-such-route',
+        'query': 'page=1',
+        'status': 404,
+    }
+
+
+def test_one_python_profile_at_a_time(monkeypatch, caplog, test_client):
+    monkeypatch.setattr(settings, 'profiling_enabled', True)
+    caplog.set_level(logging.INFO, logger='app.profiling')
+    # as if another request was being profiled
+    with _python_profiler_lock:
+        response = test_client.get('/no-such-route')
+    assert _timing_names(response) == ['total', 'sql']
+    assert _logged_entry(caplog)['functions'] == []
@@ -0,0 +1,27 @@
+import random
+import statistics
+
+import pytest
+
+from app.rate_distribution import get_percentile
+
+
+def test_percentile_of_no_rates():
+    assert get_percentile([0] * 11, 50) is None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_percentiles_match_statistics_quantiles(seed):
+    rng = random.Random(seed)
+    rates = [rng.randint(0, 10) for _ in range(rng.randint(2, 50))]
+    histogram = [rates.count(rate) for rate in range(11)]
+    quantiles = statistics.quantiles(rates, n=100, method='inclusive')
+    assert get_percentile(histogram, 50) == pytest.approx(statistics.median(rates))
+    for percent in (10, 25, 75, 90):
+        assert get_percentile(histogram, percent) == pytest.approx(
+            quantiles[percent - 1]
+        )
+
+
+def test_percentile_of_single_rate():
+    assert get_percentile([0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0], 90) == 3
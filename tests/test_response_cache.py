@@ -0,0 +1,101 @@
+import ctypes
+import multiprocessing
+from http import HTTPStatus
+from typing import Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db_models import UserModel
+from app.request_models import NewRate
+from app.response_cache import ResponseCache, normalize_substr
+from tests.conftest import (
+    CorrectTestUser,
+    _add_user_to_db,
+    _get_basic_decoded_token,
+    _get_headers,
+    _response_create_new_review,
+)
+
+FILM = 'snatch'
+
+
+def test_cache_is_bounded():
+    cache = ResponseCache(max_size=1)
+    cache.set('first', b'{}', cache.generation)
+    cache.set('second', b'{}', cache.generation)
+    assert cache.get('first') is None
+    assert cache.get('second') is not None
+
+
+def test_cache_dont_store_response_older_than_invalidation():
+    cache = ResponseCache(max_size=2)
+    generation = cache.generation
+    cache.invalidate_film(FILM)
+    cache.set('films', b'{}', generation)
+    assert cache.get('films') is None
+
+
+def test_cache_invalidates_lists_and_changed_film_only():
+    cache = ResponseCache(max_size=3)
+    for key, film_slug in (('films', None), ('snatch', 'snatch'), ('other', 'other')):
+        cache.set(key, b'{}', cache.generation, film_slug)
+    cache.invalidate_film('snatch')
+    assert [cache.get(key) is None for key in ('films', 'snatch', 'other')] == [
+        True,
+        True,
+        False,
+    ]
+
+
+def test_change_in_another_worker_drops_whole_cache():
+    shared_generation = multiprocessing.Value(ctypes.c_uint64, 0)
+    writer_cache = ResponseCache(max_size=2, shared_generation=shared_generation)
+    reader_cache = ResponseCache(max_size=2, shared_generation=shared_generation)
+    for cache in (writer_cache, reader_cache):
+        cache.set('other', b'{}', cache.generation, 'other')
+    generation = reader_cache.generation
+    writer_cache.invalidate_film(FILM)
+    reader_cache.set('films', b'{}', generation)
+    assert writer_cache.get('other') is not None
+    assert reader_cache.get('other') is None
+    assert reader_cache.get('films') is None
+
+
+@pytest.mark.parametrize(
+    'substr, normalized',
+    [(None, None), ('', None), ('Lock,  STOCK', 'lock stock'), ('!!!', '')],
+)
+def test_normalize_substr(substr, normalized):
+    assert normalize_substr(substr) == normalized
+
+
+@pytest.mark.parametrize('url', ['/films', f'/films/{FILM}'])
+def test_matching_etag_is_not_modified(_fill_test_user, test_client, url):
+    first = _get(test_client, url)
+    second = _get(test_client, url, first.headers['ETag'])
+    assert first.status_code == HTTPStatus.OK
+    assert second.status_code == HTTPStatus.NOT_MODIFIED
+    assert not second.content
+
+
+@pytest.mark.parametrize(
+    'url, reviewer_login',
+    [('/films', 'cache_list_reviewer'), (f'/films/{FILM}', 'cache_film_reviewer')],
+)
+def test_review_changes_etag(_fill_test_user, test_client, url, reviewer_login):
+    etag = _get(test_client, url).headers['ETag']
+    _add_user_to_db(reviewer_login, reviewer_login)
+    reviewer = UserModel(id=0, user_name=reviewer_login, password=reviewer_login)
+    token = _get_basic_decoded_token(reviewer)
+    _response_create_new_review(FILM, token, NewRate(rate=3), test_client)
+    response = _get(test_client, url, etag)
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag'] != etag
+
+
+def _get(client: TestClient, url: str, etag: Optional[str] = None):
+    headers = _get_headers(_get_basic_decoded_token(CorrectTestUser()))
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    return client.get(url, headers=headers)
@@ -0,0 +1,106 @@
+from http import HTTPStatus
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_entities
+from app.db import FilmOrm, FilmStatsOrm, create_session
+from app.db_models import UserModel
+from tests.conftest import _add_user_to_db, _get_basic_decoded_token, _get_headers
+
+BATCH_URL = '/reviews/batch'
+
+
+def _post_batch(client: TestClient, login: str, reviews: list[dict[str, Any]]):
+    reviewer = UserModel(id=0, user_name=login, password=login)
+    return client.post(
+        BATCH_URL,
+        json={'reviews': reviews},
+        headers=_get_headers(_get_basic_decoded_token(reviewer)),
+    )
+
+
+def _get_film_stats(film_slug: str) -> tuple[int, ...]:
+    with create_session() as session:
+        stats = (
+            session.query(
+                FilmStatsOrm.rate_sum,
+                FilmStatsOrm.rate_count,
+                FilmStatsOrm.comment_count,
+                FilmStatsOrm.rate_8,
+            )
+            .join(FilmOrm, FilmOrm.id == FilmStatsOrm.film_id)
+            .filter(FilmOrm.slug == film_slug)
+            .one()
+        )
+    return tuple(stats)
+
+
+def test_batch_reports_status_per_item(test_client):
+    _add_user_to_db('batch_reviewer', 'batch_reviewer')
+    stats_before = _get_film_stats('the-gentlemen')
+    reviews = [
+        {'film_slug': 'the-gentlemen', 'comment': 'batched', 'rate': 8},
+        {'film_slug': 'kizumonogatari', 'rate': 6},
+        {'film_slug': 'the-gentlemen', 'rate': 2},
+        {'film_slug': 'shrek', 'rate': 5},
+    ]
+
+    response = _post_batch(test_client, 'batch_reviewer', reviews)
+
+    assert response.status_code == HTTPStatus.OK
+    assert [result['status'] for result in response.json()['results']] == [
+        'created',
+        'created',
+        'conflict',
+        'film not found',
+    ]
+    rate_sum, rate_count, comment_count, rated_8 = stats_before
+    assert _get_film_stats('the-gentlemen') == (
+        rate_sum + 8,
+        rate_count + 1,
+        comment_count + 1,
+        rated_8 + 1,
+    )
+    repeated = _post_batch(test_client, 'batch_reviewer', reviews[:2])
+    assert [result['status'] for result in repeated.json()['results']] == [
+        'conflict',
+        'conflict',
+    ]
+
+
+def test_batch_is_written_in_chunks(test_client, monkeypatch):
+    monkeypatch.setattr(create_entities, 'REVIEWS_BATCH_CHUNK_SIZE', 1)
+    _add_user_to_db('chunked_reviewer', 'chunked_reviewer')
+    reviews = [
+        {'film_slug': 'kizumonogatari', 'rate': 4},
+        {'film_slug': 'the-shawshank-redemption', 'comment': 'chunked', 'rate': 9},
+        {'film_slug': 'kizumonogatari', 'rate': 5},
+    ]
+
+    response = _post_batch(test_client, 'chunked_reviewer', reviews)
+
+    assert [result['status'] for result in response.json()['results']] == [
+        'created',
+        'created',
+        'conflict',
+    ]
+
+
+@pytest.mark.parametrize(
+    'reviews',
+    [
+        [{'film_slug': 'snatch', 'rate': 11}],
+        [{'film_slug': 'snatch', 'comment': 'no rate'}],
+        [{'rate': 5}],
+    ],
+)
+def test_batch_validates_every_item(test_client, reviews):
+    response = _post_batch(test_client, 'batch_reviewer', reviews)
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_batch_requires_authentication(test_client):
+    response = test_client.post(BATCH_URL, json={'reviews': []})
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,53 @@
+import json
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import FilmOrm, create_session
+from tests.conftest import CorrectTestUser, _get_basic_decoded_token, _get_headers
+
+
+@pytest.mark.parametrize(
+    'substr, slugs',
+    [
+        ('gent', ['the-gentlemen']),
+        ('STOCK smok', ['lock-stock-and-two-smoking-barrels']),
+        ('lock, stock!', ['lock-stock-and-two-smoking-barrels']),
+        ('!!!', []),
+    ],
+)
+def test_search_films_by_word_prefixes(_fill_test_user, test_client, substr, slugs):
+    assert _search(test_client, {'substr': substr}) == slugs
+
+
+def test_search_films_with_year(_fill_test_user, test_client):
+    found = _search(test_client, {'substr': 'the', 'year': 1994})
+    assert found == ['the-shawshank-redemption']
+
+
+def test_search_pages_cover_every_match(_fill_test_user, test_client):
+    params = {'substr': 'the', 'limit': 1}
+    first_page = _get_films(test_client, params)
+    params['cursor'] = first_page['next_cursor']
+    second_page = _get_films(test_client, params)
+    slugs = {film['slug'] for film in first_page['films'] + second_page['films']}
+    assert slugs == {'the-gentlemen', 'the-shawshank-redemption'}
+    assert second_page['next_cursor'] is None
+
+
+def test_search_follows_renamed_film(_fill_test_user, test_client):
+    with create_session() as session:
+        film = session.query(FilmOrm).filter(FilmOrm.slug == 'kizumonogatari').one()
+        film.film_name = 'Kizumonogatari Tekketsu-hen'
+    assert _search(test_client, {'substr': 'tekketsu'}) == ['kizumonogatari']
+
+
+def _search(client: TestClient, params: dict[str, Any]) -> list[str]:
+    return [film['slug'] for film in _get_films(client, params)['films']]
+
+
+def _get_films(client: TestClient, params: dict[str, Any]) -> dict[str, Any]:
+    token = _get_basic_decoded_token(CorrectTestUser())
+    response = client.get('/films', params=params, headers=_get_headers(token))
+    return json.loads(response.content)
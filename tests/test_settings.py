@@ -0,0 +1,64 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.db import create_db_engine
+from app.settings import CONFIG_FILE_ENV, Profile, Settings
+
+
+def test_development_defaults(monkeypatch):
+    monkeypatch.delenv('FILMS_PROFILE', raising=False)
+    settings = Settings()
+    assert settings.profile == Profile.DEVELOPMENT
+    assert settings.journal_mode == 'WAL'
+    assert settings.synchronous == 'FULL'
+
+
+def test_production_profile_defaults(monkeypatch):
+    monkeypatch.setenv('FILMS_PROFILE', 'production')
+    settings = Settings()
+    assert settings.synchronous == 'NORMAL'
+    assert settings.mmap_size > 0
+    assert settings.pool_size == 20
+
+
+def test_environment_overrides_profile(monkeypatch):
+    monkeypatch.setenv('FILMS_PROFILE', 'production')
+    monkeypatch.setenv('FILMS_SYNCHRONOUS', 'full')
+    assert Settings().synchronous == 'FULL'
+
+
+def test_config_file_is_below_environment(monkeypatch, tmp_path):
+    config_file = tmp_path / 'films.json'
+    config_file.write_text(json.dumps({'profile': 'production', 'pool_size': 3}))
+    monkeypatch.setenv(CONFIG_FILE_ENV, str(config_file))
+    monkeypatch.setenv('FILMS_MAX_OVERFLOW', '1')
+    settings = Settings()
+    assert (settings.profile, settings.pool_size, settings.max_overflow) == (
+        Profile.PRODUCTION,
+        3,
+        1,
+    )
+
+
+def test_invalid_pragma_value():
+    with pytest.raises(ValidationError):
+        Settings(journal_mode='WAL; DROP TABLE films')  # type: ignore[arg-type]
+
+
+def test_pragmas_are_applied_on_connect(tmp_path):
+    settings = Settings(
+        database_url=f'sqlite:///{tmp_path / "pragmas.db"}',
+        synchronous='NORMAL',
+        busy_timeout=1234,
+        mmap_size=1048576,
+    )
+    engine = create_db_engine(settings)
+    with engine.connect() as connection:
+        pragmas = [
+            connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+        ]
+    engine.dispose()
+    assert pragmas == ['wal', 1, 1234, 1048576]
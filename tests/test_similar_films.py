@@ -0,0 +1,202 @@
+import asyncio
+import ctypes
+import json
+import multiprocessing
+
+import numpy as np
+import numpy.typing as npt
+import pytest
+from sqlalchemy import text
+
+from app.db import create_session
+from app.events import FilmReviewChange
+from app.similar_films import SimilarFilms, similar_films
+from app.similarity_index import build_similarity_index, compute_neighbors
+from tests.conftest import CorrectTestUser, _get_basic_decoded_token, _get_headers
+
+# user x film, None where the user hasn't rated the film
+RATES = [
+    [10, 8, 2, None, 5],
+    [6, 4, 0, 9, None],
+    [9, None, 3, 8, 5],
+    [4, 3, 7, None, None],
+    [None, 1, 9, 6, 2],
+]
+
+
+def test_neighbors_are_the_most_similar_films():
+    neighbors, similarities = _compute_neighbors(top_k=3, block_cells=5)
+    expected = _get_adjusted_cosines()
+    for film, film_neighbors in enumerate(neighbors.tolist()):
+        ranked = [
+            other
+            for other in np.argsort(-expected[film], kind='stable').tolist()
+            if other != film and expected[film, other] > 0
+        ][:3]
+        assert [other for other in film_neighbors if other >= 0] == ranked
+        assert similarities[film, : len(ranked)] == pytest.approx(
+            expected[film, ranked]
+        )
+
+
+def test_neighbors_are_computed_the_same_by_any_block():
+    for block_cells in (1, 7, 1000):
+        for got, expected in zip(
+            _compute_neighbors(top_k=4, block_cells=block_cells),
+            _compute_neighbors(top_k=4, block_cells=25),
+        ):
+            assert got == pytest.approx(expected)
+
+
+def test_films_without_common_users_have_no_neighbors():
+    # film 2 is rated by user 2 only, who rated nothing else
+    neighbors, similarities = compute_neighbors(
+        np.array([0, 0, 1, 1, 2]),
+        np.array([0, 1, 0, 1, 2]),
+        np.array([9, 1, 8, 2, 5]),
+        films=3,
+        top_k=5,
+    )
+    assert neighbors.tolist() == [[-1] * 5] * 3
+    assert not similarities.any()
+
+
+def test_rates_of_missing_films_are_ignored(_fill_test_user):
+    expected = build_similarity_index(5)
+    with create_session() as session:
+        # below the first film id and above the last one
+        session.execute(
+            text(
+                'INSERT INTO rates (film_id, user_id, rate) '
+                'VALUES (0, 1, 3), (1000000, 1, 9)'
+            )
+        )
+    try:
+        index = build_similarity_index(5)
+    finally:
+        with create_session() as session:
+            session.execute(text('DELETE FROM rates WHERE film_id IN (0, 1000000)'))
+    assert index.neighbors.tolist() == expected.neighbors.tolist()
+    assert index.similarities == pytest.approx(expected.similarities)
+
+
+def test_similar_films_go_stale_on_new_rates_only():
+    films = SimilarFilms(top_k=5, workers=1, reload_interval=0)
+    assert films.claim_reload()
+    asyncio.run(films.rebuild())
+    films.apply(FilmReviewChange(1, 'the-gentlemen', 1, 7, 7))
+    assert not films.claim_reload()
+    films.apply(FilmReviewChange(1, 'the-gentlemen', 1, 7, 8))
+    assert films.claim_reload()
+
+
+def test_similar_films_are_rebuilt_in_the_pool():
+    async def build() -> None:
+        films = SimilarFilms(top_k=5, workers=1, reload_interval=60)
+        films.start()
+        try:
+            while films.index is None:
+                await asyncio.sleep(0.05)
+        finally:
+            await films.close()
+        assert films.index.similar('the-gentlemen', 5) == build_similarity_index(
+            5
+        ).similar('the-gentlemen', 5)
+
+    asyncio.run(asyncio.wait_for(build(), timeout=60))
+
+
+def test_similar_films_are_built_once_for_every_process(tmp_path):
+    async def build() -> None:
+        published = multiprocessing.Value(ctypes.c_uint64, 0)
+        processes = [
+            SimilarFilms(
+                top_k=5,
+                workers=1,
+                reload_interval=60,
+                path=str(tmp_path / 'similar.npz'),
+                published=published,
+            )
+            for _ in range(2)
+        ]
+        for films in processes:
+            films.start()
+        try:
+            while any(films.index is None for films in processes):
+                await asyncio.sleep(0.05)
+        finally:
+            for films in processes:
+                await films.close()
+        # one built it, the other one loaded it
+        assert published.value == 1
+        builder, loader = processes
+        assert builder.index is not None and loader.index is not None
+        assert loader.index.similar('the-gentlemen', 5) == builder.index.similar(
+            'the-gentlemen', 5
+        )
+
+    asyncio.run(asyncio.wait_for(build(), timeout=60))
+
+
+def test_show_similar_films(_fill_test_user, test_client, monkeypatch):
+    monkeypatch.setattr(similar_films, 'index', None)
+    response = _get_similar_films('the-gentlemen', test_client)
+    assert response.status_code == 503
+    asyncio.run(similar_films.rebuild())
+    response = _get_similar_films('the-gentlemen', test_client)
+    films = json.loads(response.content)['films']
+    assert response.status_code == 200
+    assert similar_films.index is not None
+    assert films == similar_films.index.similar('the-gentlemen', 20)
+    assert 'the-gentlemen' not in [film['slug'] for film in films]
+    similarities = [film['similarity'] for film in films]
+    assert similarities == sorted(similarities, reverse=True)
+    assert all(0 < similarity <= 1 + 1e-9 for similarity in similarities)
+
+
+def test_show_similar_films_of_film_missing_from_index(
+    _fill_test_user, test_client, monkeypatch
+):
+    asyncio.run(similar_films.rebuild())
+    assert similar_films.index is not None
+    # as if the film was added after the index was built
+    monkeypatch.setattr(similar_films, 'index', similar_films.index._replace(rows={}))
+    response = _get_similar_films('snatch', test_client)
+    assert (response.status_code, json.loads(response.content)) == (200, {'films': []})
+    assert _get_similar_films('no-such-film', test_client).status_code == 404
+
+
+def test_show_similar_films_is_limited(_fill_test_user, test_client):
+    asyncio.run(similar_films.rebuild())
+    response = _get_similar_films('the-gentlemen', test_client, limit=1)
+    assert len(json.loads(response.content)['films']) <= 1
+    response = _get_similar_films('the-gentlemen', test_client, limit=21)
+    assert response.status_code == 422
+
+
+def _compute_neighbors(top_k: int, block_cells: int):
+    users, films = np.nonzero([[rate is not None for rate in row] for row in RATES])
+    return compute_neighbors(
+        users,
+        films,
+        np.array([RATES[user][film] for user, film in zip(users, films)]),
+        films=len(RATES[0]),
+        top_k=top_k,
+        block_cells=block_cells,
+    )
+
+
+def _get_adjusted_cosines() -> npt.NDArray[np.float64]:
+    rated = np.array([[rate is not None for rate in row] for row in RATES])
+    rates = np.array([[rate or 0 for rate in row] for row in RATES], dtype=float)
+    averages = rates.sum(axis=1) / rated.sum(axis=1)
+    centered = np.where(rated, rates - averages[:, None], 0)
+    columns = centered / np.linalg.norm(centered, axis=0)
+    return columns.T @ columns
+
+
+def _get_similar_films(film_slug: str, client, limit: int = 20):
+    token = _get_basic_decoded_token(CorrectTestUser())
+    return client.get(
+        f'/films/{film_slug}/similar?limit={limit}', headers=_get_headers(token)
+    )
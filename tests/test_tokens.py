@@ -0,0 +1,71 @@
+import json
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+from requests import Response
+
+from app.constants import ErrorMessage
+from app.tokens import create_access_token
+from tests.conftest import CorrectTestUser, _get_response_films_get_request_with_token
+
+
+@pytest.fixture()
+def response_login(_fill_test_user, test_client) -> Response:
+    user = CorrectTestUser()
+    return _login(user.user_name, user.password, test_client)
+
+
+@pytest.fixture()
+def response_login_with_incorrect_password(_fill_test_user, test_client) -> Response:
+    user = CorrectTestUser()
+    return _login(user.user_name, f'{user.password}SHREK', test_client)
+
+
+def test_login_returns_bearer_token(response_login: Response):
+    assert response_login.status_code == HTTPStatus.OK
+    assert json.loads(response_login.content)['token_type'] == 'bearer'
+
+
+def test_dont_login_with_incorrect_password(
+    response_login_with_incorrect_password: Response,
+):
+    assert response_login_with_incorrect_password.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_show_films_with_bearer_token(response_login: Response, test_client):
+    access_token = json.loads(response_login.content)['access_token']
+    response = _get_response_films_get_request_with_token(
+        f'Bearer {access_token}', test_client
+    )
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.parametrize(
+    'access_token',
+    [
+        create_access_token(CorrectTestUser().user_name, ttl=-1),
+        create_access_token(CorrectTestUser().user_name) + 'kek',
+        'kek',
+    ],
+)
+def test_dont_show_films_with_invalid_token(access_token: str, test_client):
+    response = _get_response_films_get_request_with_token(
+        f'Bearer {access_token}', test_client
+    )
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert json.loads(response.content) == {'detail': ErrorMessage.INVALID_TOKEN.value}
+
+
+def test_dont_show_films_without_credentials(test_client):
+    response = test_client.get('/films')
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert json.loads(response.content) == {
+        'detail': ErrorMessage.NOT_AUTHENTICATED.value
+    }
+
+
+def _login(login: str, password: str, client: TestClient) -> Response:
+    return client.post(
+        '/login', data=json.dumps({'login': login, 'password': password})
+    )
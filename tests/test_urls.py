@@ -55,6 +55,10 @@ def test_create_review(response_create_review, new_review_added_to_db):
     assert new_review_added_to_db
 
 
+def test_create_existing_review(response_create_existing_review):
+    assert response_create_existing_review.status_code == HTTPStatus.CONFLICT
+
+
 def test_update_review(response_update_review, review_updated):
     assert response_update_review.status_code == HTTPStatus.OK
     assert review_updated
@@ -0,0 +1,80 @@
+from http import HTTPStatus
+from typing import Iterator
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, text
+
+from app.create_entities import create_comment_with_rate, create_rate
+from app.db import CommentOrm, create_session, engine
+from app.request_models import NewRate, NewReview
+from app.update_entities import update_comment_with_rate
+
+FILM = 'lock-stock-and-two-smoking-barrels'
+
+
+class Writer:
+    user_name = 'writer'
+    password = 'writer'
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _fill_writer():
+    # bcrypt is not needed here, the write path never checks passwords
+    with create_session() as session:
+        session.execute(
+            text('INSERT INTO users (user_name, password) VALUES (:login, :password)'),
+            {'login': Writer.user_name, 'password': Writer.password},
+        )
+
+
+@pytest.fixture()
+def statements() -> Iterator[list[str]]:
+    executed: list[str] = []
+
+    def _count(_conn, _cursor, statement, *_):
+        executed.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _count)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', _count)
+
+
+def test_create_review_in_four_statements(statements: list[str]):
+    with create_session() as session:
+        create_comment_with_rate(
+            FILM, Writer.user_name, NewReview(comment='ok', rate=7), session
+        )
+    assert len(statements) == 4
+
+
+def test_update_review_in_four_statements(statements: list[str]):
+    with create_session() as session:
+        update_comment_with_rate(
+            FILM, Writer.user_name, NewReview(comment='fine', rate=6), session
+        )
+    assert len(statements) == 4
+
+
+def test_dont_create_review_for_unknown_film():
+    with pytest.raises(HTTPException) as not_found:
+        with create_session() as session:
+            create_rate('shrek', Writer.user_name, NewRate(rate=1), session)
+    assert not_found.value.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_dont_create_partial_review_over_existing_rate():
+    with pytest.raises(HTTPException) as conflict:
+        with create_session() as session:
+            create_rate('snatch', Writer.user_name, NewRate(rate=1), session)
+            create_comment_with_rate(
+                'snatch',
+                Writer.user_name,
+                NewReview(comment='partial', rate=7),
+                session,
+            )
+    assert conflict.value.status_code == HTTPStatus.CONFLICT
+    with create_session() as session:
+        assert (
+            not session.query(CommentOrm).filter(CommentOrm.comment == 'partial').all()
+        )
@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+from threading import Event
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import events
+from app.db import UserOrm, create_read_session, create_session
+from app.events import FilmReviewChange, record_change
+from app.writer import Writer
+
+
+class Commits:
+    def __init__(self):
+        self.count = 0
+
+    @contextmanager
+    def session_scope(self):
+        with create_session() as session:
+            yield session
+        self.count += 1
+
+
+def _add_user(user_name: str):
+    def write(session):
+        session.add(UserOrm(user_name=user_name, password=b'-'))
+        return user_name
+
+    return write
+
+
+def _get_user_names(*user_names: str) -> set[str]:
+    with create_read_session() as session:
+        users = session.query(UserOrm.user_name).filter(
+            UserOrm.user_name.in_(user_names)
+        )
+        return {user.user_name for user in users}
+
+
+@pytest.fixture()
+def commits():
+    return Commits()
+
+
+@pytest.fixture()
+def writer(commits):
+    writer = Writer(commits.session_scope, group_size=10)
+    yield writer
+    writer.close()
+
+
+def test_waiting_writes_are_committed_together(writer, commits):
+    started, release = Event(), Event()
+
+    def blocking_write(_session):
+        started.set()
+        release.wait()
+
+    first = writer.submit(blocking_write)
+    started.wait()
+    waiting = [writer.submit(_add_user(f'grouped_{i}')) for i in range(3)]
+    release.set()
+
+    assert first.result() is None
+    assert [future.result() for future in waiting] == [
+        'grouped_0',
+        'grouped_1',
+        'grouped_2',
+    ]
+    assert commits.count == 2
+
+
+def test_failed_write_is_rolled_back_alone(writer, monkeypatch):
+    received: list[FilmReviewChange] = []
+    monkeypatch.setattr(events, '_listeners', [received.append])
+    change = FilmReviewChange(1, 'the-gentlemen', 1, None, 5)
+
+    def failing_write(session):
+        session.add(UserOrm(user_name='rolled_back', password=b'-'))
+        session.flush()
+        record_change(session, change)
+        raise ValueError('failed')
+
+    def recording_write(session):
+        record_change(session, change)
+        return _add_user('committed')(session)
+
+    failed = writer.submit(failing_write)
+    committed = writer.submit(recording_write)
+
+    with pytest.raises(ValueError):
+        failed.result()
+    assert committed.result() == 'committed'
+    assert _get_user_names('rolled_back', 'committed') == {'committed'}
+    assert received == [change]
+
+
+def test_flush_error_is_reported_to_its_writer(writer):
+    writer.run(_add_user('duplicated'))
+    with pytest.raises(IntegrityError):
+        writer.run(_add_user('duplicated'))
+
+
+def test_commit_error_fails_every_write_of_the_group():
+    @contextmanager
+    def failing_commit_scope():
+        with create_session() as session:
+            yield session
+            raise OperationalError('COMMIT', {}, Exception('disk I/O error'))
+
+    writer = Writer(failing_commit_scope, group_size=10)
+    with pytest.raises(OperationalError):
+        writer.run(_add_user('not_committed'))
+    writer.close()
+    assert not _get_user_names('not_committed')
+
+
+def test_writer_restarts_after_close(writer):
+    writer.run(_add_user('before_close'))
+    writer.close()
+    assert writer.run(_add_user('after_close')) == 'after_close'
+
+
+def test_read_session_cant_write():
+    with pytest.raises(OperationalError):
+        with create_read_session() as session:
+            session.execute(text("UPDATE films SET year = 1900 WHERE id = 1"))